@@ -0,0 +1,88 @@
+"""Нагрузочный тест AIService: N пользователей пишут одновременно.
+
+Модель подменяется клиентом с фиксированной задержкой, поэтому сеть и
+токены не нужны. Исходная версия вызывала синхронный клиент прямо в
+корутине - это воспроизводит LegacyBlockingClient.
+
+Запуск из корня проекта:
+    python -m benchmarks.ai_concurrency --users 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from services.ai_backends import AIBackend, make_completion
+from services.ai_service import AIService
+
+
+class FakeAsyncClient(AIBackend):
+    """Асинхронный клиент: ожидание ответа не занимает event loop"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return make_completion("Ответ консультанта")
+
+
+class LegacyBlockingClient(FakeAsyncClient):
+    """Синхронный вызов внутри корутины, как в исходном AIService"""
+
+    async def create(self, **kwargs):
+        time.sleep(self.latency)
+        return make_completion("Ответ консультанта")
+
+
+async def heartbeat(interval: float, lags: list, stop: asyncio.Event):
+    """Задержка срабатывания таймера показывает, насколько занят event loop"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(client, users: int, concurrency: int) -> dict:
+    service = AIService(backend=client, max_concurrency=concurrency, timeout=60)
+    lags, stop = [], asyncio.Event()
+    probe = asyncio.create_task(heartbeat(0.01, lags, stop))
+
+    async def user(user_id: int) -> float:
+        start = time.perf_counter()
+        await service.get_response(f"Какие документы нужны? #{user_id}", {'degree': 'магистратура'})
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(user(i) for i in range(users))))
+    wall = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    return {
+        'wall': wall,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'max_loop_lag': max(lags, default=0.0),
+        'max_in_flight': service.get_stats()['max_in_flight'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"Пользователей: {args.users}, задержка модели: {args.latency} с, лимит: {args.concurrency}")
+    for label, client in (('синхронный клиент', LegacyBlockingClient(args.latency)),
+                          ('асинхронный клиент', FakeAsyncClient(args.latency))):
+        result = asyncio.run(run(client, args.users, args.concurrency))
+        print(f"  {label:<20} всего {result['wall']:6.2f} с  p50 {result['p50']:6.2f} с  "
+              f"p95 {result['p95']:6.2f} с  задержка loop до {result['max_loop_lag'] * 1e3:7.0f} мс  "
+              f"параллельно {result['max_in_flight']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Задержка ответа AIService во время сбоя провайдера.
+
+Провайдер моделируется клиентом с тремя фазами: норма, сбой (зависшие
+запросы или ошибки 503) и восстановление. Сравниваются прямой вызов с
+одним общим таймаутом и транспорт с повторами и автоматом отключения.
+
+Запуск из корня проекта:
+    python -m benchmarks.ai_resilience --incident hang
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from services.ai_backends import AIBackend, StubProviderError, make_completion
+from services.ai_service import AIService
+from services.ai_transport import AITransport, CircuitBreaker
+
+
+class IncidentClient(AIBackend):
+    """Провайдер, который в окне [start, end) зависает или отвечает 503"""
+
+    def __init__(self, latency: float, incident: str, start: float, end: float):
+        self.latency = latency
+        self.incident = incident
+        self.start, self.end = start, end
+        self.started_at = time.monotonic()
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        elapsed = time.monotonic() - self.started_at
+        if self.start <= elapsed < self.end:
+            if self.incident == 'hang':
+                await asyncio.sleep(3600)
+            await asyncio.sleep(self.latency / 4)
+            raise StubProviderError(503)
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        return make_completion("Ответ консультанта")
+
+
+async def run(args, resilient: bool) -> dict:
+    client = IncidentClient(args.latency, args.incident, args.duration / 3, args.duration * 2 / 3)
+    service = AIService(backend=client, max_concurrency=1000, timeout=args.timeout)
+    if resilient:
+        service.transport = AITransport(client, CircuitBreaker(5, args.duration / 6), attempt_timeout=args.latency * 4,
+                                        max_retries=2, backoff_base=0.05, backoff_max=0.5)
+    else:
+        # Одна попытка на весь срок и без автомата - как до появления транспорта
+        service.transport = AITransport(client, CircuitBreaker(10 ** 9, 0), attempt_timeout=args.timeout,
+                                        max_retries=0, backoff_base=0, backoff_max=0)
+
+    latencies = []
+
+    async def user(i: int):
+        start = time.perf_counter()
+        await service.get_response(f"Вопрос про документы #{i}", {})
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    loop_start = time.monotonic()
+    i = 0
+    while time.monotonic() - loop_start < args.duration:
+        tasks.append(asyncio.create_task(user(i)))
+        i += 1
+        await asyncio.sleep(1 / args.rps)
+    await asyncio.gather(*tasks)
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'p50': statistics.median(latencies),
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'provider_calls': client.calls,
+        'fallbacks': service.stats['fallbacks'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--incident', choices=['hang', 'error'], default='hang')
+    parser.add_argument('--duration', type=float, default=6.0)
+    parser.add_argument('--rps', type=float, default=50)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--timeout', type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"Сбой '{args.incident}' в средней трети из {args.duration} с, {args.rps} запросов/с")
+    for label, resilient in (('один вызов', False), ('транспорт', True)):
+        result = asyncio.run(run(args, resilient))
+        print(f"  {label:<12} запросов {result['requests']:5}  p50 {result['p50'] * 1e3:7.0f} мс  "
+              f"p99 {result['p99'] * 1e3:7.0f} мс  вызовов провайдера {result['provider_calls']:5}  "
+              f"заготовок {result['fallbacks']:5}")
+
+
+if __name__ == '__main__':
+    main()
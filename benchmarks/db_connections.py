@@ -0,0 +1,72 @@
+"""Задержка одного вызова EducationDatabase: соединение на вызов vs долгоживущее.
+
+Запуск из корня проекта:
+    python -m benchmarks.db_connections --calls 10000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from database.education_db import EducationDatabase
+from database.models import UserSession
+
+
+class PerCallConnectionDatabase(EducationDatabase):
+    """Старое поведение: новое соединение без PRAGMA на каждый вызов"""
+
+    def _get_connection(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+
+def run_calls(db: EducationDatabase, calls: int) -> dict:
+    """Прогон смешанной нагрузки, как у одного сообщения пользователя"""
+    timings = {'get_user_session': [], 'save_user_session': [], 'search_programs': []}
+    filters = {'degree': 'магистратура', 'field': ['ИИ'], 'max_budget': 5000}
+
+    for i in range(calls):
+        user_id = i % 500
+        session = UserSession(user_id=user_id, stage='collecting_info', profile={'degree': 'магистратура'})
+
+        start = time.perf_counter()
+        db.get_user_session(user_id)
+        timings['get_user_session'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        db.save_user_session(session)
+        timings['save_user_session'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        db.search_programs(filters)
+        timings['search_programs'].append(time.perf_counter() - start)
+
+    return timings
+
+
+def summarize(timings: list) -> str:
+    timings = sorted(timings)
+    avg = sum(timings) / len(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    return f"avg {avg * 1e6:8.1f} мкс   p99 {p99 * 1e6:8.1f} мкс"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, db_class in (('соединение на вызов', PerCallConnectionDatabase),
+                                ('долгоживущее + WAL', EducationDatabase)):
+            db = db_class(os.path.join(tmp, f'{db_class.__name__}.db'))
+            timings = run_calls(db, args.calls)
+            db.close()
+
+            print(f"\n{label} ({args.calls} итераций):")
+            for method, values in timings.items():
+                print(f"  {method:<18} {summarize(values)}")
+
+
+if __name__ == '__main__':
+    main()
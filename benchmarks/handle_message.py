@@ -0,0 +1,157 @@
+"""Пропускная способность и задержка полного пути handle_message без сети.
+
+Сервисы собираются так же, как в main.setup_bot_data, но с локальным
+бэкендом модели (AI_BACKEND=local) и временной базой. Telegram заменен
+объектом FakeBot, который только засекает время ответов; ответы идут
+через очередь исходящих с ее лимитами. Каждый пользователь
+отправляет несколько вопросов подряд с паузой между ними.
+
+Запуск из корня проекта:
+    python -m benchmarks.handle_message --users 200 --latency lognormal --error-rate 0.05
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+from config.settings import Settings
+
+QUESTIONS = [
+    "Какие документы нужны для поступления в магистратуру в Германии?",
+    "Сколько стоит жизнь студента в Нидерландах?",
+    "Можно ли учиться бесплатно на английском языке?",
+    "Когда подавать документы на осенний семестр?",
+    "Какой балл IELTS нужен для программы по компьютерным наукам?",
+]
+
+
+class FakeChat:
+    """Сообщение пользователя и время ответов бота на него"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.started = time.monotonic()
+        self.first_reply = None
+        self.last_reply = None
+
+    def record(self):
+        now = time.monotonic() - self.started
+        if self.first_reply is None:
+            self.first_reply = now
+        self.last_reply = now
+
+
+class FakeBot:
+    """Вместо telegram.Bot: засекает время ответов в текущем сообщении каждого чата"""
+
+    def __init__(self):
+        self.chats = {}
+        self.message_ids = iter(range(1, 10 ** 9))
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        self.chats[chat_id].record()
+        return SimpleNamespace(chat_id=chat_id, message_id=next(self.message_ids), text=text)
+
+    async def edit_message_text(self, text: str, chat_id: int, message_id: int, **kwargs):
+        self.chats[chat_id].record()
+
+    async def send_chat_action(self, chat_id: int, action: str):
+        pass
+
+
+async def user_session(handle_message, context, user_id: int, args, update_ids, chats):
+    bot = context.bot
+    for i in range(args.messages):
+        text = QUESTIONS[(user_id + i) % len(QUESTIONS)]
+        if args.unique:
+            text += f" (вопрос {user_id}-{i})"
+        chat = FakeChat(text)
+        bot.chats[user_id] = chat
+        update = SimpleNamespace(
+            update_id=next(update_ids),
+            message=chat,
+            effective_user=SimpleNamespace(id=user_id),
+            effective_chat=SimpleNamespace(id=user_id),
+        )
+        await handle_message(update, context)
+        chats.append(chat)
+        await asyncio.sleep(args.think_time)
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def run(args):
+    # Импорт после настройки Settings: сервисы читают ее при создании
+    from main import setup_bot_data, start_bot_data, stop_bot_data, shutdown_bot_data
+    from handlers.messages import handle_message
+
+    app = SimpleNamespace(bot_data={}, bot=FakeBot())
+    setup_bot_data(app)
+    await start_bot_data(app)
+    context = SimpleNamespace(bot_data=app.bot_data, bot=app.bot)
+
+    update_ids = iter(range(1, 10 ** 9))
+    chats = []
+    start = time.monotonic()
+    await asyncio.gather(*(
+        user_session(handle_message, context, 1_000_000 + user_id, args, update_ids, chats)
+        for user_id in range(args.users)
+    ))
+    elapsed = time.monotonic() - start
+
+    first = [chat.first_reply for chat in chats if chat.first_reply is not None]
+    full = [chat.last_reply for chat in chats if chat.last_reply is not None]
+    stats = app.bot_data['ai_service'].get_stats()
+    backend = app.bot_data['ai_service'].backend
+    outbound = app.bot_data['outbound'].get_stats()
+
+    await stop_bot_data(app)
+    await shutdown_bot_data(app)
+
+    print(f"Пользователей: {args.users} x {args.messages} сообщений, "
+          f"модель: {args.latency} {args.latency_mean} с, ошибок {args.error_rate:.0%}, "
+          f"потоковый вывод: {'да' if Settings.AI_STREAMING else 'нет'}")
+    print(f"  сообщений {len(chats)} за {elapsed:.2f} с ({len(chats) / elapsed:.1f} в секунду)")
+    print(f"  первый ответ  p50 {statistics.median(first) * 1000:7.0f} мс  p99 {percentile(first, 0.99) * 1000:7.0f} мс")
+    print(f"  полный ответ  p50 {statistics.median(full) * 1000:7.0f} мс  p99 {percentile(full, 0.99) * 1000:7.0f} мс")
+    print(f"  вызовов модели {backend.stats['calls']}, внедренных ошибок {backend.stats['errors']}, "
+          f"заготовок {stats['fallbacks']}, попаданий в кэш {(stats['cache'] or {}).get('hits', 0)}")
+    print(f"  исходящих {outbound['sent']}, схлопнуто правок {outbound['coalesced']}, "
+          f"ожидание в очереди: среднее {outbound['avg_wait']['reply'] * 1000:.0f} мс, "
+          f"максимум {outbound['max_wait']['reply'] * 1000:.0f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=3, help='сообщений от каждого пользователя')
+    parser.add_argument('--think-time', type=float, default=0.5, help='пауза между сообщениями, с')
+    parser.add_argument('--latency', default='lognormal', choices=['fixed', 'uniform', 'exponential', 'lognormal'])
+    parser.add_argument('--latency-mean', type=float, default=0.8)
+    parser.add_argument('--tokens-per-second', type=float, default=40)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--hang-rate', type=float, default=0.0)
+    parser.add_argument('--no-stream', action='store_true', help='ответ целиком, без потокового вывода')
+    parser.add_argument('--unique', action='store_true', help='уникальные вопросы, без попаданий в кэш')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Settings.DATABASE_PATH = os.path.join(tmp, 'bench.db')
+        Settings.AI_BACKEND = 'local'
+        Settings.AI_STUB_LATENCY = args.latency
+        Settings.AI_STUB_LATENCY_MEAN = args.latency_mean
+        Settings.AI_STUB_TOKENS_PER_SECOND = args.tokens_per_second
+        Settings.AI_STUB_ERROR_RATE = args.error_rate
+        Settings.AI_STUB_HANG_RATE = args.hang_rate
+        Settings.AI_STREAMING = not args.no_stream
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
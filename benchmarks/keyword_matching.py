@@ -0,0 +1,125 @@
+"""Оценка интереса: отдельные проверки `in` vs KeywordMatcher.
+
+Корпус - типичные сообщения абитуриентов. Перед замером результаты
+обеих реализаций сравниваются на всем корпусе. Вторая часть показывает,
+как время проверки растет с размером таблицы ключевых слов; таблицы до
+KeywordMatcher.PLAIN_SCAN_MAX_KEYWORDS слов он проверяет через `in`.
+
+Запуск из корня проекта:
+    python -m benchmarks.keyword_matching --repeat 2000
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from services.ai_service import AIService
+from utils.keyword_matcher import KeywordMatcher
+
+CORPUS = [
+    "Привет! Хочу поступать в магистратуру в Германии, какие документы нужны?",
+    "Интересно, сколько стоит обучение в Нидерландах для ИТ?",
+    "Я выпускник, окончил школу в этом году, думаю про бакалавриат",
+    "Бюджет до 5000 евро в год, рассматриваю Чехию и Польшу",
+    "Когда подавать документы на осень? Какой дедлайн у TU Munich?",
+    "Хочу учиться бесплатно, английский на уровне IELTS 6.5",
+    "У меня диплом экономиста, интересует MBA или менеджмент",
+    "Может быть в будущем, просто узнать про стоимость и требования",
+    "Планирую магистратуру по машинному обучению или анализ данных",
+    "Готов платить 10 тысяч в год, можно и больше если программа хорошая",
+    "А сколько это в долларах? У меня 8000 usd",
+    "Подходит ли мне Data Science если я разработчик?",
+    "Помогите подать документы, я уже выбрал программу по искусственный интеллект",
+    "ок спасибо",
+    "Какие требования к английскому для программ в Швеции и Финляндии? Есть ли стипендии?",
+    "Второе высшее можно получить бесплатно в Европе?",
+]
+
+
+def legacy_interest_score(message: str) -> int:
+    """Исходная реализация: отдельная проверка на каждое слово"""
+    interest_keywords = {
+        'high': ['хочу поступать', 'когда подавать', 'какие документы', 'помогите подать'],
+        'medium': ['интересно', 'подходит', 'рассматриваю', 'думаю', 'планирую'],
+        'low': ['просто узнать', 'в будущем', 'может быть']
+    }
+
+    interest_score = 0
+    message_lower = message.lower()
+
+    for level, keywords in interest_keywords.items():
+        matches = sum(1 for keyword in keywords if keyword in message_lower)
+        if level == 'high':
+            interest_score += matches * 3
+        elif level == 'medium':
+            interest_score += matches * 2
+        else:
+            interest_score += matches * 1
+
+    if '?' in message:
+        interest_score += 1
+    if any(word in message_lower for word in ['стоимость', 'цена', 'дедлайн', 'требования']):
+        interest_score += 2
+
+    return min(interest_score, 10)
+
+
+def synthetic_tables(keywords: int, per_category: int = 8, seed: int = 1) -> dict:
+    """Таблица из случайных русских "слов" - как будто добавили много областей и стран"""
+    rng = random.Random(seed)
+    alphabet = 'абвгдежзиклмнопрстуфхцчшщэюя'
+    words = [''.join(rng.choice(alphabet) for _ in range(rng.randint(4, 10))) for _ in range(keywords)]
+    return {f'category_{i}': words[i:i + per_category] for i in range(0, keywords, per_category)}
+
+
+def legacy_scan(tables: dict):
+    def scan(message: str) -> dict:
+        message_lower = message.lower()
+        hits = {}
+        for category, keywords in tables.items():
+            matches = sum(1 for keyword in keywords if keyword in message_lower)
+            if matches:
+                hits[category] = matches
+        return hits
+    return scan
+
+
+def bench(name: str, func, messages, repeat: int):
+    # Лучший из трех прогонов: меньше влияния фоновой нагрузки
+    elapsed = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for message in messages:
+                func(message)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    calls = repeat * len(messages)
+    print(f"  {name:28} {calls / elapsed:12,.0f} сообщений/с  {elapsed / calls * 1e6:6.1f} мкс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=2000, help='проходов по корпусу')
+    args = parser.parse_args()
+
+    service = AIService(backend=SimpleNamespace())
+    for message in CORPUS:
+        assert service.calculate_interest_score(message) == legacy_interest_score(message), message
+
+    print(f"Корпус: {len(CORPUS)} сообщений, {args.repeat} проходов")
+    bench("интерес: проверки in", legacy_interest_score, CORPUS, args.repeat)
+    bench("интерес: KeywordMatcher", service.calculate_interest_score, CORPUS, args.repeat)
+
+    for keywords in (48, 100, 400, 1600):
+        tables = synthetic_tables(keywords)
+        matcher = KeywordMatcher(tables)
+        for message in CORPUS:
+            assert matcher.scan(message) == legacy_scan(tables)(message), message
+        repeat = max(1, args.repeat * 50 // keywords)
+        print(f"Таблица из {keywords} ключевых слов")
+        bench("проверки in", legacy_scan(tables), CORPUS, repeat)
+        bench("KeywordMatcher", matcher.scan, CORPUS, repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Отправка пачки сообщений напрямую и через OutboundQueue.
+
+FakeTelegram ведет себя как Bot API под нагрузкой: больше 30 сообщений
+в секунду от бота или больше 1 в секунду в чат (с небольшим запасом)
+получают RetryAfter. Прямая отправка ловит ошибки и теряет сообщения,
+очередь укладывается в лимиты; операторские сообщения в той же пачке
+уходят раньше ответов пользователям.
+
+Запуск из корня проекта:
+    python -m benchmarks.outbound_queue --chats 100 --messages 3
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict, deque
+from types import SimpleNamespace
+
+from telegram.error import RetryAfter
+
+from config.settings import Settings
+from services.outbound import OutboundQueue, Priority
+
+
+class FakeTelegram:
+    """Отправка с задержкой сети и лимитами по скользящему окну"""
+
+    def __init__(self, latency: float, global_limit: int = 30, chat_limit: int = 3, retry_after: int = 1):
+        self.latency = latency
+        self.global_limit = global_limit
+        self.chat_limit = chat_limit  # за секунду в один чат, с запасом на короткую серию
+        self.retry_after = retry_after
+        self.sent = deque()
+        self.sent_by_chat = defaultdict(deque)
+        self.delivered = 0
+        self.rejected = 0
+        self.message_ids = iter(range(1, 10 ** 9))
+
+    @staticmethod
+    def _window(times: deque, now: float) -> int:
+        while times and now - times[0] > 1.0:
+            times.popleft()
+        return len(times)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        chat_times = self.sent_by_chat[chat_id]
+        if self._window(self.sent, now) >= self.global_limit or self._window(chat_times, now) >= self.chat_limit:
+            self.rejected += 1
+            raise RetryAfter(self.retry_after)
+        self.sent.append(now)
+        chat_times.append(now)
+        self.delivered += 1
+        return SimpleNamespace(chat_id=chat_id, message_id=next(self.message_ids), text=text)
+
+
+async def run_direct(args) -> tuple:
+    bot = FakeTelegram(args.latency)
+    lost = 0
+
+    async def send(chat_id: int, text: str):
+        nonlocal lost
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+        except RetryAfter:
+            lost += 1
+
+    start = time.monotonic()
+    await asyncio.gather(*(send(chat_id, f"ответ {i}") for chat_id, i, _ in burst(args)))
+    return time.monotonic() - start, bot, lost, None
+
+
+async def run_queue(args) -> tuple:
+    bot = FakeTelegram(args.latency)
+    queue = OutboundQueue(
+        global_rate=Settings.OUTBOUND_GLOBAL_RATE,
+        global_burst=Settings.OUTBOUND_GLOBAL_BURST,
+        chat_rate=Settings.OUTBOUND_CHAT_RATE,
+        chat_burst=Settings.OUTBOUND_CHAT_BURST,
+        group_rate=Settings.OUTBOUND_GROUP_RATE,
+        group_burst=Settings.OUTBOUND_GROUP_BURST,
+        max_queue=Settings.OUTBOUND_MAX_QUEUE,
+        max_retries=Settings.OUTBOUND_MAX_RETRIES
+    )
+    queue.start(bot)
+    lost = 0
+
+    async def send(chat_id: int, text: str, priority: Priority):
+        nonlocal lost
+        try:
+            await queue.send_message(chat_id, text, priority)
+        except RetryAfter:
+            lost += 1
+
+    start = time.monotonic()
+    await asyncio.gather(*(send(chat_id, f"ответ {i}", priority) for chat_id, i, priority in burst(args)))
+    elapsed = time.monotonic() - start
+    await queue.stop()
+    return elapsed, bot, lost, queue.get_stats()
+
+
+def burst(args):
+    """Пачка: каждый чат получает несколько ответов, каждый десятый - сообщение оператору"""
+    for i in range(args.messages):
+        for chat_id in range(1, args.chats + 1):
+            priority = Priority.OPERATOR if chat_id % 10 == 0 else Priority.REPLY
+            yield chat_id, i, priority
+
+
+def report(name: str, elapsed: float, bot: FakeTelegram, lost: int, stats):
+    print(f"{name}:")
+    print(f"  доставлено {bot.delivered}, потеряно {lost}, RetryAfter от Telegram {bot.rejected}, "
+          f"за {elapsed:.2f} с")
+    if stats:
+        for priority in ('operator', 'reply'):
+            print(f"  ожидание {priority:8} среднее {stats['avg_wait'][priority] * 1000:7.0f} мс  "
+                  f"максимум {stats['max_wait'][priority] * 1000:7.0f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=3, help='сообщений в каждый чат')
+    parser.add_argument('--latency', type=float, default=0.05, help='задержка Bot API, с')
+    args = parser.parse_args()
+
+    print(f"Пачка: {args.chats} чатов x {args.messages} сообщений")
+    report("Напрямую", *asyncio.run(run_direct(args)))
+    report("OutboundQueue", *asyncio.run(run_queue(args)))
+
+
+if __name__ == '__main__':
+    main()
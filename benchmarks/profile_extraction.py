@@ -0,0 +1,137 @@
+"""Разбор анкеты: исходная цепочка `if any(...)` vs ProfileExtractor.
+
+Сначала печатаются сообщения, которые две реализации разбирают
+по-разному (ошибки исходной: "ит" в "учиться", "0" в "5000",
+`'' in message_lower`). Затем - скорость на корпусе и то, как она
+меняется, если добавить в таблицу правил много новых областей.
+
+Запуск из корня проекта:
+    python -m benchmarks.profile_extraction --repeat 2000
+"""
+import argparse
+import random
+import re
+import time
+
+from benchmarks.keyword_matching import CORPUS
+from services.profile_extractor import PROFILE_RULES, ProfileExtractor, ProfileRule
+
+EXTRA_CORPUS = [
+    "Хочу учиться в Европе",
+    "Бюджет до 5000 евро в год",
+    "Могу потратить 3000",
+    "У меня IELTS 6.5 и 2 года опыта",
+    "10k в год, немецкий на B2",
+]
+
+
+def legacy_extract_user_info(message: str, profile: dict, extra_fields: dict = None):
+    """Исходная реализация handlers/messages.extract_user_info"""
+    message_lower = message.lower()
+
+    if any(word in message_lower for word in ['магистр', 'магистратура', 'магистерская', 'второе высшее']):
+        profile['degree'] = 'магистратура'
+    elif any(word in message_lower for word in ['бакалавр', 'бакалавриат', 'первое высшее', 'первое образование']):
+        profile['degree'] = 'бакалавриат'
+    elif any(word in message_lower for word in ['школу', 'школы', 'окончил школу', 'выпускник', '11 класс']):
+        profile['degree'] = 'бакалавриат'
+    elif any(word in message_lower for word in ['диплом', 'высшее', 'университет окончил']):
+        profile['degree'] = 'магистратура'
+
+    fields = []
+    if any(word in message_lower for word in ['ит', 'программирование', 'компьютер', 'софт', 'разработка', 'кодинг']):
+        fields.append('ИТ')
+    if any(word in message_lower for word in ['ии', 'искусственный интеллект', 'ai', 'машинное обучение', 'ml']):
+        fields.append('ИИ')
+    if any(word in message_lower for word in
+           ['data science', 'данные', 'аналитика', 'большие данные', 'анализ данных']):
+        fields.append('Data Science')
+    if any(word in message_lower for word in ['бизнес', 'менеджмент', 'управление', 'mba', 'экономика']):
+        fields.append('бизнес')
+    # Каждая новая область - еще один if any(...) и еще один проход по сообщению
+    for field, keywords in (extra_fields or {}).items():
+        if any(word in message_lower for word in keywords):
+            fields.append(field)
+    if fields:
+        profile['field'] = fields
+
+    budget_patterns = [
+        r'(\d+)[^\d]*(?:евро|€|euro)',
+        r'(\d+)[^\d]*(?:долларов?|\$|usd)',
+        r'(\d+)[^\d]*(?:тысяч?|k)',
+        r'до\s*(\d+)',
+        r'(\d+)\s*в\s*год'
+    ]
+    for pattern in budget_patterns:
+        budget_match = re.search(pattern, message_lower)
+        if budget_match:
+            budget = int(budget_match.group(1))
+            if 'тысяч' in message_lower or 'k' in message_lower:
+                budget *= 1000
+            elif 'долларов' in message_lower or '' in message_lower:
+                budget = int(budget * 0.85)
+            profile['max_budget'] = budget
+            break
+
+    if any(word in message_lower for word in ['бесплатно', 'без платы', 'даром', 'free', 'не платить', '0']):
+        profile['max_budget'] = 0
+
+    if any(word in message_lower for word in ['английский', 'english', 'англ', 'ielts', 'toefl']):
+        profile['language'] = 'английский'
+
+
+def synthetic_fields(count: int, seed: int = 1) -> dict:
+    """Новые области: по 6 случайных русских "слов" на каждую"""
+    rng = random.Random(seed)
+    alphabet = 'абвгдежзиклмнопрстуфхцчшщэюя'
+    return {
+        f'область {i}': [''.join(rng.choice(alphabet) for _ in range(rng.randint(5, 10))) for _ in range(6)]
+        for i in range(count)
+    }
+
+
+def bench(name: str, func, messages, repeat: int):
+    # Лучший из трех прогонов: меньше влияния фоновой нагрузки
+    elapsed = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for message in messages:
+                func(message)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    calls = repeat * len(messages)
+    print(f"  {name:26} {calls / elapsed:12,.0f} сообщений/с  {elapsed / calls * 1e6:6.1f} мкс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=2000, help='проходов по корпусу')
+    args = parser.parse_args()
+
+    corpus = CORPUS + EXTRA_CORPUS
+    extractor = ProfileExtractor()
+
+    print("Расхождения с исходной реализацией:")
+    for message in corpus:
+        legacy, current = {}, {}
+        legacy_extract_user_info(message, legacy)
+        extractor.update_profile(message, current)
+        if legacy != current:
+            print(f"  {message}\n    было:  {legacy}\n    стало: {current}")
+
+    print(f"\nКорпус: {len(corpus)} сообщений, {args.repeat} проходов")
+    bench("if any(...)", lambda message: legacy_extract_user_info(message, {}), corpus, args.repeat)
+    bench("ProfileExtractor", lambda message: extractor.update_profile(message, {}), corpus, args.repeat)
+
+    for count in (20, 100, 400):
+        fields = synthetic_fields(count)
+        rules = PROFILE_RULES + [ProfileRule('field', field, tuple(keywords)) for field, keywords in fields.items()]
+        extended = ProfileExtractor(rules)
+        repeat = max(1, args.repeat * 10 // count)
+        print(f"Еще {count} областей ({count * 6} ключевых слов)")
+        bench("if any(...)", lambda message: legacy_extract_user_info(message, {}, fields), corpus, repeat)
+        bench("ProfileExtractor", lambda message: extended.update_profile(message, {}), corpus, repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Поиск программ по большому синтетическому каталогу.
+
+Запуск из корня проекта:
+    python -m benchmarks.program_search --programs 50000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from database.education_db import EducationDatabase
+from services.program_catalog import CatalogSnapshot, ProgramCatalog
+
+COUNTRIES = ['Германия', 'Нидерланды', 'Чехия', 'Польша', 'Швеция', 'Финляндия', 'Италия', 'Франция', 'Испания']
+DEGREES = ['бакалавриат', 'магистратура']
+FIELDS = ['ИТ', 'ИИ', 'Data Science', 'бизнес', 'машинное обучение', 'инженерия', 'медицина', 'дизайн',
+          'экономика', 'право', 'биология', 'физика', 'химия', 'психология', 'архитектура']
+LANGUAGES = ['английский', 'немецкий', 'французский', 'итальянский', 'испанский']
+
+QUERIES = {
+    'степень + область + бюджет': {'degree': 'магистратура', 'field': ['ИИ'], 'max_budget': 5000},
+    'полный профиль': {'degree': 'магистратура', 'field': ['ИТ', 'ИИ'], 'max_budget': 3000,
+                       'language': 'английский'},
+    'редкая область': {'degree': 'бакалавриат', 'field': ['архитектура'], 'language': 'испанский'},
+    'только бесплатные': {'max_budget': 0},
+}
+
+TEXT_QUERIES = {
+    'машинное обучение в Германии': None,
+    'бесплатная магистратура по дизайну': {'degree': 'магистратура'},
+    'психология на английском до 5000': {'max_budget': 5000, 'language': 'английский'},
+}
+
+
+def generate_programs(count: int, seed: int = 42):
+    """Синтетические строки programs в формате populate_sample_data"""
+    rnd = random.Random(seed)
+    for i in range(count):
+        country = rnd.choice(COUNTRIES)
+        fields = ', '.join(rnd.sample(FIELDS, rnd.randint(1, 3)))
+        languages = ', '.join(rnd.sample(LANGUAGES, rnd.randint(1, 2)))
+        cost = rnd.choice([0, 0, 1500, 2314, 3000, 4000, 6000, 9000, 12000, 15000])
+        yield (country, f"Университет {i // 10} ({country})", f"Программа {i}: {fields}", rnd.choice(DEGREES),
+               fields, languages, rnd.choice(['1 год', '2 года', '3 года']), cost,
+               'IELTS 6.0+, диплом', '15 июля', f"https://example.edu/{i}")
+
+
+def fill_catalog(db: EducationDatabase, count: int):
+    with db._transaction() as cursor:
+        cursor.execute("DELETE FROM programs")
+        cursor.execute("DELETE FROM program_fields")
+        cursor.execute("DELETE FROM program_languages")
+        for program in generate_programs(count):
+            cursor.execute('''
+                INSERT INTO programs (country, university, program_name, degree, field, language,
+                                    duration, cost_per_year, requirements, application_deadline, website)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', program)
+            db._write_program_links(cursor, cursor.lastrowid, program[4], program[5])
+        cursor.execute("ANALYZE")
+
+
+def legacy_search(db: EducationDatabase, filters: dict):
+    """Исходный запрос: LIKE '%…%' по строкам через запятую без индексов"""
+    query = "SELECT * FROM programs NOT INDEXED WHERE 1=1"
+    params = []
+    if filters.get('degree'):
+        query += " AND degree = ?"
+        params.append(filters['degree'])
+    if filters.get('field'):
+        query += " AND (" + ' OR '.join("field LIKE ?" for _ in filters['field']) + ")"
+        params.extend(f"%{field}%" for field in filters['field'])
+    if filters.get('max_budget') is not None:
+        query += " AND cost_per_year <= ?"
+        params.append(filters['max_budget'])
+    if filters.get('language'):
+        query += " AND language LIKE ?"
+        params.append(f"%{filters['language']}%")
+    query += " ORDER BY cost_per_year ASC LIMIT 5"
+    return db._get_connection().execute(query, params).fetchall()
+
+
+def timed(func, repeat: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--programs', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = EducationDatabase(os.path.join(tmp, 'catalog.db'))
+        fill_catalog(db, args.programs)
+
+        snapshot = None
+        if ProgramCatalog.available():
+            start = time.perf_counter()
+            snapshot = CatalogSnapshot(*db.get_all_programs())
+            print(f"Снимок каталога в памяти построен за {(time.perf_counter() - start) * 1e3:.0f} мс")
+
+        print(f"Каталог: {args.programs} программ, {args.repeat} повторов")
+        print(f"  {'запрос':<28} {'LIKE-скан':>12} {'индексы':>12} {'NumPy':>12}")
+        for label, filters in QUERIES.items():
+            legacy = timed(lambda: legacy_search(db, filters), args.repeat)
+            indexed = timed(lambda: db.search_programs(filters), args.repeat)
+            line = f"  {label:<28} {legacy * 1e3:9.3f} мс {indexed * 1e3:9.3f} мс"
+            if snapshot is not None:
+                assert [p.id for p in snapshot.search(filters)] == [p.id for p in db.search_programs(filters)]
+                in_memory = timed(lambda: snapshot.search(filters), args.repeat)
+                line += f" {in_memory * 1e3:9.3f} мс"
+            print(line)
+
+        print(f"\n  {'полнотекстовый запрос':<40} {'FTS5 + BM25':>12}")
+        for text, filters in TEXT_QUERIES.items():
+            elapsed = timed(lambda: db.search_programs_text(text, filters), args.repeat)
+            print(f"  {text:<40} {elapsed * 1e3:9.3f} мс")
+
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Память на одну закэшированную сессию: исходная модель vs компактная.
+
+Запуск из корня проекта:
+    python -m benchmarks.session_memory --sessions 100000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List
+
+from database.models import UserSession
+
+
+@dataclass
+class LegacyUserSession:
+    """Модель до оптимизации: __dict__, список строк истории"""
+    user_id: int
+    stage: str = "initial"
+    profile: Dict = None
+    conversation_history: List[str] = None
+    interest_score: int = 0
+    last_activity: datetime = None
+
+    def __post_init__(self):
+        if self.profile is None:
+            self.profile = {}
+        if self.conversation_history is None:
+            self.conversation_history = []
+        if self.last_activity is None:
+            self.last_activity = datetime.now()
+
+
+# Типичная сессия после анкеты и пары вопросов к консультанту
+PROFILE_JSON = json.dumps({
+    'degree': 'магистратура',
+    'field': ['ИТ', 'ИИ'],
+    'max_budget': 5000,
+    'language': 'английский',
+    'question_stage': 'complete',
+}, ensure_ascii=False)
+TURNS = [
+    ('user', 'Хочу учиться за границей'),
+    ('user', 'магистратура'),
+    ('user', 'искусственный интеллект'),
+    ('user', 'до 5000 евро'),
+    ('user', 'Какие документы нужны для поступления?'),
+    ('bot', 'Понадобятся диплом с приложением, IELTS 6.5+ и мотивационное письмо.'),
+]
+ROLE_PREFIXES = {'user': 'Пользователь', 'bot': 'Бот'}
+
+
+def build_legacy(user_id: int) -> LegacyUserSession:
+    # Строки создаются заново, как при загрузке из БД и приеме сообщений
+    session = LegacyUserSession(user_id=user_id, stage=''.join(['showing_', 'results']),
+                                profile=json.loads(PROFILE_JSON))
+    for role, text in TURNS:
+        session.conversation_history.append(f"{ROLE_PREFIXES[role]}: {text}")
+    return session
+
+
+def build_compact(user_id: int) -> UserSession:
+    session = UserSession(user_id=user_id, stage=''.join(['showing_', 'results']),
+                          profile=json.loads(PROFILE_JSON))
+    for role, text in TURNS:
+        session.conversation_history.append((role, ''.join([text])))
+    return session
+
+
+def measure(factory, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    sessions = [factory(user_id) for user_id in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sessions
+    return current / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=100000)
+    args = parser.parse_args()
+
+    legacy = measure(build_legacy, args.sessions)
+    compact = measure(build_compact, args.sessions)
+
+    print(f"Сессий: {args.sessions}")
+    print(f"  исходная модель:   {legacy:8.0f} байт/сессия  ({legacy * args.sessions / 2 ** 20:.1f} МБ)")
+    print(f"  компактная модель: {compact:8.0f} байт/сессия  ({compact * args.sessions / 2 ** 20:.1f} МБ)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Последовательная обработка обновлений vs PerUserUpdateProcessor.
+
+Обновления подаются в процессор так же, как это делает Application:
+при одном обработчике за раз каждое ожидается до конца, иначе на каждое
+создается задача. Обработчик - настоящий handle_message с локальной
+моделью (AI_BACKEND=local), временной базой и FakeBot из
+benchmarks.handle_message. Каждый пользователь присылает несколько
+сообщений подряд; скрипт проверяет, что обработчики одного пользователя
+не пересекаются по времени и запускаются в порядке update_id.
+
+Запуск из корня проекта:
+    python -m benchmarks.update_concurrency --users 1 10 40 --messages 2
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+from telegram.ext import SimpleUpdateProcessor
+
+from benchmarks.handle_message import QUESTIONS, FakeBot, FakeChat
+from config.settings import Settings
+from services.update_processor import PerUserUpdateProcessor
+
+
+async def run(processor_name: str, users: int, args) -> dict:
+    # Импорт после настройки Settings: сервисы читают ее при создании
+    from main import setup_bot_data, start_bot_data, stop_bot_data, shutdown_bot_data
+    from handlers.messages import handle_message
+
+    app = SimpleNamespace(bot_data={}, bot=FakeBot())
+    setup_bot_data(app)
+    await start_bot_data(app)
+    context = SimpleNamespace(bot_data=app.bot_data, bot=app.bot)
+
+    if processor_name == 'sequential':
+        processor = SimpleUpdateProcessor(1)
+    else:
+        processor = PerUserUpdateProcessor(Settings.UPDATE_MAX_CONCURRENCY, app.bot_data['ai_admission'])
+
+    running = defaultdict(int)
+    started = defaultdict(list)
+    overlaps = 0
+
+    async def handle(update):
+        nonlocal overlaps
+        user_id = update.effective_user.id
+        running[user_id] += 1
+        overlaps += running[user_id] > 1
+        started[user_id].append(update.update_id)
+        app.bot.chats[user_id] = update.message
+        try:
+            await handle_message(update, context)
+        finally:
+            running[user_id] -= 1
+
+    # Сообщения пользователей перемешаны во времени, как в реальном потоке обновлений
+    updates = []
+    for i in range(args.messages):
+        for user_id in range(1_000_000, 1_000_000 + users):
+            chat = FakeChat(f"{QUESTIONS[(user_id + i) % len(QUESTIONS)]} (вопрос {user_id}-{i})")
+            updates.append(SimpleNamespace(
+                update_id=len(updates) + 1,
+                message=chat,
+                effective_user=SimpleNamespace(id=user_id),
+                effective_chat=SimpleNamespace(id=user_id),
+            ))
+
+    start = time.monotonic()
+    tasks = []
+    for update in updates:
+        if processor.max_concurrent_updates > 1:
+            tasks.append(asyncio.create_task(processor.process_update(update, handle(update))))
+        else:
+            await processor.process_update(update, handle(update))
+        # Обновления приходят не пачкой, а потоком
+        await asyncio.sleep(args.interval)
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - start
+
+    admission = app.bot_data['ai_admission'].get_stats()
+    await stop_bot_data(app)
+    await shutdown_bot_data(app)
+
+    return {
+        'elapsed': elapsed,
+        'updates': len(updates),
+        'answered': sum(1 for update in updates if update.message.first_reply is not None),
+        'overlaps': overlaps,
+        'out_of_order': sum(1 for ids in started.values() if ids != sorted(ids)),
+        'merged': admission['merged_messages'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 10, 40])
+    parser.add_argument('--messages', type=int, default=2, help='сообщений от каждого пользователя')
+    parser.add_argument('--interval', type=float, default=0.01, help='пауза между обновлениями, с')
+    parser.add_argument('--latency-mean', type=float, default=0.5, help='средняя задержка модели, с')
+    args = parser.parse_args()
+
+    print(f"Сообщений от пользователя: {args.messages}, модель ~{args.latency_mean} с, "
+          f"обработчиков одновременно до {Settings.UPDATE_MAX_CONCURRENCY}")
+    with tempfile.TemporaryDirectory() as tmp:
+        Settings.AI_BACKEND = 'local'
+        Settings.AI_STUB_LATENCY_MEAN = args.latency_mean
+        Settings.AI_CACHE_ENABLED = False
+        # Ответ одним сообщением: правки потокового вывода упираются в лимит чата, а не в диспетчер
+        Settings.AI_STREAMING = False
+        for users in args.users:
+            for name in ('sequential', 'per-user'):
+                Settings.DATABASE_PATH = os.path.join(tmp, f'bench-{name}-{users}.db')
+                result = asyncio.run(run(name, users, args))
+                print(f"  {name:10} пользователей {users:4}: {result['updates']} обновлений за "
+                      f"{result['elapsed']:6.2f} с ({result['updates'] / result['elapsed']:6.1f} в секунду), "
+                      f"с ответом {result['answered']}, объединено {result['merged']}, "
+                      f"пересечений {result['overlaps']}, нарушений порядка {result['out_of_order']}")
+
+
+if __name__ == '__main__':
+    main()
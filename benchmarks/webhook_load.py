@@ -0,0 +1,247 @@
+"""Бот в режиме webhook против поддельного Telegram на localhost.
+
+Скрипт поднимает поддельный Bot API (getMe, setWebhook, sendMessage,
+editMessageText и т.д.) и запускает main.py с BOT_MODE=webhook,
+TELEGRAM_API_URL на этот API, локальной моделью (AI_BACKEND=local) и
+временной базой. Когда бот зарегистрирует webhook, скрипт, как Telegram,
+присылает ему обновления POST-запросами с секретом в заголовке
+X-Telegram-Bot-Api-Secret-Token и не больше max_connections запросов
+одновременно. Время до первого ответа бота засекается по вызову
+sendMessage/editMessageText в тот же чат. В конце проверяется, что
+запросы без секрета или с чужим секретом получают 403.
+
+Нужен python-telegram-bot[webhooks].
+
+Запуск из корня проекта:
+    python -m benchmarks.webhook_load --users 50 --messages 3
+    python -m benchmarks.webhook_load --no-spawn   # бот запущен вручную с выведенными переменными
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import secrets
+import signal
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
+
+import httpx
+
+from benchmarks.handle_message import QUESTIONS, percentile
+
+TOKEN = '123456:fake-token'
+
+
+class FakeBotAPI:
+    """Минимальный HTTP/1.1 сервер с методами Bot API, которые вызывает бот"""
+
+    def __init__(self):
+        self.webhook: Optional[dict] = None
+        self.webhook_set = asyncio.Event()
+        self.calls = Counter()
+        self.message_ids = itertools.count(1)
+        self.waiters: Dict[int, asyncio.Future] = {}  # chat_id -> ожидание ответа бота
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = line.decode().split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                params = dict(parse_qsl(body.decode())) if body else {}
+                payload = json.dumps({'ok': True, 'result': self.call(path.rsplit('/', 1)[-1], params)}).encode()
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                             b'Content-Length: %d\r\n\r\n' % len(payload) + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def call(self, method: str, params: dict):
+        self.calls[method] += 1
+        if method == 'getMe':
+            return {'id': 123456, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        if method == 'setWebhook':
+            self.webhook = params
+            self.webhook_set.set()
+            return True
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params['chat_id'])
+            waiter = self.waiters.pop(chat_id, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(time.monotonic())
+            return {
+                'message_id': int(params.get('message_id') or next(self.message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        # sendChatAction, deleteWebhook, answerCallbackQuery, editMessageReplyMarkup
+        return True
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': user,
+            'text': text,
+        },
+    }
+
+
+async def user_session(api: FakeBotAPI, client: httpx.AsyncClient, user_id: int, args, update_ids, results):
+    for i in range(args.messages):
+        text = f"{QUESTIONS[(user_id + i) % len(QUESTIONS)]} (вопрос {user_id}-{i})"
+        waiter = asyncio.get_running_loop().create_future()
+        api.waiters[user_id] = waiter
+        sent = time.monotonic()
+        response = await client.post(api.webhook['url'], json=make_update(next(update_ids), user_id, text),
+                                     headers={'X-Telegram-Bot-Api-Secret-Token': api.webhook['secret_token']})
+        results['ack'].append(time.monotonic() - sent)
+        results['status'][response.status_code] += 1
+        try:
+            replied = await asyncio.wait_for(waiter, timeout=args.reply_timeout)
+            results['reply'].append(replied - sent)
+        except asyncio.TimeoutError:
+            results['timeouts'] += 1
+        await asyncio.sleep(args.think_time)
+
+
+async def check_secret(api: FakeBotAPI) -> Dict[str, int]:
+    """Статусы ответа на запросы без секрета и с неверным секретом"""
+    update = make_update(10 ** 9, 1, "поддельное обновление")
+    async with httpx.AsyncClient() as client:
+        missing = await client.post(api.webhook['url'], json=update)
+        wrong = await client.post(api.webhook['url'], json=update,
+                                  headers={'X-Telegram-Bot-Api-Secret-Token': 'wrong-' + secrets.token_hex(4)})
+    return {'без секрета': missing.status_code, 'чужой секрет': wrong.status_code}
+
+
+def bot_env(args, api_port: int, database_path: str) -> dict:
+    return {
+        'TELEGRAMTOKEN': TOKEN,
+        'TELEGRAM_API_URL': f'http://127.0.0.1:{api_port}/bot',
+        'BOT_MODE': 'webhook',
+        'WEBHOOK_URL': f'http://127.0.0.1:{args.port}',
+        'WEBHOOK_LISTEN': '127.0.0.1',
+        'WEBHOOK_PORT': str(args.port),
+        'WEBHOOK_PATH': 'telegram',
+        'WEBHOOK_SECRET_TOKEN': secrets.token_urlsafe(32),
+        'WEBHOOK_MAX_CONNECTIONS': str(args.max_connections),
+        'AI_BACKEND': 'local',
+        'AI_STUB_LATENCY_MEAN': str(args.latency_mean),
+        'DATABASE_PATH': database_path,
+    }
+
+
+async def run(args):
+    api = FakeBotAPI()
+    server = await asyncio.start_server(api.serve, '127.0.0.1', args.api_port)
+    api_port = server.sockets[0].getsockname()[1]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = bot_env(args, api_port, os.path.join(tmp, 'bench.db'))
+        bot = None
+        log_path = os.path.join(tmp, 'bot.log')
+        if args.no_spawn:
+            print("Поддельный Bot API запущен. Запустите бота с переменными окружения:")
+            for name, value in env.items():
+                print(f"  {name}={value}")
+        else:
+            with open(log_path, 'w') as log:
+                bot = await asyncio.create_subprocess_exec(sys.executable, 'main.py', env={**os.environ, **env},
+                                                           stdout=log, stderr=log)
+
+        try:
+            waiting = [asyncio.ensure_future(api.webhook_set.wait())]
+            if bot is not None:
+                waiting.append(asyncio.ensure_future(bot.wait()))
+            await asyncio.wait(waiting, timeout=None if args.no_spawn else args.startup_timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+            for future in waiting:
+                future.cancel()
+            if api.webhook is None:
+                print("❌ Бот не зарегистрировал webhook. Последние строки его вывода:")
+                if bot is not None:
+                    with open(log_path) as log:
+                        print(''.join(log.readlines()[-15:]))
+                return
+
+            max_connections = int(api.webhook.get('max_connections', 40))
+            print(f"Webhook: {api.webhook['url']}, max_connections {max_connections}")
+            print(f"Пользователей: {args.users} x {args.messages} сообщений, модель ~{args.latency_mean} с")
+
+            results = {'ack': [], 'reply': [], 'timeouts': 0, 'status': Counter()}
+            update_ids = itertools.count(1)
+            limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            start = time.monotonic()
+            async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+                await asyncio.gather(*(
+                    user_session(api, client, 1_000_000 + user_id, args, update_ids, results)
+                    for user_id in range(args.users)
+                ))
+            elapsed = time.monotonic() - start
+
+            total = args.users * args.messages
+            statuses = ', '.join(f"{status}: {count}" for status, count in sorted(results['status'].items()))
+            print(f"  обновлений {total} за {elapsed:.2f} с ({total / elapsed:.1f} в секунду), ответы webhook {statuses}")
+            print(f"  ответ webhook  p50 {statistics.median(results['ack']) * 1000:7.1f} мс  "
+                  f"p99 {percentile(results['ack'], 0.99) * 1000:7.1f} мс")
+            if results['reply']:
+                print(f"  первый ответ   p50 {statistics.median(results['reply']) * 1000:7.0f} мс  "
+                      f"p99 {percentile(results['reply'], 0.99) * 1000:7.0f} мс")
+            print(f"  без ответа за {args.reply_timeout:g} с: {results['timeouts']}")
+            print(f"  вызовы Bot API: {dict(api.calls)}")
+            for case, status in (await check_secret(api)).items():
+                print(f"  {case}: HTTP {status} {'✅' if status == 403 else '❌ ожидался 403'}")
+        finally:
+            if bot is not None and bot.returncode is None:
+                bot.send_signal(signal.SIGINT)
+                try:
+                    await asyncio.wait_for(bot.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    bot.kill()
+            server.close()
+            await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=3, help='сообщений от каждого пользователя')
+    parser.add_argument('--think-time', type=float, default=0.5, help='пауза между сообщениями, с')
+    parser.add_argument('--latency-mean', type=float, default=0.8, help='средняя задержка локальной модели, с')
+    parser.add_argument('--max-connections', type=int, default=40, help='WEBHOOK_MAX_CONNECTIONS для бота')
+    parser.add_argument('--port', type=int, default=8443, help='порт webhook-сервера бота')
+    parser.add_argument('--api-port', type=int, default=0, help='порт поддельного Bot API (0 - любой свободный)')
+    parser.add_argument('--reply-timeout', type=float, default=60)
+    parser.add_argument('--startup-timeout', type=float, default=30)
+    parser.add_argument('--no-spawn', action='store_true', help='не запускать бота, только поддельный Bot API')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -25,13 +25,100 @@ class Settings:
                 OPERATOR_IDS.append(int(op_id.strip()))
 
     # AI настройки
+    AI_BACKEND = os.getenv("AI_BACKEND", "huggingface")  # huggingface | local
     AI_MODEL = "openai/gpt-oss-120b"
     AI_PROVIDER = "fireworks-ai"
     MAX_TOKENS = 500
     TEMPERATURE = 0.8
+    AI_MAX_CONCURRENCY = 8  # одновременных запросов к модели
+    AI_REQUEST_TIMEOUT = 30  # секунды на один ответ, включая повторы
+    AI_ATTEMPT_TIMEOUT = 12  # секунды на одну попытку
+    AI_MAX_RETRIES = 2  # повторов при таймаутах, 429 и 5xx
+    AI_RETRY_BACKOFF_BASE = 0.5  # секунды; пауза растет вдвое со случайным разбросом
+    AI_RETRY_BACKOFF_MAX = 4
+    AI_CIRCUIT_FAILURE_THRESHOLD = 5  # ошибок подряд до отключения провайдера
+    AI_CIRCUIT_RESET_TIMEOUT = 30  # секунды до пробного запроса
+
+    # Локальная замена модели (AI_BACKEND=local) для нагрузочных тестов без сети
+    AI_STUB_LATENCY = os.getenv("AI_STUB_LATENCY", "lognormal")  # fixed | uniform | exponential | lognormal
+    AI_STUB_LATENCY_MEAN = float(os.getenv("AI_STUB_LATENCY_MEAN", "0.8"))  # секунды до первого токена
+    AI_STUB_TOKENS_PER_SECOND = float(os.getenv("AI_STUB_TOKENS_PER_SECOND", "40"))
+    AI_STUB_ERROR_RATE = float(os.getenv("AI_STUB_ERROR_RATE", "0"))
+    AI_STUB_HANG_RATE = float(os.getenv("AI_STUB_HANG_RATE", "0"))
+    AI_MAX_QUEUE = 100  # запросов, ожидающих свободный слот; остальным сразу отказ
+    AI_QUEUE_TIMEOUT = 15  # секунды ожидания слота
+    AI_PROMPT_TOKEN_BUDGET = 3000  # оценка токенов промпта: системный промпт, профиль, история, вопрос
+
+    # Сжатие длинных диалогов: старые реплики заменяются кратким содержанием в фоне
+    SUMMARY_TRIGGER_TURNS = 12  # реплик в памяти, после которых запускается сжатие
+    SUMMARY_KEEP_TURNS = 6  # последних реплик, которые остаются дословно
+    SUMMARY_MAX_TOKENS = 250
+
+    # Потоковый ответ: первое сообщение после короткого начала, дальше правки не чаще интервала
+    AI_STREAMING = True
+    STREAM_FIRST_MESSAGE_CHARS = 40
+    STREAM_EDIT_INTERVAL = 1.0  # секунды; Telegram ограничивает частоту правок в одном чате
+
+    # Кэш ответов модели на повторяющиеся вопросы
+    AI_CACHE_ENABLED = True
+    AI_CACHE_MAX_ENTRIES = 20000  # записей в SQLite
+    AI_CACHE_MEMORY_ENTRIES = 2000  # записей в памяти процесса
+    AI_CACHE_TTL = 86400  # секунды
+    AI_CACHE_MIN_WORDS = 3  # короткие реплики ("а там?") зависят от контекста и не кэшируются
 
     # База данных
-    DATABASE_PATH = "data/education.db"
+    DATABASE_PATH = os.getenv("DATABASE_PATH", "data/education.db")
+
+    # Отложенная запись сессий: пакет сбрасывается по таймеру или по размеру
+    SESSION_WRITE_BEHIND = True
+    SESSION_FLUSH_INTERVAL = 2.0  # секунды
+    SESSION_FLUSH_BATCH_SIZE = 200
+
+    # Кэш активных сессий в памяти
+    SESSION_CACHE_MAX_ENTRIES = 10000
+    SESSION_CACHE_MAX_MEMORY_MB = 64
+    SESSION_IDLE_TTL = 3600  # секунды простоя до вытеснения
+
+    # История диалогов
+    MESSAGE_FLUSH_BATCH_SIZE = 100
+    HISTORY_PAGE_SIZE = 20
+    LEAD_REPORT_MESSAGES = 3
+
+    # Каталог программ в памяти (нужен NumPy)
+    PROGRAM_CATALOG_IN_MEMORY = True
+    PROGRAM_CATALOG_REFRESH_INTERVAL = 30  # секунды между проверками версии каталога
+
+    # Кэш результатов поиска программ
+    SEARCH_CACHE_MAX_ENTRIES = 1000
+    SEARCH_CACHE_TTL = 600  # секунды
+    PROGRAMS_PAGE_SIZE = 3  # программ в одном сообщении
+
+    # Импорт каталога программ
+    IMPORT_CHUNK_SIZE = 1000  # строк в одной транзакции
+
+    # Исходящие сообщения: лимиты Telegram
+    # За любую секунду уходит не больше rate + burst: с запасом до 30 в секунду от бота
+    OUTBOUND_GLOBAL_RATE = 25  # сообщений в секунду от бота
+    OUTBOUND_GLOBAL_BURST = 5
+    OUTBOUND_CHAT_RATE = 1.0  # сообщений в секунду в личный чат
+    OUTBOUND_CHAT_BURST = 2
+    OUTBOUND_GROUP_RATE = 20 / 60  # в групповой чат - 20 в минуту
+    OUTBOUND_GROUP_BURST = 3
+    OUTBOUND_MAX_QUEUE = 1000  # сверх этого рассылки получают отказ
+    OUTBOUND_MAX_RETRIES = 3  # повторов после RetryAfter
+
+    # Обработка обновлений: разные пользователи параллельно, сообщения одного - по порядку
+    UPDATE_MAX_CONCURRENCY = 64  # обработчиков одновременно
+
+    # Прием обновлений: polling для разработки или webhook для продакшена
+    BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling | webhook
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # публичный адрес, например https://bot.example.com
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+    WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")  # Telegram присылает его в заголовке каждого запроса
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # одновременных запросов от Telegram, 1-100
+    TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # другой Bot API, например локальный из benchmarks/webhook_load.py
 
     # Пороги для лидов
     HIGH_INTEREST_THRESHOLD = 5
@@ -270,4 +357,11 @@ class AIPrompts:
     - ВСЕГДА подчеркивай необходимость профессиональной помощи для сложных случаев
 
     ПОМНИ: Ты не просто отвечаешь на вопросы, а ведешь клиента к цели - успешному поступлению в зарубежный университет.
+    """
+
+    CONVERSATION_SUMMARY = """
+    Ты ведешь заметки консультанта по образованию за рубежом. Обнови краткое содержание диалога с клиентом:
+    объедини прежнее содержание с новыми репликами. Сохрани факты о клиенте (цели, страны, бюджет, сроки,
+    документы, сомнения), заданные вопросы и данные ему рекомендации. Пиши сжато, от третьего лица,
+    не больше 5-7 предложений, без приветствий и оценок.
     """
\ No newline at end of file
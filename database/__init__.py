@@ -1,4 +1,5 @@
 from .education_db import EducationDatabase
-from .models import Program, UserSession, Lead
+from .async_db import AsyncEducationDatabase
+from .models import Program, Profile, UserSession, ConversationMessage, Lead
 
-__all__ = ['EducationDatabase', 'Program', 'UserSession', 'Lead']
\ No newline at end of file
+__all__ = ['EducationDatabase', 'AsyncEducationDatabase', 'Program', 'Profile', 'UserSession', 'ConversationMessage', 'Lead']
\ No newline at end of file
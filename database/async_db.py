@@ -0,0 +1,107 @@
+import asyncio
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import List, Dict, Optional, Tuple
+from .education_db import EducationDatabase
+from .models import Program, UserSession, ConversationMessage
+
+
+class AsyncEducationDatabase:
+    """Асинхронный интерфейс к EducationDatabase.
+
+    Все запросы выполняются по очереди в выделенном потоке БД, поэтому
+    медленная запись не останавливает event loop и остальные чаты.
+    """
+
+    def __init__(self, db: EducationDatabase, message_batch_size: int = 100):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='education-db')
+
+        # Реплики копятся в памяти и пишутся в messages пакетами
+        self.message_batch_size = message_batch_size
+        self._pending_messages: List[tuple] = []
+
+    async def _run(self, func, *args):
+        """Выполнение синхронного метода в потоке БД"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    async def search_programs(self, filters: Dict, limit: int = 5,
+                              after: Optional[Tuple[float, int]] = None) -> List[Program]:
+        """Поиск программ по фильтрам, after - курсор (cost_per_year, id)"""
+        # Копия, чтобы профиль можно было менять, пока запрос ждет в очереди
+        return await self._run(self.db.search_programs, copy.deepcopy(filters), limit, after)
+
+    async def search_programs_text(self, query: str, filters: Optional[Dict] = None,
+                                   limit: int = 10) -> List[Program]:
+        """Полнотекстовый поиск программ с ранжированием BM25"""
+        return await self._run(self.db.search_programs_text, query, copy.deepcopy(filters), limit)
+
+    async def get_catalog_version(self) -> int:
+        """Текущая версия каталога программ"""
+        return await self._run(self.db.get_catalog_version)
+
+    async def get_all_programs(self) -> Tuple[int, List[Program]]:
+        """Все программы вместе с версией каталога"""
+        return await self._run(self.db.get_all_programs)
+
+    async def get_user_session(self, user_id: int) -> Optional[UserSession]:
+        """Получение сессии пользователя"""
+        await self.flush_messages()
+        return await self._run(self.db.get_user_session, user_id)
+
+    async def save_user_session(self, session: UserSession):
+        """Сохранение сессии пользователя"""
+        # Снимок делается в потоке event loop, где живет сама сессия
+        row = EducationDatabase.session_row(session)
+        await self._run(self.db.save_session_rows, [row])
+
+    async def save_user_sessions(self, sessions: List[UserSession]):
+        """Пакетное сохранение сессий одной транзакцией"""
+        rows = [EducationDatabase.session_row(session) for session in sessions]
+        if rows:
+            await self._run(self.db.save_session_rows, rows)
+
+    async def append_message(self, user_id: int, role: str, text: str):
+        """Добавление реплики в историю (запись пакетами)"""
+        self._pending_messages.append((user_id, role, text, datetime.now()))
+        if len(self._pending_messages) >= self.message_batch_size:
+            await self.flush_messages()
+
+    async def flush_messages(self):
+        """Запись накопленных реплик одной транзакцией"""
+        if not self._pending_messages:
+            return
+        batch, self._pending_messages = self._pending_messages, []
+        await self._run(self.db.append_messages, batch)
+
+    async def get_messages(self, user_id: int, limit: int,
+                           before: Optional[Tuple[datetime, int]] = None) -> List[ConversationMessage]:
+        """Страница истории пользователя (старые реплики - первыми)"""
+        # Поток БД выполняет задачи по порядку, поэтому запрос увидит все реплики
+        await self.flush_messages()
+        return await self._run(self.db.get_messages, user_id, limit, before)
+
+    async def create_lead(self, user_id: int, score: int) -> int:
+        """Создание лида"""
+        return await self._run(self.db.create_lead, user_id, score)
+
+    async def get_ai_response(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        """Ответ модели из постоянного кэша"""
+        return await self._run(self.db.get_ai_response, key, now)
+
+    async def save_ai_response(self, key: str, response: str, expires_at: float):
+        """Сохранение ответа модели в постоянный кэш"""
+        await self._run(self.db.save_ai_response, key, response, expires_at)
+
+    async def prune_ai_cache(self, now: float, max_entries: int) -> int:
+        """Очистка постоянного кэша ответов модели"""
+        return await self._run(self.db.prune_ai_cache, now, max_entries)
+
+    async def close(self):
+        """Закрытие соединений и остановка потока БД"""
+        await self.flush_messages()
+        await self._run(self.db.close)
+        self._executor.shutdown(wait=True)
@@ -1,21 +1,129 @@
 import sqlite3
 import json
+import re
+import sys
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
-from .models import Program, UserSession, Lead
+from typing import List, Dict, Optional, Tuple
+from .models import Program, UserSession, ConversationMessage, Lead
+
+
+def split_terms(value: str) -> List[str]:
+    """Разбор строки вида "ИИ, ИТ" в нормализованные термины для таблиц связей"""
+    terms = []
+    for term in value.split(','):
+        term = term.strip().lower()
+        if term and term not in terms:
+            terms.append(term)
+    return terms
+
+
+# Слова запроса для FTS: буквы и цифры, без операторов синтаксиса MATCH
+FTS_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+FTS_MAX_TOKENS = 12
+FTS_STOPWORDS = frozenset({
+    'в', 'во', 'на', 'по', 'до', 'из', 'за', 'от', 'для', 'и', 'или', 'с', 'со', 'о', 'об', 'про',
+    'хочу', 'хотел', 'хотела', 'учиться', 'учеба', 'учёба', 'программа', 'программы', 'где', 'как', 'какие',
+})
+
+
+def build_fts_query(text: str) -> str:
+    """Свободный текст пользователя -> безопасный запрос MATCH.
+
+    Длинные слова усекаются до префикса, чтобы "Германии" находило
+    "Германия"; короткие (ИТ, ИИ) ищутся целиком. Слова объединяются
+    через OR, а BM25 поднимает выше программы, совпавшие по большему
+    числу слов.
+    """
+    terms = []
+    for token in FTS_TOKEN_RE.findall(text.lower()):
+        if len(token) < 2 or token in FTS_STOPWORDS:
+            continue
+        if len(token) <= 3:
+            term = f'"{token}"'
+        else:
+            term = f'"{token[:-2] if len(token) >= 6 else token[:-1]}"*'
+        if term not in terms:
+            terms.append(term)
+    return ' OR '.join(terms[:FTS_MAX_TOKENS])
 
 
 class EducationDatabase:
-    def __init__(self, db_path: str):
+    # Настройки каждого соединения: WAL позволяет читать во время записи,
+    # synchronous=NORMAL в режиме WAL делает fsync только на checkpoint
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=-16000",  # ~16 МБ страничного кэша
+        "PRAGMA mmap_size=134217728",  # 128 МБ memory-mapped I/O
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA busy_timeout=5000",
+    )
+
+    # Размер кэша подготовленных выражений на соединение
+    STATEMENT_CACHE_SIZE = 128
+
+    # Версия схемы (PRAGMA user_version) для миграций существующих баз
+    SCHEMA_VERSION = 4
+
+    # Колонки программы в порядке полей модели Program
+    PROGRAM_COLUMNS = ('p.id, p.country, p.university, p.program_name, p.degree, p.field, p.language, '
+                       'p.duration, p.cost_per_year, p.requirements, p.application_deadline, p.website')
+
+    # Веса колонок programs_fts для bm25: program_name, university, field, requirements, country
+    FTS_WEIGHTS = '10.0, 3.0, 5.0, 1.0, 3.0'
+
+    def __init__(self, db_path: str, seed_samples: bool = True):
+        """seed_samples=False - не заполнять пустой каталог примерами (импорт своего каталога)"""
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self.init_database()
-        self.populate_sample_data()
+        if seed_samples:
+            self.populate_sample_data()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Долгоживущее соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                cached_statements=self.STATEMENT_CACHE_SIZE,
+                check_same_thread=False
+            )
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Курсор в транзакции: commit при успехе, rollback при ошибке"""
+        conn = self._get_connection()
+        with conn:
+            yield conn.cursor()
+
+    def close(self):
+        """Закрытие всех открытых соединений"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
 
     def init_database(self):
         """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._transaction() as cursor:
+            self._create_tables(cursor)
+            self._migrate(cursor)
 
+    def _create_tables(self, cursor: sqlite3.Cursor):
+        """Создание таблиц"""
         # Таблица программ
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS programs (
@@ -64,17 +172,156 @@ class EducationDatabase:
             )
         ''')
 
-        conn.commit()
-        conn.close()
+        # История диалогов (только добавление)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_messages_user_created
+            ON messages (user_id, created_at)
+        ''')
+
+        # Нормализованные связи программ с областями и языками
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS program_fields (
+                program_id INTEGER NOT NULL,
+                field TEXT NOT NULL,
+                PRIMARY KEY (program_id, field)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS program_languages (
+                program_id INTEGER NOT NULL,
+                language TEXT NOT NULL,
+                PRIMARY KEY (program_id, language)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_program_fields_field ON program_fields (field, program_id)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_program_languages_language ON program_languages (language, program_id)"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_programs_degree_cost ON programs (degree, cost_per_year)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_programs_cost ON programs (cost_per_year)")
+
+        # Полнотекстовый индекс по программам, синхронизируется триггерами
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS programs_fts USING fts5(
+                program_name, university, field, requirements, country,
+                content='programs', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS programs_fts_insert AFTER INSERT ON programs BEGIN
+                INSERT INTO programs_fts (rowid, program_name, university, field, requirements, country)
+                VALUES (new.id, new.program_name, new.university, new.field, new.requirements, new.country);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS programs_fts_delete AFTER DELETE ON programs BEGIN
+                INSERT INTO programs_fts (programs_fts, rowid, program_name, university, field, requirements, country)
+                VALUES ('delete', old.id, old.program_name, old.university, old.field, old.requirements, old.country);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS programs_fts_update AFTER UPDATE ON programs BEGIN
+                INSERT INTO programs_fts (programs_fts, rowid, program_name, university, field, requirements, country)
+                VALUES ('delete', old.id, old.program_name, old.university, old.field, old.requirements, old.country);
+                INSERT INTO programs_fts (rowid, program_name, university, field, requirements, country)
+                VALUES (new.id, new.program_name, new.university, new.field, new.requirements, new.country);
+            END
+        ''')
+
+        # Версия каталога программ: растет при любом изменении programs
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('programs_version', 0)")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS programs_version_{event.lower()} AFTER {event} ON programs BEGIN
+                    UPDATE catalog_meta SET value = value + 1 WHERE key = 'programs_version';
+                END
+            ''')
+
+        # Кэш ответов модели: ключ - хэш нормализованного вопроса и профиля
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_expires ON ai_cache (expires_at)")
+
+    def _migrate(self, cursor: sqlite3.Cursor):
+        """Миграция существующей базы до текущей версии схемы"""
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+
+        if version < 1:
+            # Заполнение таблиц связей из строк через запятую
+            cursor.execute("DELETE FROM program_fields")
+            cursor.execute("DELETE FROM program_languages")
+            programs = cursor.execute("SELECT id, field, language FROM programs").fetchall()
+            for program_id, field, language in programs:
+                self._write_program_links(cursor, program_id, field, language)
+
+        if version < 2:
+            # Построение полнотекстового индекса по уже существующим программам
+            cursor.execute("INSERT INTO programs_fts (programs_fts) VALUES ('rebuild')")
+
+        if version < 3:
+            # Естественный ключ программы: дубликаты удаляются, остается последняя запись
+            duplicates = cursor.execute('''
+                SELECT id FROM programs WHERE id NOT IN (
+                    SELECT MAX(id) FROM programs GROUP BY university, program_name
+                )
+            ''').fetchall()
+            cursor.executemany("DELETE FROM programs WHERE id = ?", duplicates)
+            cursor.executemany("DELETE FROM program_fields WHERE program_id = ?", duplicates)
+            cursor.executemany("DELETE FROM program_languages WHERE program_id = ?", duplicates)
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_programs_natural_key
+                ON programs (university, program_name)
+            ''')
+
+        if version < 4:
+            # Краткое содержание старой части диалога
+            cursor.execute("ALTER TABLE users ADD COLUMN summary TEXT DEFAULT ''")
+            cursor.execute("ALTER TABLE users ADD COLUMN summary_turns INTEGER DEFAULT 0")
+
+        if version < self.SCHEMA_VERSION:
+            cursor.execute("ANALYZE")
+            cursor.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    @staticmethod
+    def _write_program_links(cursor: sqlite3.Cursor, program_id: int, field: str, language: str):
+        """Запись областей и языков программы в таблицы связей"""
+        cursor.executemany(
+            "INSERT OR IGNORE INTO program_fields (program_id, field) VALUES (?, ?)",
+            [(program_id, term) for term in split_terms(field)]
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO program_languages (program_id, language) VALUES (?, ?)",
+            [(program_id, term) for term in split_terms(language)]
+        )
 
     def populate_sample_data(self):
         """Заполнение примерами из исходного кода"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._get_connection().cursor()
 
         cursor.execute("SELECT COUNT(*) FROM programs")
         if cursor.fetchone()[0] > 0:
-            conn.close()
             return
 
         # Ваши программы из EDUCATION_DATABASE
@@ -101,110 +348,275 @@ class EducationDatabase:
              "https://helsinki.fi/datascience")
         ]
 
-        cursor.executemany('''
-            INSERT INTO programs (country, university, program_name, degree, field, language, 
-                                duration, cost_per_year, requirements, application_deadline, website)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', sample_programs)
+        self.upsert_programs(sample_programs)
+
+    def upsert_programs(self, rows: List[tuple]) -> int:
+        """Вставка или обновление программ по естественному ключу (university, program_name).
+
+        rows - кортежи в порядке колонок populate_sample_data. Неизменившиеся
+        строки не перезаписываются, поэтому не сдвигают версию каталога.
+        Возвращает число вставленных или измененных программ.
+        """
+        with self._transaction() as cursor:
+            # Связи переписываются только у новых программ и при смене областей или языков
+            existing = {}
+            for row in rows:
+                found = cursor.execute(
+                    "SELECT field, language FROM programs WHERE university = ? AND program_name = ?",
+                    (row[1], row[2])
+                ).fetchone()
+                existing[(row[1], row[2])] = found
+            cursor.executemany('''
+                INSERT INTO programs (country, university, program_name, degree, field, language,
+                                    duration, cost_per_year, requirements, application_deadline, website)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (university, program_name) DO UPDATE SET
+                    country = excluded.country, degree = excluded.degree, field = excluded.field,
+                    language = excluded.language, duration = excluded.duration,
+                    cost_per_year = excluded.cost_per_year, requirements = excluded.requirements,
+                    application_deadline = excluded.application_deadline, website = excluded.website
+                WHERE (programs.country, programs.degree, programs.field, programs.language, programs.duration,
+                       programs.cost_per_year, programs.requirements, programs.application_deadline,
+                       programs.website)
+                   IS NOT (excluded.country, excluded.degree, excluded.field, excluded.language, excluded.duration,
+                           excluded.cost_per_year, excluded.requirements, excluded.application_deadline,
+                           excluded.website)
+            ''', rows)
+            changed = cursor.rowcount
+
+            for row in rows:
+                if existing[(row[1], row[2])] == (row[4], row[5]):
+                    continue
+                program_id = cursor.execute(
+                    "SELECT id FROM programs WHERE university = ? AND program_name = ?", (row[1], row[2])
+                ).fetchone()[0]
+                cursor.execute("DELETE FROM program_fields WHERE program_id = ?", (program_id,))
+                cursor.execute("DELETE FROM program_languages WHERE program_id = ?", (program_id,))
+                self._write_program_links(cursor, program_id, row[4], row[5])
+
+        return changed
+
+    def get_catalog_version(self) -> int:
+        """Текущая версия каталога программ"""
+        cursor = self._get_connection().cursor()
+        cursor.execute("SELECT value FROM catalog_meta WHERE key = 'programs_version'")
+        return cursor.fetchone()[0]
+
+    def get_all_programs(self) -> Tuple[int, List[Program]]:
+        """Все программы вместе с версией каталога, прочитанные одним снимком"""
+        conn = self._get_connection()
+        with conn:
+            # Явная транзакция чтения: версия и строки согласованы между собой
+            conn.execute("BEGIN")
+            version = conn.execute("SELECT value FROM catalog_meta WHERE key = 'programs_version'").fetchone()[0]
+            rows = conn.execute(f"SELECT {self.PROGRAM_COLUMNS} FROM programs AS p").fetchall()
+        return version, [self._row_to_program(row) for row in rows]
+
+    def search_programs(self, filters: Dict, limit: int = 5,
+                        after: Optional[Tuple[float, int]] = None) -> List[Program]:
+        """Поиск программ по фильтрам.
+
+        Результаты упорядочены по (cost_per_year, id); after - ключ последней
+        показанной программы, следующая страница начинается строго после него.
+        """
+        cursor = self._get_connection().cursor()
 
-        conn.commit()
-        conn.close()
+        where, params = self._program_filter_clause(filters)
+        if after is not None:
+            where += " AND (p.cost_per_year, p.id) > (?, ?)"
+            params.extend(after)
+        cursor.execute(f'''
+            SELECT {self.PROGRAM_COLUMNS} FROM programs AS p
+            WHERE {where}
+            ORDER BY p.cost_per_year ASC, p.id ASC LIMIT ?
+        ''', [*params, limit])
 
-    def search_programs(self, filters: Dict) -> List[Program]:
-        """Поиск программ по фильтрам"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        return [self._row_to_program(row) for row in cursor.fetchall()]
 
-        query = "SELECT * FROM programs WHERE 1=1"
+    def search_programs_text(self, query: str, filters: Optional[Dict] = None, limit: int = 10) -> List[Program]:
+        """Полнотекстовый поиск программ с ранжированием BM25"""
+        match = build_fts_query(query)
+        if not match:
+            return []
+
+        where, params = self._program_filter_clause(filters or {})
+        cursor = self._get_connection().cursor()
+        cursor.execute(f'''
+            SELECT {self.PROGRAM_COLUMNS} FROM programs_fts
+            JOIN programs AS p ON p.id = programs_fts.rowid
+            WHERE programs_fts MATCH ? AND {where}
+            ORDER BY bm25(programs_fts, {self.FTS_WEIGHTS}) LIMIT ?
+        ''', [match, *params, limit])
+
+        return [self._row_to_program(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _program_filter_clause(filters: Dict) -> Tuple[str, list]:
+        """Условие WHERE по профилю; области и языки ищутся по таблицам связей"""
+        conditions = ["1=1"]
         params = []
 
         if filters.get('degree'):
-            query += " AND degree = ?"
+            conditions.append("p.degree = ?")
             params.append(filters['degree'])
 
-        if filters.get('field'):
-            field_conditions = []
-            for field in filters['field']:
-                field_conditions.append("field LIKE ?")
-                params.append(f"%{field}%")
-            if field_conditions:
-                query += f" AND ({' OR '.join(field_conditions)})"
+        fields = [field.strip().lower() for field in filters.get('field') or [] if field.strip()]
+        if fields:
+            placeholders = ', '.join('?' * len(fields))
+            conditions.append(
+                f"EXISTS (SELECT 1 FROM program_fields AS f "
+                f"WHERE f.program_id = p.id AND f.field IN ({placeholders}))"
+            )
+            params.extend(fields)
 
         if filters.get('max_budget') is not None:
-            query += " AND cost_per_year <= ?"
+            conditions.append("p.cost_per_year <= ?")
             params.append(filters['max_budget'])
 
         if filters.get('language'):
-            query += " AND language LIKE ?"
-            params.append(f"%{filters['language']}%")
-
-        query += " ORDER BY cost_per_year ASC LIMIT 5"
-
-        cursor.execute(query, params)
-        programs = []
-
-        for row in cursor.fetchall():
-            program = Program(
-                id=row[0], country=row[1], university=row[2], program_name=row[3],
-                degree=row[4], field=row[5], language=row[6], duration=row[7],
-                cost_per_year=row[8], requirements=row[9], application_deadline=row[10],
-                website=row[11]
+            conditions.append(
+                "EXISTS (SELECT 1 FROM program_languages AS l "
+                "WHERE l.program_id = p.id AND l.language = ?)"
             )
-            programs.append(program)
+            params.append(filters['language'].strip().lower())
+
+        return ' AND '.join(conditions), params
 
-        conn.close()
-        return programs
+    @staticmethod
+    def _row_to_program(row: tuple) -> Program:
+        return Program(
+            id=row[0], country=row[1], university=row[2], program_name=row[3],
+            degree=row[4], field=row[5], language=row[6], duration=row[7],
+            cost_per_year=row[8], requirements=row[9], application_deadline=row[10],
+            website=row[11]
+        )
 
     def save_user_session(self, session: UserSession):
         """Сохранение сессии пользователя"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.save_session_rows([self.session_row(session)])
 
-        cursor.execute('''
-            INSERT OR REPLACE INTO users 
-            (user_id, profile, stage, interest_score, last_activity)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
+    @staticmethod
+    def session_row(session: UserSession) -> tuple:
+        """Снимок сессии в виде строки таблицы users"""
+        return (
             session.user_id,
             json.dumps(session.profile),
             session.stage,
             session.interest_score,
-            session.last_activity
-        ))
+            session.last_activity,
+            session.summary,
+            session.summary_turns
+        )
 
-        conn.commit()
-        conn.close()
+    def save_session_rows(self, rows: List[tuple]):
+        """Сохранение подготовленных строк сессий одной транзакцией"""
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO users 
+                (user_id, profile, stage, interest_score, last_activity, summary, summary_turns)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
 
     def get_user_session(self, user_id: int) -> Optional[UserSession]:
         """Получение сессии пользователя"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._get_connection().cursor()
 
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        cursor.execute('''
+            SELECT user_id, profile, stage, interest_score, last_activity, summary, summary_turns,
+                   (SELECT COUNT(*) FROM messages WHERE messages.user_id = users.user_id)
+            FROM users WHERE user_id = ?
+        ''', (user_id,))
         row = cursor.fetchone()
-        conn.close()
 
         if row:
-            return UserSession(
+            session = UserSession(
                 user_id=row[0],
-                profile=json.loads(row[4]) if row[4] else {},
-                stage=row[5],
-                interest_score=row[6],
-                last_activity=datetime.fromisoformat(row[8]) if row[8] else datetime.now()
+                profile=json.loads(row[1]) if row[1] else {},
+                stage=row[2],
+                interest_score=row[3],
+                last_activity=datetime.fromisoformat(row[4]) if row[4] else datetime.now(),
+                summary=row[5] or '',
+                summary_turns=row[6] or 0
             )
+            # В память загружаются только реплики, которых еще нет в summary:
+            # summary_turns - число первых реплик пользователя, а не позиция в буфере
+            unsummarized = min(UserSession.HISTORY_MAX, max(0, row[7] - session.summary_turns))
+            if unsummarized:
+                for message in self.get_messages(user_id, unsummarized):
+                    session.conversation_history.append((message.role, message.text))
+            session.history_start = row[7] - len(session.conversation_history)
+            return session
         return None
 
+    def append_messages(self, rows: List[tuple]):
+        """Пакетная запись реплик (user_id, role, text, created_at)"""
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                INSERT INTO messages (user_id, role, text, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+
+    def get_messages(self, user_id: int, limit: int,
+                     before: Optional[Tuple[datetime, int]] = None) -> List[ConversationMessage]:
+        """Последние реплики пользователя (старые - первыми).
+
+        before - (created_at, id) самой старой уже загруженной реплики для
+        получения предыдущей страницы.
+        """
+        cursor = self._get_connection().cursor()
+
+        if before is None:
+            cursor.execute('''
+                SELECT id, user_id, role, text, created_at FROM messages
+                WHERE user_id = ?
+                ORDER BY created_at DESC, id DESC LIMIT ?
+            ''', (user_id, limit))
+        else:
+            cursor.execute('''
+                SELECT id, user_id, role, text, created_at FROM messages
+                WHERE user_id = ? AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC LIMIT ?
+            ''', (user_id, before[0], before[1], limit))
+
+        messages = [
+            ConversationMessage(id=row[0], user_id=row[1], role=sys.intern(row[2]), text=row[3],
+                                created_at=datetime.fromisoformat(row[4]))
+            for row in cursor.fetchall()
+        ]
+        messages.reverse()
+        return messages
+
     def create_lead(self, user_id: int, score: int) -> int:
         """Создание лида"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO leads (user_id, score, status)
+                VALUES (?, ?, 'new')
+            ''', (user_id, score))
 
-        cursor.execute('''
-            INSERT INTO leads (user_id, score, status)
-            VALUES (?, ?, 'new')
-        ''', (user_id, score))
-
-        lead_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return lead_id
\ No newline at end of file
+            return cursor.lastrowid
+
+    def get_ai_response(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        """Неустаревший ответ модели из кэша: (текст, время истечения)"""
+        cursor = self._get_connection().cursor()
+        cursor.execute("SELECT response, expires_at FROM ai_cache WHERE key = ? AND expires_at > ?", (key, now))
+        return cursor.fetchone()
+
+    def save_ai_response(self, key: str, response: str, expires_at: float):
+        """Сохранение ответа модели в кэш"""
+        with self._transaction() as cursor:
+            cursor.execute("INSERT OR REPLACE INTO ai_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                           (key, response, expires_at))
+
+    def prune_ai_cache(self, now: float, max_entries: int) -> int:
+        """Удаление устаревших ответов и самых старых сверх max_entries"""
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (now,))
+            removed = cursor.rowcount
+            # При одинаковом TTL раньше истекают раньше записанные
+            cursor.execute('''
+                DELETE FROM ai_cache WHERE key IN (
+                    SELECT key FROM ai_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (max_entries,))
+            return removed + cursor.rowcount
\ No newline at end of file
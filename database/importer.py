@@ -0,0 +1,181 @@
+"""Потоковый импорт каталога программ из CSV или JSONL.
+
+Запуск из корня проекта:
+    python -m database.importer programs.csv
+    python -m database.importer programs.jsonl --chunk-size 2000
+
+Файл читается построчно, в памяти держится только текущий пакет строк,
+поэтому размер каталога не ограничен. Программы сопоставляются по паре
+(university, program_name): существующие обновляются, новые добавляются.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .education_db import EducationDatabase
+
+REQUIRED_COLUMNS = ('country', 'university', 'program_name', 'degree', 'field', 'language')
+# Порядок колонок, который ожидает EducationDatabase.upsert_programs
+COLUMNS = ('country', 'university', 'program_name', 'degree', 'field', 'language',
+           'duration', 'cost_per_year', 'requirements', 'application_deadline', 'website')
+DEGREES = ('бакалавриат', 'магистратура')
+
+
+class ImportRowError(ValueError):
+    """Строка файла не прошла проверку"""
+
+
+@dataclass
+class ImportStats:
+    rows_read: int = 0
+    rows_imported: int = 0
+    rows_changed: int = 0
+    rows_rejected: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+
+def validate_row(record: Dict) -> Tuple:
+    """Проверка и нормализация записи в кортеж колонок programs"""
+    values = {}
+    for column in REQUIRED_COLUMNS:
+        value = str(record.get(column) or '').strip()
+        if not value:
+            raise ImportRowError(f"пустое поле {column}")
+        values[column] = value
+
+    if values['degree'] not in DEGREES:
+        raise ImportRowError(f"неизвестная степень {values['degree']!r}")
+
+    cost = str(record.get('cost_per_year') or '0').strip().replace(' ', '').replace(',', '.')
+    try:
+        values['cost_per_year'] = float(cost)
+    except ValueError:
+        raise ImportRowError(f"стоимость не число: {cost!r}") from None
+    if not math.isfinite(values['cost_per_year']):
+        # float() принимает 'nan' и 'inf', а сравнение nan < 0 ложно
+        raise ImportRowError(f"стоимость не число: {cost!r}")
+    if values['cost_per_year'] < 0:
+        raise ImportRowError("отрицательная стоимость")
+    if values['cost_per_year'].is_integer():
+        values['cost_per_year'] = int(values['cost_per_year'])
+
+    for column in ('duration', 'requirements', 'application_deadline', 'website'):
+        values[column] = str(record.get(column) or '').strip()
+
+    return tuple(values[column] for column in COLUMNS)
+
+
+def read_csv(path: str) -> Iterator[Dict]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f)
+
+
+def read_jsonl(path: str) -> Iterator[Union[Dict, ImportRowError]]:
+    """Записи JSONL; битая строка передается дальше как ImportRowError и отклоняется при проверке"""
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ImportRowError(f"некорректный JSON: {e.msg}")
+                continue
+            if not isinstance(record, dict):
+                yield ImportRowError(f"ожидается объект, получено {type(record).__name__}")
+                continue
+            yield record
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+class ProgramImporter:
+    """Импорт программ пакетами по chunk_size строк, одна транзакция на пакет"""
+
+    def __init__(self, db: EducationDatabase, chunk_size: int = 1000, max_errors: int = 20):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+    def _validated(self, records: Iterable[Union[Dict, ImportRowError]], stats: ImportStats) -> Iterator[Tuple]:
+        for line_no, record in enumerate(records, 1):
+            stats.rows_read += 1
+            try:
+                if isinstance(record, ImportRowError):
+                    raise record
+                yield validate_row(record)
+            except ImportRowError as e:
+                stats.rows_rejected += 1
+                if len(stats.errors) < self.max_errors:
+                    stats.errors.append(f"запись {line_no}: {e}")
+
+    def import_records(self, records: Iterable[Dict]) -> ImportStats:
+        """Импорт из любого итератора словарей с колонками programs"""
+        stats = ImportStats()
+        start = time.perf_counter()
+
+        rows = self._validated(records, stats)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            # Повтор ключа внутри пакета: остается последняя версия строки
+            chunk = list({(row[1], row[2]): row for row in chunk}.values())
+            stats.rows_changed += self.db.upsert_programs(chunk)
+            stats.rows_imported += len(chunk)
+            stats.chunks += 1
+
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    def import_file(self, path: str, file_format: Optional[str] = None) -> ImportStats:
+        """Импорт файла CSV или JSONL; формат по умолчанию берется из расширения"""
+        file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format == 'json':
+            file_format = 'jsonl'
+        if file_format not in READERS:
+            raise ValueError(f"Неподдерживаемый формат файла: {file_format}")
+        return self.import_records(READERS[file_format](path))
+
+
+def main():
+    from config.settings import Settings
+
+    parser = argparse.ArgumentParser(description="Импорт каталога программ")
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=sorted(READERS), default=None)
+    parser.add_argument('--chunk-size', type=int, default=Settings.IMPORT_CHUNK_SIZE)
+    parser.add_argument('--db', default=Settings.DATABASE_PATH)
+    args = parser.parse_args()
+
+    # Импортированный каталог заменяет примеры: в новой базе их быть не должно
+    db = EducationDatabase(args.db, seed_samples=False)
+    try:
+        stats = ProgramImporter(db, args.chunk_size).import_file(args.path, args.format)
+    finally:
+        db.close()
+
+    print(f"✅ Прочитано {stats.rows_read} строк за {stats.elapsed:.1f} с "
+          f"({stats.rows_per_second:,.0f} строк/с), пакетов: {stats.chunks}")
+    print(f"   импортировано: {stats.rows_imported}, изменено: {stats.rows_changed}, "
+          f"отклонено: {stats.rows_rejected}")
+    for error in stats.errors:
+        print(f"   ❌ {error}")
+
+
+if __name__ == '__main__':
+    main()
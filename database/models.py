@@ -1,9 +1,83 @@
+import json
+import sys
+from collections import deque
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import ClassVar, Deque, Dict, Optional, Tuple
 
+# Подписи ролей в истории диалога
+ROLE_LABELS = {
+    'user': 'Пользователь',
+    'bot': 'Бот',
+}
 
-@dataclass
+# Ключи профиля с короткими повторяющимися значениями - их строки интернируются
+INTERNED_PROFILE_KEYS = ('degree', 'language', 'question_stage', 'field')
+
+
+def intern_profile(profile: Dict) -> Dict:
+    """Замена повторяющихся строк профиля на общие интернированные экземпляры"""
+    for key in INTERNED_PROFILE_KEYS:
+        value = profile.get(key)
+        if isinstance(value, str):
+            profile[key] = sys.intern(value)
+        elif isinstance(value, list):
+            profile[key] = [sys.intern(item) if isinstance(item, str) else item for item in value]
+    return profile
+
+
+class Profile(dict):
+    """Профиль пользователя со счетчиком изменений.
+
+    version растет при каждой записи ключа, поэтому сериализацию для
+    промпта можно кэшировать до следующего изменения. Списки внутри
+    профиля заменяются целиком, а не правятся на месте.
+    """
+    __slots__ = ('version', '_json', '_json_version')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+        self._json = None
+        self._json_version = -1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.version += 1
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def as_json(self) -> str:
+        """JSON профиля; пересчитывается только после изменений"""
+        if self._json_version != self.version:
+            self._json = json.dumps(self, ensure_ascii=False)
+            self._json_version = self.version
+        return self._json
+
+
+@dataclass(slots=True)
 class Program:
     id: Optional[int]
     country: str
@@ -18,25 +92,55 @@ class Program:
     application_deadline: str
     website: str
 
+    def __post_init__(self):
+        # Страны, степени и языки повторяются во всем каталоге
+        self.country = sys.intern(self.country)
+        self.degree = sys.intern(self.degree)
+        self.language = sys.intern(self.language)
 
-@dataclass
+
+@dataclass(slots=True)
 class UserSession:
     user_id: int
     stage: str = "initial"
-    profile: Dict = None
-    conversation_history: List[str] = None
+    profile: Profile = None
+    conversation_history: Deque[Tuple[str, str]] = None  # последние реплики (role, text)
     interest_score: int = 0
     last_activity: datetime = None
+    summary: str = ''  # краткое содержание реплик, вытесненных из conversation_history
+    summary_turns: int = 0  # сколько первых реплик истории вошло в summary
+    history_start: int = 0  # номер первой реплики conversation_history во всей истории пользователя
+
+    # Сколько последних реплик держать в памяти; полная история - в таблице messages
+    HISTORY_LIMIT: ClassVar[int] = 20
+    # Предел буфера, пока старые реплики ждут сжатия в summary
+    HISTORY_MAX: ClassVar[int] = 60
 
     def __post_init__(self):
         if self.profile is None:
-            self.profile = {}
+            self.profile = Profile()
+        else:
+            self.profile = intern_profile(Profile(self.profile))
+        self.stage = sys.intern(self.stage)
         if self.conversation_history is None:
-            self.conversation_history = []
+            self.conversation_history = deque()
         if self.last_activity is None:
             self.last_activity = datetime.now()
 
 
+@dataclass(slots=True)
+class ConversationMessage:
+    id: Optional[int]
+    user_id: int
+    role: str
+    text: str
+    created_at: datetime
+
+    def as_line(self) -> str:
+        """Строка истории вида 'Пользователь: текст'"""
+        return f"{ROLE_LABELS.get(self.role, self.role)}: {self.text}"
+
+
 @dataclass
 class Lead:
     id: Optional[int]
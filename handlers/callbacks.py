@@ -3,6 +3,9 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from config.settings import Settings
 from handlers.operator import OperatorHandler
+from handlers.messages import more_programs_markup
+from services.program_search import ProgramSearchService
+from services.outbound import Priority
 
 
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -12,7 +15,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Получаем обработчик операторов
     if 'operator_handler' not in context.bot_data:
-        context.bot_data['operator_handler'] = OperatorHandler()
+        context.bot_data['operator_handler'] = OperatorHandler(context.bot_data['outbound'])
 
     operator_handler = context.bot_data['operator_handler']
 
@@ -29,9 +32,9 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Оператор завершает диалог
         await handle_operator_end_chat(update, context, operator_handler)
     elif query.data == "thanks_operator":
-        await query.edit_message_text("💝 Спасибо за оценку! Мы ценим ваше мнение.")
+        await context.bot_data['outbound'].edit_message_text(query.message, "💝 Спасибо за оценку! Мы ценим ваше мнение.")
     elif query.data == "clarify_operator":
-        await query.edit_message_text("❓ Уточните ваш вопрос, и оператор ответит подробнее.")
+        await context.bot_data['outbound'].edit_message_text(query.message, "❓ Уточните ваш вопрос, и оператор ответит подробнее.")
     elif query.data == "rate_operator":
         await show_operator_rating(update, context)
 
@@ -49,6 +52,29 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data.startswith("rate_"):
         await handle_operator_rating(update, context)
 
+    # Следующая страница результатов поиска
+    elif query.data.startswith(ProgramSearchService.MORE_PREFIX + ":"):
+        await handle_more_programs(update, context)
+
+
+async def handle_more_programs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показ следующей страницы программ по курсору из кнопки"""
+    query = update.callback_query
+    decoded = ProgramSearchService.decode_cursor(query.data)
+    if decoded is None:
+        return
+    cursor, shown = decoded
+
+    session_manager = context.bot_data['session_manager']
+    program_search: ProgramSearchService = context.bot_data['program_search']
+    session = await session_manager.get_or_create_session(query.from_user.id)
+
+    response, more_data = await program_search.search_and_format(session.profile, cursor, shown)
+
+    # Кнопка переезжает в новое сообщение, у старого она убирается
+    await context.bot_data['outbound'].edit_message_reply_markup(query.message, reply_markup=None)
+    await context.bot_data['outbound'].send_message(query.message.chat_id, response, reply_markup=more_programs_markup(more_data))
+
 
 async def handle_quick_response(update: Update, context: ContextTypes.DEFAULT_TYPE,
                                 operator_handler: OperatorHandler):
@@ -71,7 +97,7 @@ async def handle_back_to_client(update: Update, context: ContextTypes.DEFAULT_TY
     # Получаем информацию о клиенте
     session_manager = context.bot_data['session_manager']
     lead_service = context.bot_data['lead_service']
-    session = session_manager.get_or_create_session(user_id)
+    session = await session_manager.get_or_create_session(user_id)
 
     operator_keyboard = [
         [InlineKeyboardButton(f"📞 Быстрые ответы", callback_data=f"quick_responses_{user_id}")],
@@ -80,7 +106,7 @@ async def handle_back_to_client(update: Update, context: ContextTypes.DEFAULT_TY
     ]
     operator_reply_markup = InlineKeyboardMarkup(operator_keyboard)
 
-    lead_report = lead_service.create_lead_report(session)
+    lead_report = await lead_service.create_lead_report(session)
 
     operator_message = f"""🔔 **Информация о клиенте {user_id}:**
 
@@ -90,7 +116,9 @@ async def handle_back_to_client(update: Update, context: ContextTypes.DEFAULT_TY
 Просто напишите: `/reply_{user_id} ваш_ответ`
 """
 
-    await query.edit_message_text(operator_message, reply_markup=operator_reply_markup)
+    await context.bot_data['outbound'].edit_message_text(
+        query.message, operator_message, Priority.OPERATOR, reply_markup=operator_reply_markup
+    )
 
 
 async def handle_cancel_queue(update: Update, context: ContextTypes.DEFAULT_TYPE,
@@ -102,7 +130,8 @@ async def handle_cancel_queue(update: Update, context: ContextTypes.DEFAULT_TYPE
     if user_id in operator_handler.operator_queue:
         operator_handler.operator_queue.remove(user_id)
 
-    await query.edit_message_text(
+    await context.bot_data['outbound'].edit_message_text(
+        query.message,
         "❌ **Ожидание отменено**\n\n"
         "Вы можете попробовать связаться с оператором позже или "
         "продолжить общение с AI-консультантом.\n\n"
@@ -127,7 +156,8 @@ async def handle_operator_rating(update: Update, context: ContextTypes.DEFAULT_T
         5: "Превосходно! ⭐ Благодарим за максимальную оценку!"
     }
 
-    await query.edit_message_text(
+    await context.bot_data['outbound'].edit_message_text(
+        query.message,
         f"⭐ **Оценка: {rating}/5**\n\n"
         f"{thanks_messages.get(rating, 'Спасибо за оценку!')}\n\n"
         "💙 Ваше мнение помогает нам становиться лучше!"
@@ -146,7 +176,9 @@ async def handle_operator_end_chat(update: Update, context: ContextTypes.DEFAULT
         await operator_handler.disconnect_user(user_id, operator_chat_id)
 
     # Уведомляем оператора
-    await query.edit_message_text(f"✅ Диалог с пользователем {user_id} завершен")
+    await context.bot_data['outbound'].edit_message_text(
+        query.message, f"✅ Диалог с пользователем {user_id} завершен", Priority.OPERATOR
+    )
 
     # Уведомляем пользователя
     keyboard = [
@@ -156,14 +188,15 @@ async def handle_operator_end_chat(update: Update, context: ContextTypes.DEFAULT
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     try:
-        await context.bot.send_message(
+        await context.bot_data['outbound'].send_message(
             chat_id=user_id,
             text="📞 **Диалог завершен оператором**\n\n"
                  "Спасибо за обращение! Если у вас остались вопросы, "
                  "всегда можете обратиться снова.\n\n"
                  "📧 Email: info@example.com\n"
                  "📱 Поддержка: @education_support",
-            reply_markup=reply_markup
+            reply_markup=reply_markup,
+            priority=Priority.OPERATOR
         )
     except Exception as e:
         print(f"❌ Ошибка отправки уведомления пользователю {user_id}: {e}")
@@ -186,7 +219,8 @@ async def show_operator_rating(update: Update, context: ContextTypes.DEFAULT_TYP
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await update.callback_query.edit_message_text(
+    await context.bot_data['outbound'].edit_message_text(
+        update.callback_query.message,
         "⭐ **Оцените работу оператора:**\n\n"
         "Ваша оценка поможет нам улучшить качество обслуживания!",
         reply_markup=reply_markup
@@ -197,7 +231,7 @@ async def connect_to_manager(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Передача клиента менеджеру (старая функция, теперь вызывает новую систему)"""
     # Получаем обработчик операторов
     if 'operator_handler' not in context.bot_data:
-        context.bot_data['operator_handler'] = OperatorHandler()
+        context.bot_data['operator_handler'] = OperatorHandler(context.bot_data['outbound'])
 
     operator_handler = context.bot_data['operator_handler']
     await operator_handler.request_operator(update, context)
@@ -209,17 +243,18 @@ async def notify_manager(session, context: ContextTypes.DEFAULT_TYPE, lead_servi
         print("MANAGER_USER_ID не настроен")
         return
 
-    lead_report = lead_service.create_lead_report(session)
+    lead_report = await lead_service.create_lead_report(session)
 
     try:
-        await context.bot.send_message(
+        await context.bot_data['outbound'].send_message(
             chat_id=int(Settings.MANAGER_USER_ID),
-            text=lead_report
+            text=lead_report,
+            priority=Priority.OPERATOR
         )
 
         # Создаем лид в БД
         score = lead_service.calculate_lead_score(session)
-        lead_service.db.create_lead(session.user_id, score)
+        await lead_service.db.create_lead(session.user_id, score)
 
     except Exception as e:
         print(f"Ошибка отправки уведомления менеджеру: {e}")
@@ -230,7 +265,7 @@ async def handle_program_details(update: Update, context: ContextTypes.DEFAULT_T
     """Обработка запроса деталей программы"""
     query = update.callback_query
     # Здесь можно добавить логику для показа подробностей программы
-    await query.edit_message_text("📋 Подробная информация о программе будет отправлена...")
+    await context.bot_data['outbound'].edit_message_text(query.message, "📋 Подробная информация о программе будет отправлена...")
 
 
 async def handle_application_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -256,4 +291,4 @@ async def handle_application_process(update: Update, context: ContextTypes.DEFAU
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await query.edit_message_text(process_text, reply_markup=reply_markup)
\ No newline at end of file
+    await context.bot_data['outbound'].edit_message_text(query.message, process_text, reply_markup=reply_markup)
\ No newline at end of file
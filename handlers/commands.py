@@ -6,7 +6,7 @@ from utils.session_manager import SessionManager
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /start"""
     session_manager: SessionManager = context.bot_data['session_manager']
-    session = session_manager.get_or_create_session(update.effective_user.id)
+    session = await session_manager.get_or_create_session(update.effective_user.id)
     session.stage = "initial"
 
     keyboard = [
@@ -15,5 +15,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
 
-    await update.message.reply_text(Settings.WELCOME_MESSAGE, reply_markup=reply_markup)
-    session_manager.save_session(session)
\ No newline at end of file
+    await context.bot_data['outbound'].send_message(
+        update.effective_chat.id, Settings.WELCOME_MESSAGE, reply_markup=reply_markup
+    )
+    await session_manager.save_session(session)
\ No newline at end of file
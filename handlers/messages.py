@@ -1,22 +1,33 @@
 # handlers/messages.py
-from telegram import Update
+import asyncio
+from typing import AsyncIterator, Optional, Tuple
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 from config.settings import Settings
 from utils.session_manager import SessionManager
 from services.ai_service import AIService
+from services.ai_admission import AIAdmissionController, Overloaded, Superseded
 from services.program_search import ProgramSearchService
 from services.lead_service import LeadService
+from services.profile_extractor import ProfileExtractor
+from services.outbound import OutboundQueue, Priority
 from handlers.operator import OperatorHandler
 
+# Этап анкеты -> слот профиля, о котором спрашивает бот
+STAGE_SLOTS = {'degree': 'degree', 'field': 'field', 'budget': 'max_budget'}
+
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка текстовых сообщений"""
 
     # Получаем обработчик операторов
     if 'operator_handler' not in context.bot_data:
-        context.bot_data['operator_handler'] = OperatorHandler()
+        context.bot_data['operator_handler'] = OperatorHandler(context.bot_data['outbound'])
 
     operator_handler = context.bot_data['operator_handler']
+    outbound: OutboundQueue = context.bot_data['outbound']
+    chat_id = update.effective_chat.id
 
     # Проверяем, не пытается ли оператор ответить пользователю
     if update.message.text.startswith('/reply_'):
@@ -46,10 +57,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lead_service: LeadService = context.bot_data['lead_service']
 
     # Получаем сессию пользователя
-    session = session_manager.get_or_create_session(user_id)
-    session.conversation_history.append(f"Пользователь: {user_message}")
+    session = await session_manager.get_or_create_session(user_id)
+    await session_manager.add_message(session, 'user', user_message)
 
-    await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
+    await context.bot.send_chat_action(chat_id=chat_id, action="typing")
 
     # Специальные команды
     if "хочу учиться" in user_message.lower():
@@ -63,8 +74,8 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 🎓 Бакалавриат (первое высшее)
 🎓 Магистратура (уже есть диплом бакалавра)
         """
-        await update.message.reply_text(response)
-        session_manager.save_session(session)
+        await outbound.send_message(chat_id, response)
+        await session_manager.save_session(session)
         return
 
     elif "связаться с менеджером" in user_message.lower():
@@ -73,34 +84,107 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     elif "процессе" in user_message.lower():
-        await update.message.reply_text(Settings.PROCESS_INFO)
+        await outbound.send_message(chat_id, Settings.PROCESS_INFO)
         return
 
     # Поэтапный сбор информации
     if session.stage == "collecting_info":
-        response = await handle_step_by_step_collection(user_message, session, program_search)
-        await update.message.reply_text(response)
-        session_manager.save_session(session)
+        response, reply_markup = await handle_step_by_step_collection(
+            user_message, session, program_search, context.bot_data['profile_extractor']
+        )
+        await outbound.send_message(chat_id, response, reply_markup=reply_markup)
+        await session_manager.save_session(session)
+        return
+
+    # Основная логика AI: отвечаем только на последнее сообщение пользователя
+    ai_admission: AIAdmissionController = context.bot_data['ai_admission']
+    ai_admission.announce(user_id, update.update_id, user_message)
+    try:
+        async with ai_admission.admit(user_id, update.update_id) as question:
+            if Settings.AI_STREAMING:
+                reply, ai_response = await stream_reply(
+                    outbound, chat_id,
+                    ai_service.stream_response(question, session.profile, session.conversation_history,
+                                               session.summary)
+                )
+                interest_score = ai_service.calculate_interest_score(question)
+            else:
+                reply = None
+                ai_response, interest_score = await ai_service.get_response(
+                    question, session.profile, session.conversation_history, session.summary
+                )
+    except Superseded:
+        # Текст этого сообщения войдет в вопрос, который задаст обработчик более нового
+        await session_manager.save_session(session)
+        return
+    except Overloaded:
+        await outbound.send_message(
+            chat_id,
+            "Сейчас очень много вопросов 🙏 Повтори, пожалуйста, через минуту - обязательно отвечу!"
+        )
+        await session_manager.save_session(session)
         return
 
-    # Основная логика AI
-    ai_response, interest_score = await ai_service.get_response(user_message, session.profile)
     session.interest_score = max(session.interest_score, interest_score)
-    session.conversation_history.append(f"Бот: {ai_response}")
+    await session_manager.add_message(session, 'bot', ai_response)
 
     # Проверяем готовность к передаче менеджеру
+    reply_markup = None
     if lead_service.should_notify_manager(session):
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
         keyboard = [
             [InlineKeyboardButton("📞 Связаться с менеджером", callback_data="connect_manager")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         ai_response += "\n\n💡 Похоже, вы серьезно заинтересованы! Хотите обсудить детали с нашим менеджером?"
-        await update.message.reply_text(ai_response, reply_markup=reply_markup)
+
+    if reply is None:
+        await outbound.send_message(chat_id, ai_response, reply_markup=reply_markup)
     else:
-        await update.message.reply_text(ai_response)
+        await edit_reply(outbound, reply, ai_response, reply_markup)
+
+    await session_manager.save_session(session)
 
-    session_manager.save_session(session)
+
+async def stream_reply(outbound: OutboundQueue, chat_id: int,
+                       chunks: AsyncIterator[str]) -> Tuple[Optional[Message], str]:
+    """Показ ответа по мере генерации.
+
+    Первое сообщение уходит, как только накопилось STREAM_FIRST_MESSAGE_CHARS
+    символов, дальше оно правится не чаще STREAM_EDIT_INTERVAL. Последнюю
+    правку с полным текстом делает вызывающий код (edit_reply), поэтому
+    возвращается отправленное сообщение и весь текст. Промежуточные правки
+    очередь исходящих может пропустить, если упрется в лимиты Telegram.
+    """
+    loop = asyncio.get_running_loop()
+    text = ''
+    reply: Optional[Message] = None
+    shown = ''
+    edited_at = 0.0
+
+    async for delta in chunks:
+        text += delta
+        if reply is None:
+            if len(text) >= Settings.STREAM_FIRST_MESSAGE_CHARS:
+                reply = await outbound.send_message(chat_id, text + ' …')
+                shown, edited_at = text, loop.time()
+        elif loop.time() - edited_at >= Settings.STREAM_EDIT_INTERVAL and text != shown:
+            await edit_reply(outbound, reply, text + ' …', final=False)
+            shown, edited_at = text, loop.time()
+
+    return reply, text
+
+
+async def edit_reply(outbound: OutboundQueue, reply: Message, text: str,
+                     reply_markup: Optional[InlineKeyboardMarkup] = None, final: bool = True):
+    """Правка сообщения; неизменившийся текст не должен ронять обработку.
+
+    Промежуточную правку (final=False) очередь может пропустить, итоговую - только отложить.
+    """
+    try:
+        await outbound.edit_message_text(reply, text, reply_markup=reply_markup, droppable=not final)
+    except BadRequest as e:
+        if 'not modified' not in str(e).lower():
+            raise
 
 
 async def send_operator_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -137,15 +221,17 @@ async def send_operator_help(update: Update, context: ContextTypes.DEFAULT_TYPE)
 🔵 Холодный лид - собирает информацию
     """
 
-    await update.message.reply_text(help_text)
+    await context.bot_data['outbound'].send_message(update.effective_chat.id, help_text, Priority.OPERATOR)
 
 
-async def handle_step_by_step_collection(user_message: str, session, program_search) -> str:
-    """Поэтапный сбор информации о пользователе"""
+async def handle_step_by_step_collection(user_message: str, session, program_search,
+                                         profile_extractor: ProfileExtractor
+                                         ) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Поэтапный сбор информации о пользователе; вторым значением - клавиатура ответа"""
     current_stage = session.profile.get('question_stage', 'degree')
 
     # Извлекаем информацию из ответа
-    await extract_user_info(user_message, session)
+    profile_extractor.update_profile(user_message, session.profile, expected=STAGE_SLOTS.get(current_stage))
 
     if current_stage == 'degree':
         if 'degree' in session.profile:
@@ -160,9 +246,9 @@ async def handle_step_by_step_collection(user_message: str, session, program_sea
 💼 Бизнес и менеджмент
 
 Или что-то другое? Просто напиши своими словами!
-            """
+            """, None
         else:
-            return "Не совсем понял 🤔 Бакалавриат или магистратура?"
+            return "Не совсем понял 🤔 Бакалавриат или магистратура?", None
 
     elif current_stage == 'field':
         if 'field' in session.profile:
@@ -176,81 +262,26 @@ async def handle_step_by_step_collection(user_message: str, session, program_sea
 💰 Платные варианты от €2000 в Чехии до €15000+ в частных вузах
 
 Напиши примерную сумму или "хочу бесплатно" 😊
-            """
+            """, None
         else:
-            return "Какая область интересует больше всего? ИТ, бизнес, медицина или что-то другое?"
+            return "Какая область интересует больше всего? ИТ, бизнес, медицина или что-то другое?", None
 
     elif current_stage == 'budget':
-        if 'max_budget' in session.profile or any(
-                word in user_message.lower() for word in ['бесплатно', 'без платы', 'даром']):
+        if 'max_budget' in session.profile:
             session.profile['question_stage'] = 'complete'
             session.stage = "showing_results"
 
             # Ищем подходящие программы
-            programs = program_search.search_programs(session.profile)
-            return program_search.format_programs_response(programs)
+            response, more_data = await program_search.search_and_format(session.profile)
+            return response, more_programs_markup(more_data)
         else:
-            return "Не уловил сумму 🤔 Можешь написать примерный бюджет в евро или 'бесплатно'?"
-
-    return "Что-то пошло не так 😅 Давай начнем сначала - какой уровень образования планируешь?"
-
-
-async def extract_user_info(message: str, session):
-    """Извлечение информации о пользователе из сообщения"""
-    message_lower = message.lower()
-
-    # Уровень образования
-    if any(word in message_lower for word in ['магистр', 'магистратура', 'магистерская', 'второе высшее']):
-        session.profile['degree'] = 'магистратура'
-    elif any(word in message_lower for word in ['бакалавр', 'бакалавриат', 'первое высшее', 'первое образование']):
-        session.profile['degree'] = 'бакалавриат'
-    elif any(word in message_lower for word in ['школу', 'школы', 'окончил школу', 'выпускник', '11 класс']):
-        session.profile['degree'] = 'бакалавриат'
-    elif any(word in message_lower for word in ['диплом', 'высшее', 'университет окончил']):
-        session.profile['degree'] = 'магистратура'
-
-    # Область интересов
-    fields = []
-    if any(word in message_lower for word in ['ит', 'программирование', 'компьютер', 'софт', 'разработка', 'кодинг']):
-        fields.append('ИТ')
-    if any(word in message_lower for word in ['ии', 'искусственный интеллект', 'ai', 'машинное обучение', 'ml']):
-        fields.append('ИИ')
-    if any(word in message_lower for word in
-           ['data science', 'данные', 'аналитика', 'большие данные', 'анализ данных']):
-        fields.append('Data Science')
-    if any(word in message_lower for word in ['бизнес', 'менеджмент', 'управление', 'mba', 'экономика']):
-        fields.append('бизнес')
-
-    if fields:
-        session.profile['field'] = fields
-
-    # Бюджет
-    import re
-    budget_patterns = [
-        r'(\d+)[^\d]*(?:евро|€|euro)',
-        r'(\d+)[^\d]*(?:долларов?|\$|usd)',
-        r'(\d+)[^\d]*(?:тысяч?|k)',
-        r'до\s*(\d+)',
-        r'(\d+)\s*в\s*год'
-    ]
-
-    for pattern in budget_patterns:
-        budget_match = re.search(pattern, message_lower)
-        if budget_match:
-            budget = int(budget_match.group(1))
-
-            if 'тысяч' in message_lower or 'k' in message_lower:
-                budget *= 1000
-            elif 'долларов' in message_lower or '' in message_lower:
-                budget = int(budget * 0.85)
-
-            session.profile['max_budget'] = budget
-            break
-
-    # Бесплатное обучение
-    if any(word in message_lower for word in ['бесплатно', 'без платы', 'даром', 'free', 'не платить', '0']):
-        session.profile['max_budget'] = 0
-
-    # Язык обучения
-    if any(word in message_lower for word in ['английский', 'english', 'англ', 'ielts', 'toefl']):
-        session.profile['language'] = 'английский'
\ No newline at end of file
+            return "Не уловил сумму 🤔 Можешь написать примерный бюджет в евро или 'бесплатно'?", None
+
+    return "Что-то пошло не так 😅 Давай начнем сначала - какой уровень образования планируешь?", None
+
+
+def more_programs_markup(more_data: Optional[str]) -> Optional[InlineKeyboardMarkup]:
+    """Кнопка следующей страницы результатов поиска"""
+    if more_data is None:
+        return None
+    return InlineKeyboardMarkup([[InlineKeyboardButton("Ещё программы", callback_data=more_data)]])
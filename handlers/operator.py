@@ -4,12 +4,16 @@ from telegram.ext import ContextTypes
 from config.settings import Settings
 from utils.session_manager import SessionManager
 from services.lead_service import LeadService
+from services.outbound import OutboundQueue, Priority
+from services.update_processor import PerUserUpdateProcessor
 import asyncio
 from datetime import datetime, timedelta
 
 
 class OperatorHandler:
-    def __init__(self):
+    def __init__(self, outbound: OutboundQueue):
+        # Все сообщения операторам и от операторов идут в приоритетной очереди исходящих
+        self.outbound = outbound
         self.active_conversations = {}  # user_id -> operator_user_id
         self.operator_sessions = {}  # operator_user_id -> [user_ids]
         self.operator_workload = {}  # operator_user_id -> count
@@ -23,31 +27,35 @@ class OperatorHandler:
         session_manager: SessionManager = context.bot_data['session_manager']
         lead_service: LeadService = context.bot_data['lead_service']
 
-        session = session_manager.get_or_create_session(user_id)
+        session = await session_manager.get_or_create_session(user_id)
 
         # Проверяем, не подключен ли уже пользователь
         if user_id in self.active_conversations:
-            await update.message.reply_text(
+            await self.outbound.send_message(
+                update.effective_chat.id,
                 "📞 Вы уже подключены к оператору!\n\n"
-                "💬 Просто напишите ваш вопрос - оператор получит сообщение."
+                "💬 Просто напишите ваш вопрос - оператор получит сообщение.",
+                priority=Priority.OPERATOR
             )
             return
 
         # Сохраняем тип запроса
         session.profile['operator_request_type'] = 'подключение через кнопку'
-        session_manager.save_session(session)
+        await session_manager.save_session(session)
 
         # Проверяем рабочее время
         current_hour = datetime.now().hour
         if (current_hour < Settings.OPERATOR_WORKING_HOURS_START or
                 current_hour >= Settings.OPERATOR_WORKING_HOURS_END):
-            await update.message.reply_text(
+            await self.outbound.send_message(
+                update.effective_chat.id,
                 f"🕐 **Сейчас нерабочее время**\n\n"
                 f"⏰ Операторы работают с {Settings.OPERATOR_WORKING_HOURS_START}:00 "
                 f"до {Settings.OPERATOR_WORKING_HOURS_END}:00\n\n"
                 f"📧 Для срочных вопросов: info@example.com\n"
                 f"📱 Telegram: @education_support\n\n"
-                f"🔔 Завтра утром оператор обязательно с вами свяжется!"
+                f"🔔 Завтра утром оператор обязательно с вами свяжется!",
+                priority=Priority.OPERATOR
             )
             return
 
@@ -65,13 +73,15 @@ class OperatorHandler:
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
-            await update.message.reply_text(
+            await self.outbound.send_message(
+                update.effective_chat.id,
                 f"⏳ **Все операторы заняты**\n\n"
                 f"📍 Ваше место в очереди: {queue_position}\n"
                 f"⏰ Ожидаемое время: 3-5 минут\n\n"
                 f"💡 Пока ждете, можете написать ваш вопрос - "
                 f"оператор увидит его сразу при подключении.",
-                reply_markup=reply_markup
+                reply_markup=reply_markup,
+                priority=Priority.OPERATOR
             )
 
     async def handle_user_message_to_operator(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
@@ -102,16 +112,19 @@ class OperatorHandler:
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
-            await context.bot.send_message(
+            await self.outbound.send_message(
                 chat_id=operator_user_id,
                 text=operator_message,
-                reply_markup=reply_markup
+                reply_markup=reply_markup,
+                priority=Priority.OPERATOR
             )
 
             # Подтверждение пользователю
-            await update.message.reply_text(
+            await self.outbound.send_message(
+                update.effective_chat.id,
                 "✅ Сообщение передано оператору\n"
-                "⏰ Обычно отвечаем в течение 2-3 минут"
+                "⏰ Обычно отвечаем в течение 2-3 минут",
+                priority=Priority.OPERATOR
             )
 
             return True
@@ -122,11 +135,13 @@ class OperatorHandler:
             # Если оператор недоступен, отключаем пользователя
             await self.disconnect_user(user_id, operator_user_id)
 
-            await update.message.reply_text(
+            await self.outbound.send_message(
+                update.effective_chat.id,
                 "⚠️ **Оператор временно недоступен**\n\n"
                 "Попробуйте подключиться к другому оператору или "
                 "обратитесь позже.\n\n"
-                "📧 Email: info@example.com"
+                "📧 Email: info@example.com",
+                priority=Priority.OPERATOR
             )
 
             return True
@@ -183,7 +198,7 @@ class OperatorHandler:
         ]
         user_reply_markup = InlineKeyboardMarkup(user_keyboard)
 
-        await context.bot.send_message(
+        await self.outbound.send_message(
             chat_id=user_id,
             text="✅ **Подключен оператор!**\n\n"
                  "👨‍💼 Сейчас с вами будет работать наш специалист.\n"
@@ -192,11 +207,12 @@ class OperatorHandler:
                  "• Вашими образовательными целями\n"
                  "• Предпочтениями по странам/программам\n"
                  "• Бюджетом и временными рамками",
-            reply_markup=user_reply_markup
+            reply_markup=user_reply_markup,
+            priority=Priority.OPERATOR
         )
 
         # Уведомляем оператора
-        lead_report = lead_service.create_lead_report(session)
+        lead_report = await lead_service.create_lead_report(session)
         request_type = session.profile.get('operator_request_type', 'общая консультация')
 
         operator_keyboard = [
@@ -222,10 +238,11 @@ class OperatorHandler:
 """
 
         try:
-            await context.bot.send_message(
+            await self.outbound.send_message(
                 chat_id=operator_user_id,
                 text=operator_message,
-                reply_markup=operator_reply_markup
+                reply_markup=operator_reply_markup,
+                priority=Priority.OPERATOR
             )
             print(f"✅ Пользователь {user_id} подключен к оператору {operator_user_id}")
         except Exception as e:
@@ -268,20 +285,24 @@ class OperatorHandler:
             user_id = int(parts[0].replace('/reply_', ''))
             reply_text = parts[1] if len(parts) > 1 else "Оператор подключен"
         except (ValueError, IndexError):
-            await update.message.reply_text(
+            await self.outbound.send_message(
+                update.effective_chat.id,
                 "❌ **Неверный формат команды**\n\n"
                 "✅ Правильно: `/reply_USER_ID ваш_ответ`\n"
-                "📝 Пример: `/reply_123456 Добро пожаловать!`"
+                "📝 Пример: `/reply_123456 Добро пожаловать!`",
+                priority=Priority.OPERATOR
             )
             return False
 
         # Проверяем, что оператор работает с этим пользователем
         if (user_id not in self.active_conversations or
                 self.active_conversations[user_id] != operator_user_id):
-            await update.message.reply_text(
+            await self.outbound.send_message(
+                update.effective_chat.id,
                 f"❌ **Пользователь {user_id} не подключен к вам**\n\n"
                 f"🔍 Ваши активные клиенты:\n"
-                f"{', '.join(map(str, self.operator_sessions.get(operator_user_id, []))) or 'Нет активных'}"
+                f"{', '.join(map(str, self.operator_sessions.get(operator_user_id, []))) or 'Нет активных'}",
+                priority=Priority.OPERATOR
             )
             return False
 
@@ -293,18 +314,23 @@ class OperatorHandler:
         reply_markup = InlineKeyboardMarkup(keyboard)
 
         try:
-            await context.bot.send_message(
+            await self.outbound.send_message(
                 chat_id=user_id,
                 text=f"👨‍💼 **Ответ оператора:**\n\n{reply_text}",
-                reply_markup=reply_markup
+                reply_markup=reply_markup,
+                priority=Priority.OPERATOR
             )
 
             # Подтверждаем оператору
-            await update.message.reply_text(f"✅ Ответ отправлен пользователю {user_id}")
+            await self.outbound.send_message(
+                update.effective_chat.id, f"✅ Ответ отправлен пользователю {user_id}", Priority.OPERATOR
+            )
             return True
 
         except Exception as e:
-            await update.message.reply_text(f"❌ Ошибка отправки сообщения пользователю {user_id}: {e}")
+            await self.outbound.send_message(
+                update.effective_chat.id, f"❌ Ошибка отправки сообщения пользователю {user_id}: {e}", Priority.OPERATOR
+            )
             return False
 
     async def end_operator_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -315,7 +341,7 @@ class OperatorHandler:
         user_id = query.from_user.id
 
         if user_id not in self.active_conversations:
-            await query.edit_message_text("❌ Вы не подключены к оператору")
+            await self.outbound.edit_message_text(query.message, "❌ Вы не подключены к оператору", Priority.OPERATOR)
             return
 
         operator_chat_id = self.active_conversations[user_id]
@@ -330,20 +356,23 @@ class OperatorHandler:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await query.edit_message_text(
+        await self.outbound.edit_message_text(
+            query.message,
             "✅ **Диалог завершен**\n\n"
             "Спасибо за обращение! Если остались вопросы, "
             "мы всегда готовы помочь.\n\n"
             "📧 Email: info@example.com\n"
             "📱 Telegram: @education_support",
-            reply_markup=reply_markup
+            reply_markup=reply_markup,
+            priority=Priority.OPERATOR
         )
 
         # Уведомляем оператора
         try:
-            await context.bot.send_message(
+            await self.outbound.send_message(
                 chat_id=operator_chat_id,
-                text=f"✅ Диалог с пользователем {user_id} завершен"
+                text=f"✅ Диалог с пользователем {user_id} завершен",
+                priority=Priority.OPERATOR
             )
         except Exception as e:
             print(f"❌ Ошибка уведомления оператора: {e}")
@@ -376,12 +405,45 @@ class OperatorHandler:
 
 📋 **Активные клиенты:**
 {', '.join(map(str, self.operator_sessions.get(operator_chat_id, []))) or 'Нет активных'}
+
+{self.service_stats_text(context)}
         """
 
         if edit_message and hasattr(update, 'callback_query'):
-            await query.edit_message_text(stats_text)
+            await self.outbound.edit_message_text(query.message, stats_text, Priority.OPERATOR)
         else:
-            await update.message.reply_text(stats_text)
+            await self.outbound.send_message(update.effective_chat.id, stats_text, Priority.OPERATOR)
+
+    @staticmethod
+    def service_stats_text(context: ContextTypes.DEFAULT_TYPE) -> str:
+        """Метрики сервисов бота: отложенная запись, кэш поиска, обработка обновлений, исходящие"""
+        lines = ["🛠 **Состояние бота:**"]
+
+        session_manager: SessionManager = context.bot_data.get('session_manager')
+        if session_manager:
+            sessions = session_manager.get_stats()
+            lines.append(f"• Запись сессий: ждут {sessions['pending']}, задержка сброса "
+                         f"{sessions['last_flush_lag']:.1f} с (макс. {sessions['max_flush_lag']:.1f} с), "
+                         f"ошибок {sessions['flush_errors']}")
+
+        program_search = context.bot_data.get('program_search')
+        if program_search:
+            search = program_search.get_stats()
+            lines.append(f"• Кэш поиска программ: {search['hit_rate']:.0%} попаданий, записей {search['entries']}")
+
+        update_processor = getattr(context.application, 'update_processor', None)
+        if isinstance(update_processor, PerUserUpdateProcessor):
+            updates = update_processor.get_stats()
+            lines.append(f"• Обновления: обрабатывается {updates['running']}, в очереди {updates['queued']}, "
+                         f"пользователей {updates['active_users']}")
+
+        outbound: OutboundQueue = context.bot_data.get('outbound')
+        if outbound:
+            sent = outbound.get_stats()
+            lines.append(f"• Исходящие: в очереди {sum(sent['queued'].values())}, отправлено {sent['sent']}, "
+                         f"пауз по лимиту Telegram {sent['retry_after']}")
+
+        return '\n'.join(lines)
 
     async def handle_operator_request(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка запросов операторов через callback"""
@@ -406,11 +468,13 @@ class OperatorHandler:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await query.edit_message_text(
+        await self.outbound.edit_message_text(
+            query.message,
             f"⚡ **Быстрые ответы для клиента {user_id}:**\n\n"
             "Выберите готовый ответ или напишите свой:\n"
             f"`/reply_{user_id} ваш_текст`",
-            reply_markup=reply_markup
+            reply_markup=reply_markup,
+            priority=Priority.OPERATOR
         )
 
     async def send_quick_response(self, query, user_id: int, response_type: str, context: ContextTypes.DEFAULT_TYPE):
@@ -426,12 +490,15 @@ class OperatorHandler:
 
         # Отправляем ответ пользователю
         try:
-            await context.bot.send_message(
+            await self.outbound.send_message(
                 chat_id=user_id,
-                text=f"👨‍💼 **Ответ оператора:**\n\n{response_text}"
+                text=f"👨‍💼 **Ответ оператора:**\n\n{response_text}",
+                priority=Priority.OPERATOR
             )
 
-            await query.edit_message_text(f"✅ Быстрый ответ отправлен пользователю {user_id}")
+            await self.outbound.edit_message_text(
+                query.message, f"✅ Быстрый ответ отправлен пользователю {user_id}", Priority.OPERATOR
+            )
 
         except Exception as e:
-            await query.edit_message_text(f"❌ Ошибка отправки: {e}")
\ No newline at end of file
+            await self.outbound.edit_message_text(query.message, f"❌ Ошибка отправки: {e}", Priority.OPERATOR)
\ No newline at end of file
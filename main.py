@@ -1,12 +1,20 @@
+import importlib.util
 import os
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from telegram import Update
 
 from config.settings import Settings
 from database.education_db import EducationDatabase
+from database.async_db import AsyncEducationDatabase
 from services.ai_service import AIService
+from services.ai_cache import AIResponseCache
+from services.ai_admission import AIAdmissionController
 from services.program_search import ProgramSearchService
+from services.program_catalog import ProgramCatalog
 from services.lead_service import LeadService
+from services.profile_extractor import ProfileExtractor
+from services.outbound import OutboundQueue, Priority
+from services.update_processor import PerUserUpdateProcessor
 from utils.session_manager import SessionManager
 from handlers.commands import start_command
 from handlers.messages import handle_message
@@ -20,30 +28,110 @@ def setup_bot_data(application: Application):
     os.makedirs('data', exist_ok=True)
 
     # Инициализация сервисов
-    db = EducationDatabase(Settings.DATABASE_PATH)
-    ai_service = AIService()
-    program_search = ProgramSearchService(db)
+    db = AsyncEducationDatabase(
+        EducationDatabase(Settings.DATABASE_PATH),
+        message_batch_size=Settings.MESSAGE_FLUSH_BATCH_SIZE
+    )
+    ai_cache = None
+    if Settings.AI_CACHE_ENABLED:
+        ai_cache = AIResponseCache(db, Settings.AI_CACHE_MAX_ENTRIES, Settings.AI_CACHE_TTL,
+                                   Settings.AI_CACHE_MEMORY_ENTRIES)
+    # Единственный ограничитель запросов к модели - ai_admission
+    ai_service = AIService(max_concurrency=None, cache=ai_cache)
+    ai_admission = AIAdmissionController(Settings.AI_MAX_CONCURRENCY, Settings.AI_MAX_QUEUE,
+                                         Settings.AI_QUEUE_TIMEOUT)
+
+    async def summarize(summary, turns):
+        # Сжатие диалога не отнимает слот у пользователя, который ждет ответа
+        async with ai_admission.background():
+            return await ai_service.summarize(summary, turns)
+
+    catalog = None
+    if Settings.PROGRAM_CATALOG_IN_MEMORY:
+        if ProgramCatalog.available():
+            catalog = ProgramCatalog(db, Settings.PROGRAM_CATALOG_REFRESH_INTERVAL)
+        else:
+            print("⚠️ NumPy не установлен - поиск программ идет через SQLite")
+    program_search = ProgramSearchService(db, catalog)
     lead_service = LeadService(db)
-    session_manager = SessionManager(db)
+    profile_extractor = ProfileExtractor()
+    session_manager = SessionManager(db, summarize=summarize)
+
+    outbound = OutboundQueue(
+        global_rate=Settings.OUTBOUND_GLOBAL_RATE,
+        global_burst=Settings.OUTBOUND_GLOBAL_BURST,
+        chat_rate=Settings.OUTBOUND_CHAT_RATE,
+        chat_burst=Settings.OUTBOUND_CHAT_BURST,
+        group_rate=Settings.OUTBOUND_GROUP_RATE,
+        group_burst=Settings.OUTBOUND_GROUP_BURST,
+        max_queue=Settings.OUTBOUND_MAX_QUEUE,
+        max_retries=Settings.OUTBOUND_MAX_RETRIES
+    )
 
     # Инициализация обработчика операторов
-    operator_handler = OperatorHandler()
+    operator_handler = OperatorHandler(outbound)
 
     # Сохраняем в bot_data для доступа из хендлеров
     application.bot_data.update({
         'db': db,
         'ai_service': ai_service,
+        'ai_admission': ai_admission,
         'program_search': program_search,
         'lead_service': lead_service,
+        'profile_extractor': profile_extractor,
+        'outbound': outbound,
         'session_manager': session_manager,
         'operator_handler': operator_handler
     })
 
 
+async def start_bot_data(application: Application):
+    """Запуск фоновых задач сервисов"""
+    application.bot_data['session_manager'].start()
+    application.bot_data['outbound'].start(application.bot)
+
+    # Прогрев каталога, чтобы первый поиск не ждал загрузки
+    catalog = application.bot_data['program_search'].catalog
+    if catalog is not None:
+        await catalog.refresh()
+
+
+async def stop_bot_data(application: Application):
+    """Остановка приема обновлений: бот еще может отправлять сообщения"""
+    outbound: OutboundQueue = application.bot_data.get('outbound')
+    if outbound:
+        # Отправить то, что уже в очереди; в post_shutdown бот уже закрыт
+        await outbound.stop()
+
+
+async def shutdown_bot_data(application: Application):
+    """Освобождение ресурсов при остановке"""
+    session_manager: SessionManager = application.bot_data.get('session_manager')
+    if session_manager:
+        # Гарантированный сброс отложенных записей
+        await session_manager.stop()
+
+    ai_service: AIService = application.bot_data.get('ai_service')
+    if ai_service:
+        await ai_service.close()
+
+    outbound: OutboundQueue = application.bot_data.get('outbound')
+    if outbound:
+        # Если запуск не удался (например, webhook-сервер не поднялся), post_stop
+        # не вызывается, а диспетчер уже запущен в post_init
+        await outbound.stop(timeout=0)
+
+    db: AsyncEducationDatabase = application.bot_data.get('db')
+    if db:
+        await db.close()
+
+
 async def operator_start_command(update: Update, context):
     """Команда /start для оператора"""
     if str(update.effective_chat.id) == Settings.MANAGER_USER_ID:
-        await update.message.reply_text(Settings.OPERATOR_WELCOME_MESSAGE)
+        await context.bot_data['outbound'].send_message(
+            update.effective_chat.id, Settings.OPERATOR_WELCOME_MESSAGE, Priority.OPERATOR
+        )
     else:
         await start_command(update, context)
 
@@ -54,7 +142,8 @@ async def error_handler(update: Update, context):
 
     if update and update.effective_message:
         try:
-            await update.effective_message.reply_text(
+            await context.bot_data['outbound'].send_message(
+                update.effective_chat.id,
                 "⚠️ Произошла техническая ошибка. Попробуйте позже или обратитесь к оператору."
             )
         except Exception as e:
@@ -74,10 +163,38 @@ def main():
         print("⚠️ Предупреждение: MANAGER_USER_ID не настроен!")
         print("💡 Добавьте MANAGER_USER_ID в файл .env для работы с операторами")
 
-    application = Application.builder().token(Settings.TELEGRAM_TOKEN).build()
+    if Settings.BOT_MODE not in ('polling', 'webhook'):
+        print(f"❌ Ошибка: неизвестный BOT_MODE={Settings.BOT_MODE}, ожидается polling или webhook")
+        return
+
+    if Settings.BOT_MODE == 'webhook' and not (Settings.WEBHOOK_URL and Settings.WEBHOOK_SECRET_TOKEN):
+        print("❌ Ошибка: для BOT_MODE=webhook нужны WEBHOOK_URL и WEBHOOK_SECRET_TOKEN")
+        print("💡 Без секрета любой, кто узнает адрес, сможет присылать боту поддельные обновления")
+        return
+
+    if Settings.BOT_MODE == 'webhook' and importlib.util.find_spec('tornado') is None:
+        print("❌ Ошибка: для BOT_MODE=webhook нужен пакет python-telegram-bot[webhooks]")
+        print("💡 Установите зависимости: pip install -r requirements.txt")
+        return
+
+    # Пользователи обрабатываются параллельно, сообщения одного пользователя - по порядку
+    update_processor = PerUserUpdateProcessor(Settings.UPDATE_MAX_CONCURRENCY)
+
+    builder = (
+        Application.builder()
+        .token(Settings.TELEGRAM_TOKEN)
+        .concurrent_updates(update_processor)
+        .post_init(start_bot_data)
+        .post_stop(stop_bot_data)
+        .post_shutdown(shutdown_bot_data)
+    )
+    if Settings.TELEGRAM_API_URL:
+        builder = builder.base_url(Settings.TELEGRAM_API_URL)
+    application = builder.build()
 
     # Инициализация сервисов
     setup_bot_data(application)
+    update_processor.admission = application.bot_data['ai_admission']
 
     # Регистрация обработчиков
     application.add_handler(CommandHandler("start", operator_start_command))
@@ -101,7 +218,34 @@ def main():
     print("• /reply_USER_ID текст - ответить клиенту")
     print("\n🚀 Бот работает...")
 
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if Settings.BOT_MODE == 'webhook':
+        run_webhook(application)
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+
+def run_webhook(application: Application):
+    """Прием обновлений через webhook.
+
+    Встроенный асинхронный HTTP-сервер python-telegram-bot (нужен пакет
+    python-telegram-bot[webhooks]) принимает POST от Telegram на WEBHOOK_PATH
+    и отвечает 403 на запросы без верного WEBHOOK_SECRET_TOKEN в заголовке
+    X-Telegram-Bot-Api-Secret-Token. Адрес, секрет и max_connections
+    регистрируются в Telegram через setWebhook при каждом запуске.
+    """
+    webhook_url = f"{Settings.WEBHOOK_URL.rstrip('/')}/{Settings.WEBHOOK_PATH.lstrip('/')}"
+    print(f"🌐 Webhook: {webhook_url} (слушаю {Settings.WEBHOOK_LISTEN}:{Settings.WEBHOOK_PORT}, "
+          f"до {Settings.WEBHOOK_MAX_CONNECTIONS} соединений)")
+
+    application.run_webhook(
+        listen=Settings.WEBHOOK_LISTEN,
+        port=Settings.WEBHOOK_PORT,
+        url_path=Settings.WEBHOOK_PATH,
+        webhook_url=webhook_url,
+        secret_token=Settings.WEBHOOK_SECRET_TOKEN,
+        max_connections=Settings.WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=Update.ALL_TYPES
+    )
 
 
 async def get_id_command(update: Update, context):
@@ -120,6 +264,6 @@ async def get_id_command(update: Update, context):
 💡 **Для настройки операторов используйте User ID**
     """
 
-    await update.message.reply_text(info_text)
+    await context.bot_data['outbound'].send_message(update.effective_chat.id, info_text)
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,200 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+
+class AdmissionRejected(Exception):
+    """Запрос к модели не будет выполнен"""
+
+
+class Superseded(AdmissionRejected):
+    """От пользователя пришло более новое сообщение - ответит его обработчик"""
+
+
+class Overloaded(AdmissionRejected):
+    """Очередь к модели переполнена или ожидание слишком долгое"""
+
+
+@dataclass
+class _UserState:
+    latest: int = 0
+    pending: List[Tuple[int, str]] = field(default_factory=list)  # (update_id, текст)
+    superseded: Optional[asyncio.Event] = None  # событие для обработчика, ждущего слот
+    active: int = 0
+    handed_over: Set[int] = field(default_factory=set)  # снятые сообщения, их текст заберет более новое
+
+
+class AIAdmissionController:
+    """Допуск запросов к модели.
+
+    - одновременно выполняется не больше max_concurrency запросов;
+    - ждать слот могут не больше max_queue запросов и не дольше
+      queue_timeout секунд, остальные сразу получают отказ;
+    - от одного пользователя отвечается только последнее сообщение:
+      ожидающие более старые снимаются, а их текст объединяется с новым;
+    - фоновые запросы (сжатие диалогов) занимают те же слоты, но только
+      когда их не ждет ни один запрос пользователя.
+    """
+
+    BACKGROUND_RETRY = 0.5  # секунды до новой попытки фонового запроса, уступившего слот
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._users: Dict[int, _UserState] = {}
+        self._waiting = 0
+        self._in_flight = 0
+
+        self.stats = {
+            'admitted': 0,
+            'superseded': 0,
+            'merged_messages': 0,
+            'shed_queue_full': 0,
+            'shed_timeout': 0,
+            'max_waiting': 0,
+            'background': 0,
+            'background_yields': 0,
+        }
+
+    def announce(self, user_id: int, update_id: int, text: str):
+        """Регистрация нового сообщения; повторный вызов для того же update_id ничего не меняет"""
+        state = self._users.setdefault(user_id, _UserState())
+        if update_id <= state.latest:
+            return
+        state.latest = update_id
+        state.pending.append((update_id, text))
+        if state.superseded is not None:
+            state.superseded.set()
+
+    @asynccontextmanager
+    async def admit(self, user_id: int, update_id: int) -> AsyncIterator[str]:
+        """Слот для запроса к модели; возвращает текст всех неотвеченных сообщений пользователя"""
+        state = self._users.get(user_id)
+        if state is None or update_id != state.latest:
+            self._reject_superseded(state, update_id)
+
+        if self._waiting >= self.max_queue and self._semaphore.locked():
+            self.stats['shed_queue_full'] += 1
+            self._shed(user_id, state, update_id)
+            raise Overloaded("очередь к модели переполнена")
+
+        await self._acquire(user_id, state, update_id)
+        state.active += 1
+        self._in_flight += 1
+        try:
+            question = self._take_pending(state, update_id)
+            self.stats['admitted'] += 1
+            yield question
+        finally:
+            state.active -= 1
+            self._in_flight -= 1
+            self._semaphore.release()
+            self._cleanup(user_id)
+
+    @asynccontextmanager
+    async def background(self) -> AsyncIterator[None]:
+        """Слот для фонового запроса к модели с низшим приоритетом"""
+        while True:
+            await self._semaphore.acquire()
+            if not self._waiting:
+                break
+            # Слот нужнее пользователю, который ждет ответа
+            self._semaphore.release()
+            self.stats['background_yields'] += 1
+            await asyncio.sleep(self.BACKGROUND_RETRY)
+
+        self._in_flight += 1
+        self.stats['background'] += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def _acquire(self, user_id: int, state: _UserState, update_id: int):
+        """Ожидание слота, которое прерывается более новым сообщением пользователя"""
+        superseded = state.superseded = asyncio.Event()
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        cancel_wait = asyncio.ensure_future(superseded.wait())
+
+        self._waiting += 1
+        self.stats['max_waiting'] = max(self.stats['max_waiting'], self._waiting)
+        try:
+            await asyncio.wait({acquire, cancel_wait}, timeout=self.queue_timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._waiting -= 1
+            cancel_wait.cancel()
+            if state.superseded is superseded:
+                state.superseded = None
+
+            acquired = acquire.done() and not acquire.cancelled()
+            if not acquired:
+                acquire.cancel()
+                try:
+                    acquired = await acquire
+                except asyncio.CancelledError:
+                    acquired = False
+
+        if acquired and superseded.is_set():
+            self._semaphore.release()
+            acquired = False
+        if not acquired:
+            if superseded.is_set():
+                self._reject_superseded(state, update_id)
+            self.stats['shed_timeout'] += 1
+            self._shed(user_id, state, update_id)
+            raise Overloaded(f"нет свободного слота за {self.queue_timeout} с")
+
+    def settle(self, user_id: int, update_id: int):
+        """Обработка сообщения закончена.
+
+        Текст снятого сообщения остается ждать более нового. Иначе его текст
+        (и тексты снятых ради него) больше никто не заберет - например,
+        сообщение ушло оператору, а не модели, - поэтому они удаляются из
+        ожидающих, даже если от пользователя уже пришло следующее.
+        """
+        state = self._users.get(user_id)
+        if state is None:
+            return
+        if update_id in state.handed_over:
+            return
+        state.pending = [(pending_id, text) for pending_id, text in state.pending if pending_id > update_id]
+        state.handed_over = {pending_id for pending_id in state.handed_over if pending_id > update_id}
+        self._cleanup(user_id)
+
+    def _take_pending(self, state: _UserState, update_id: int) -> str:
+        texts = [text for pending_id, text in state.pending if pending_id <= update_id]
+        state.pending = [(pending_id, text) for pending_id, text in state.pending if pending_id > update_id]
+        self.stats['merged_messages'] += len(texts) - 1
+        return '\n'.join(texts)
+
+    def _reject_superseded(self, state: Optional[_UserState], update_id: int):
+        if state is not None:
+            state.handed_over.add(update_id)
+        self.stats['superseded'] += 1
+        raise Superseded("есть более новое сообщение")
+
+    def _shed(self, user_id: int, state: _UserState, update_id: int):
+        """Отказ из-за перегрузки: пользователь получит сообщение об этом вместо ответа"""
+        state.pending = [(pending_id, text) for pending_id, text in state.pending if pending_id > update_id]
+        self._cleanup(user_id)
+
+    def _cleanup(self, user_id: int):
+        """Удаление состояния пользователя, когда у него нет ни ожидающих, ни активных запросов"""
+        state = self._users.get(user_id)
+        if (state is not None and not state.pending and not state.active and state.superseded is None
+                and not state.handed_over):
+            del self._users[user_id]
+
+    def get_stats(self) -> dict:
+        """Счетчики допуска и текущая загрузка"""
+        return {
+            **self.stats,
+            'waiting': self._waiting,
+            'in_flight': self._in_flight,
+            'tracked_users': len(self._users),
+        }
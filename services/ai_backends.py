@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import math
+import random
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from typing import AsyncIterator, List, Optional
+
+from config.settings import Settings
+
+
+def make_completion(text: str, prompt_tokens: Optional[int] = None):
+    """Ответ в форме chat completion: choices[0].message.content"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens) if prompt_tokens is not None else None
+    )
+
+
+def make_chunk(delta: str):
+    """Фрагмент потокового ответа: choices[0].delta.content"""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+
+class AIBackend(ABC):
+    """Поставщик ответов модели в формате chat completions.
+
+    create(stream=False) возвращает объект с choices[0].message.content,
+    create(stream=True) - асинхронный итератор фрагментов с
+    choices[0].delta.content. Ошибки провайдера пробрасываются как есть,
+    повторами и таймаутами занимается AITransport.
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    async def create(self, *, model: str, messages: List[dict], max_tokens: int, temperature: float,
+                     stream: bool = False):
+        ...
+
+    async def close(self):
+        """Освобождение соединений"""
+
+
+class HuggingFaceBackend(AIBackend):
+    """Провайдер через huggingface_hub.AsyncInferenceClient"""
+
+    name = 'huggingface'
+
+    def __init__(self, provider: str, api_key: Optional[str], timeout: float):
+        # Импорт здесь: для локального бэкенда huggingface_hub не нужен
+        from huggingface_hub import AsyncInferenceClient
+        self.client = AsyncInferenceClient(provider=provider, api_key=api_key, timeout=timeout)
+
+    async def create(self, *, model: str, messages: List[dict], max_tokens: int, temperature: float,
+                     stream: bool = False):
+        return await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=stream
+        )
+
+    async def close(self):
+        await self.client.close()
+
+
+class StubProviderError(Exception):
+    """Ошибка, внедренная локальным бэкендом; похожа на HTTP-ошибку провайдера"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code} (внедренная ошибка)")
+        self.response = SimpleNamespace(status_code=status_code, headers={})
+
+
+class LocalStubBackend(AIBackend):
+    """Локальная замена модели для нагрузочных тестов без сети.
+
+    Задержка до первого токена берется из распределения latency
+    ('fixed', 'uniform', 'exponential' или 'lognormal' со средним
+    latency_mean), дальше текст выдается со скоростью tokens_per_second.
+    error_rate и hang_rate задают долю ошибок 503 и зависших запросов.
+    Текст ответа детерминирован: зависит только от последнего вопроса.
+    """
+
+    name = 'local'
+
+    ANSWERS = [
+        "Для магистратуры в Германии обычно нужны диплом бакалавра, IELTS 6.5 и мотивационное письмо. "
+        "Многие государственные программы бесплатные, оплачивается только семестровый взнос около €300.",
+        "В Нидерландах обучение стоит около €2300 в год для студентов из ЕС и от €8000 для остальных. "
+        "Подавать документы лучше до 1 мая, на популярные программы - до 1 февраля.",
+        "Хороший вариант с ограниченным бюджетом - Чехия и Польша: программы на английском от €2000-4000 в год, "
+        "а на национальном языке в государственных вузах Чехии обучение бесплатное.",
+        "Начни с выбора 3-5 программ и проверки требований к языку. Потом готовь мотивационное письмо "
+        "и рекомендации - на это обычно уходит 1-2 месяца.",
+    ]
+
+    def __init__(self, latency: str = 'lognormal', latency_mean: float = 0.8, latency_sigma: float = 0.5,
+                 tokens_per_second: float = 40.0, error_rate: float = 0.0, hang_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self._random = random.Random(seed)
+
+        self.stats = {
+            'calls': 0,
+            'errors': 0,
+            'hangs': 0,
+        }
+
+    def _sample_latency(self) -> float:
+        if self.latency == 'fixed':
+            return self.latency_mean
+        if self.latency == 'uniform':
+            return self._random.uniform(0, 2 * self.latency_mean)
+        if self.latency == 'exponential':
+            return self._random.expovariate(1 / self.latency_mean) if self.latency_mean else 0.0
+        # lognormal с заданным средним: mu = ln(mean) - sigma^2 / 2
+        if not self.latency_mean:
+            return 0.0
+        mu = math.log(self.latency_mean) - self.latency_sigma ** 2 / 2
+        return self._random.lognormvariate(mu, self.latency_sigma)
+
+    def _answer(self, messages: List[dict], max_tokens: int) -> str:
+        question = next((m['content'] for m in reversed(messages) if m['role'] == 'user'), '')
+        digest = hashlib.sha1(question.encode('utf-8')).digest()
+        words = self.ANSWERS[digest[0] % len(self.ANSWERS)].split(' ')
+        return ' '.join(words[:max_tokens])
+
+    async def create(self, *, model: str, messages: List[dict], max_tokens: int, temperature: float,
+                     stream: bool = False):
+        self.stats['calls'] += 1
+        await asyncio.sleep(self._sample_latency())
+
+        roll = self._random.random()
+        if roll < self.hang_rate:
+            self.stats['hangs'] += 1
+            await asyncio.sleep(3600)
+        if roll < self.hang_rate + self.error_rate:
+            self.stats['errors'] += 1
+            raise StubProviderError(503)
+
+        text = self._answer(messages, max_tokens)
+        prompt_tokens = sum(len(m['content']) for m in messages) // 3
+        if not stream:
+            # Без потока ответ приходит целиком - после генерации всех токенов
+            await asyncio.sleep(len(text.split(' ')) / self.tokens_per_second)
+            return make_completion(text, prompt_tokens)
+        return self._stream(text)
+
+    async def _stream(self, text: str) -> AsyncIterator:
+        for i, word in enumerate(text.split(' ')):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield make_chunk(word if i == 0 else ' ' + word)
+
+
+def create_backend(name: Optional[str] = None) -> AIBackend:
+    """Бэкенд по имени; по умолчанию - Settings.AI_BACKEND"""
+    name = name or Settings.AI_BACKEND
+    if name == HuggingFaceBackend.name:
+        return HuggingFaceBackend(Settings.AI_PROVIDER, Settings.HUGGINGFACE_TOKEN, Settings.AI_ATTEMPT_TIMEOUT)
+    if name == LocalStubBackend.name:
+        return LocalStubBackend(
+            latency=Settings.AI_STUB_LATENCY,
+            latency_mean=Settings.AI_STUB_LATENCY_MEAN,
+            tokens_per_second=Settings.AI_STUB_TOKENS_PER_SECOND,
+            error_rate=Settings.AI_STUB_ERROR_RATE,
+            hang_rate=Settings.AI_STUB_HANG_RATE
+        )
+    raise ValueError(f"Неизвестный AI_BACKEND: {name}")
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import re
+import time
+from typing import Optional
+
+from config.settings import Settings
+from database.async_db import AsyncEducationDatabase
+from utils.ttl_cache import TTLCache
+
+NON_WORD_RE = re.compile(r'[^\w\s]+')
+SPACES_RE = re.compile(r'\s+')
+
+# Поля профиля, которые попадают в промпт и меняют ответ консультанта
+PROFILE_KEY_FIELDS = ('degree', 'field', 'max_budget', 'language')
+
+
+def normalize_question(message: str) -> str:
+    """Текст вопроса без регистра, пунктуации, эмодзи и лишних пробелов"""
+    text = message.lower().replace('ё', 'е')
+    text = NON_WORD_RE.sub(' ', text)
+    return SPACES_RE.sub(' ', text).strip()
+
+
+class AIResponseCache:
+    """Кэш ответов модели: LRU в памяти поверх таблицы ai_cache.
+
+    Ключ строится из нормализованного вопроса, значимых полей профиля и
+    имени модели. Ответы переживают перезапуск бота; устаревшие записи и
+    записи сверх max_entries периодически удаляются из SQLite.
+    """
+
+    def __init__(self, db: AsyncEducationDatabase, max_entries: int, ttl: float, memory_entries: int,
+                 prune_every: int = 100, min_words: int = Settings.AI_CACHE_MIN_WORDS):
+        self.db = db
+        self.min_words = min_words
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self.memory = TTLCache(memory_entries, ttl)
+        self._stores_since_prune = 0
+
+        self.stats = {
+            'hits': 0,
+            'memory_hits': 0,
+            'db_hits': 0,
+            'misses': 0,
+            'skipped': 0,
+            'stores': 0,
+            'pruned': 0,
+        }
+
+    @staticmethod
+    def make_key(message: str, user_profile: dict) -> str:
+        profile = {name: user_profile.get(name) for name in PROFILE_KEY_FIELDS}
+        if profile['field']:
+            profile['field'] = sorted(field.strip().lower() for field in profile['field'])
+        payload = json.dumps([Settings.AI_MODEL, normalize_question(message), profile],
+                             ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def cacheable(self, message: str) -> bool:
+        """Вопрос достаточно самостоятелен, чтобы ответ не зависел от истории диалога"""
+        return len(normalize_question(message).split()) >= self.min_words
+
+    async def get(self, message: str, user_profile: dict) -> Optional[str]:
+        """Сохраненный ответ на такой же вопрос или None"""
+        if not self.cacheable(message):
+            self.stats['skipped'] += 1
+            return None
+        key = self.make_key(message, user_profile)
+
+        response = self.memory.get(key)
+        if response is not None:
+            self.stats['hits'] += 1
+            self.stats['memory_hits'] += 1
+            return response
+
+        row = await self.db.get_ai_response(key, time.time())
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+
+        response, expires_at = row
+        self.memory.set(key, response, ttl=expires_at - time.time())
+        self.stats['hits'] += 1
+        self.stats['db_hits'] += 1
+        return response
+
+    async def set(self, message: str, user_profile: dict, response: str):
+        """Запомнить ответ модели"""
+        if not self.cacheable(message):
+            return
+        key = self.make_key(message, user_profile)
+        self.memory.set(key, response)
+        await self.db.save_ai_response(key, response, time.time() + self.ttl)
+        self.stats['stores'] += 1
+
+        self._stores_since_prune += 1
+        if self._stores_since_prune >= self.prune_every:
+            self._stores_since_prune = 0
+            self.stats['pruned'] += await self.db.prune_ai_cache(time.time(), self.max_entries)
+
+    def get_stats(self) -> dict:
+        """Счетчики кэша и доля попаданий"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'memory_entries': len(self.memory),
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+        }
@@ -1,65 +1,292 @@
-from huggingface_hub import InferenceClient
+import asyncio
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
 from config.settings import Settings, AIPrompts
-import json
+from database.models import ROLE_LABELS
+from services.ai_cache import AIResponseCache
+from services.prompt_builder import Prompt, PromptBuilder
+from services.ai_transport import AITransport, CircuitBreaker, CircuitOpenError
+from services.ai_backends import AIBackend, create_backend
+from utils.keyword_matcher import KeywordMatcher
 
 
 class AIService:
-    def __init__(self):
-        self.client = InferenceClient(
-            provider=Settings.AI_PROVIDER,
-            api_key=Settings.HUGGINGFACE_TOKEN
+    """Ответы консультанта через асинхронный клиент модели.
+
+    Запросы не блокируют event loop; одновременно выполняется не больше
+    max_concurrency запросов, остальные ждут своей очереди на семафоре.
+    Если передан cache, повторные вопросы в начале диалога (без истории и краткого
+    содержания) обслуживаются без обращения к модели.
+    Промпт собирает PromptBuilder: системный промпт, профиль и столько
+    последних реплик, сколько помещается в AI_PROMPT_TOKEN_BUDGET.
+    Модель подключается через AIBackend (Settings.AI_BACKEND), сбои
+    провайдера обрабатывает AITransport; пока провайдер недоступен,
+    на частые вопросы отвечают локальные заготовки FALLBACK_TOPICS.
+    """
+
+    # Ответы без модели на время сбоя провайдера: (ключевые слова, ответ)
+    FALLBACK_TOPICS = [
+        (('документ', 'справк', 'перевод', 'апостил'),
+         "Обычно нужны диплом или аттестат с переводом, языковой сертификат (IELTS/TOEFL), "
+         "мотивационное письмо, CV и рекомендации 📄 Точный список зависит от программы - "
+         "напиши «связаться с менеджером», и мы проверим его для тебя."),
+        (('стоит', 'стоимость', 'цена', 'бюджет', 'бесплатн', 'евро'),
+         "В государственных вузах Германии и Скандинавии часто можно учиться бесплатно, в Чехии и Польше - "
+         "от €2000-4000 в год, в Нидерландах - около €2300 💰 Напиши «хочу учиться», и я подберу программы "
+         "под твой бюджет."),
+        (('дедлайн', 'когда подавать', 'сроки', 'успеть'),
+         "На осенний семестр заявки обычно принимают с декабря по май, в Германии - до 15 июля, "
+         "в Скандинавии - уже в январе 📅 Напиши «хочу учиться», и я покажу дедлайны подходящих программ."),
+        (('виза', 'визу', 'вид на жительство', 'внж'),
+         "Студенческую визу оформляют после зачисления; обычно нужны приглашение вуза, подтверждение "
+         "финансов и страховка ✈️ По визовым вопросам лучше проконсультироваться с менеджером."),
+    ]
+    FALLBACK_MATCHER = KeywordMatcher({i: keywords for i, (keywords, _) in enumerate(FALLBACK_TOPICS)})
+    FALLBACK_DEFAULT = (
+        "Извини, небольшая техническая заминка 😅 Пока можно подобрать программы - напиши «хочу учиться», "
+        "или напиши «связаться с менеджером», и с тобой свяжется консультант."
+    )
+
+    def __init__(self, backend: Optional[AIBackend] = None,
+                 max_concurrency: Optional[int] = Settings.AI_MAX_CONCURRENCY,
+                 timeout: float = Settings.AI_REQUEST_TIMEOUT, cache: Optional[AIResponseCache] = None):
+        self.backend = backend or create_backend()
+        self.transport = AITransport(
+            self.backend,
+            CircuitBreaker(Settings.AI_CIRCUIT_FAILURE_THRESHOLD, Settings.AI_CIRCUIT_RESET_TIMEOUT),
+            attempt_timeout=Settings.AI_ATTEMPT_TIMEOUT,
+            max_retries=Settings.AI_MAX_RETRIES,
+            backoff_base=Settings.AI_RETRY_BACKOFF_BASE,
+            backoff_max=Settings.AI_RETRY_BACKOFF_MAX
         )
+        self.timeout = timeout
+        self.cache = cache
+        self.prompt_builder = PromptBuilder(AIPrompts.CONSULTANT_SYSTEM, Settings.AI_PROMPT_TOKEN_BUDGET)
+        # None - число запросов ограничивает вызывающий (в боте - AIAdmissionController)
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else nullcontext()
+
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'in_flight': 0,
+            'max_in_flight': 0,
+            'total_latency': 0.0,
+            'streams': 0,
+            'total_first_token_latency': 0.0,
+            'prompts': 0,
+            'last_prompt_tokens': 0,
+            'max_prompt_tokens': 0,
+            'total_prompt_tokens': 0,
+            'total_history_turns': 0,
+            'provider_prompt_tokens': 0,
+            'summaries': 0,
+            'fallbacks': 0,
+        }
+
+    def _record_prompt(self, prompt: Prompt) -> Prompt:
+        """Учет размера промпта, который уходит модели"""
+        self.stats['prompts'] += 1
+        self.stats['last_prompt_tokens'] = prompt.prompt_tokens
+        self.stats['max_prompt_tokens'] = max(self.stats['max_prompt_tokens'], prompt.prompt_tokens)
+        self.stats['total_prompt_tokens'] += prompt.prompt_tokens
+        self.stats['total_history_turns'] += prompt.history_turns
+        return prompt
+
+    def _use_cache(self, prompt: Prompt, summary: str) -> bool:
+        """Кэш общий для всех пользователей, поэтому в нем только ответы без истории диалога.
 
-    async def get_response(self, message: str, user_profile: dict) -> tuple[str, int]:
-        """Получение ответа от AI с оценкой интереса"""
+        Ответ, построенный по репликам и краткому содержанию одного
+        пользователя, не должен достаться другому с тем же вопросом.
+        """
+        return self.cache is not None and prompt.history_turns == 0 and not summary
 
-        context = AIPrompts.CONSULTANT_SYSTEM + f"\n\n📊 ПРОФИЛЬ КЛИЕНТА: {json.dumps(user_profile, ensure_ascii=False)}"
+    async def get_response(self, message: str, user_profile: dict,
+                           history: Iterable[Tuple[str, str]] = (), summary: str = '') -> tuple[str, int]:
+        """Получение ответа от AI с оценкой интереса.
+
+        history - последние реплики (role, text), summary - краткое содержание более ранних.
+        """
+        prompt = self.prompt_builder.build(message, user_profile, history, summary)
+        use_cache = self._use_cache(prompt, summary)
+        if use_cache:
+            cached = await self.cache.get(message, user_profile)
+            if cached is not None:
+                return cached, self.calculate_interest_score(message)
 
         try:
-            completion = self.client.chat.completions.create(
-                model=Settings.AI_MODEL,
-                messages=[
-                    {"role": "system", "content": context},
-                    {"role": "user", "content": message}
-                ],
-                max_tokens=Settings.MAX_TOKENS,
-                temperature=Settings.TEMPERATURE
-            )
+            async with self._request():
+                completion = await self._create(self._record_prompt(prompt).messages)
 
             response = completion.choices[0].message.content
+            usage = getattr(completion, 'usage', None)
+            if usage is not None and getattr(usage, 'prompt_tokens', None):
+                # Точное число токенов от провайдера - для сверки с оценкой
+                self.stats['provider_prompt_tokens'] += usage.prompt_tokens
+            if use_cache and response:
+                await self.cache.set(message, user_profile, response)
 
             # Оценка интереса (ваша логика)
-            interest_score = self._calculate_interest_score(message)
+            interest_score = self.calculate_interest_score(message)
 
             return response, interest_score
 
         except Exception as e:
-            print(f"Ошибка AI: {e}")
-            return "Извини, небольшая техническая заминка 😅 Можешь повторить вопрос?", 0
+            self._record_error(e)
+            return self.fallback_response(message), self.calculate_interest_score(message)
 
-    def _calculate_interest_score(self, message: str) -> int:
-        """Расчет уровня заинтересованности"""
-        interest_keywords = {
-            'high': ['хочу поступать', 'когда подавать', 'какие документы', 'помогите подать'],
-            'medium': ['интересно', 'подходит', 'рассматриваю', 'думаю', 'планирую'],
-            'low': ['просто узнать', 'в будущем', 'может быть']
+    async def stream_response(self, message: str, user_profile: dict,
+                              history: Iterable[Tuple[str, str]] = (), summary: str = '') -> AsyncIterator[str]:
+        """Ответ AI по частям, по мере генерации.
+
+        Общий лимит времени тот же, что у get_response. Если модель не
+        ответила ни одним фрагментом, выдается локальный ответ fallback_response.
+        Ответ из кэша выдается одним фрагментом; в кэш попадают только
+        полностью полученные ответы.
+        """
+        prompt = self.prompt_builder.build(message, user_profile, history, summary)
+        use_cache = self._use_cache(prompt, summary)
+        if use_cache:
+            cached = await self.cache.get(message, user_profile)
+            if cached is not None:
+                yield cached
+                return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        emitted = False
+        parts = []
+        completed = False
+        stream = None
+
+        try:
+            async with self._request():
+                self.stats['streams'] += 1
+                start = time.monotonic()
+                stream = await self._create(self._record_prompt(prompt).messages,
+                                            stream=True, timeout=deadline - loop.time())
+                chunks = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline - loop.time())
+                    except StopAsyncIteration:
+                        completed = True
+                        break
+
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        if not emitted:
+                            self.stats['total_first_token_latency'] += time.monotonic() - start
+                            emitted = True
+                        parts.append(delta)
+                        yield delta
+
+        except Exception as e:
+            if stream is not None:
+                # Поток оборвался уже после подключения - это тоже сбой провайдера
+                self.transport.breaker.record_failure()
+            self._record_error(e)
+
+        if not emitted:
+            yield self.fallback_response(message)
+        elif completed and use_cache:
+            await self.cache.set(message, user_profile, ''.join(parts))
+
+    async def summarize(self, summary: str, turns: List[Tuple[str, str]]) -> Optional[str]:
+        """Новое краткое содержание: прежнее плюс реплики turns; None при ошибке модели"""
+        dialog = '\n'.join(f"{ROLE_LABELS.get(role, role)}: {text}" for role, text in turns)
+        messages = [
+            {"role": "system", "content": AIPrompts.CONVERSATION_SUMMARY},
+            {"role": "user", "content": f"Прежнее содержание:\n{summary or '(нет)'}\n\nНовые реплики:\n{dialog}"},
+        ]
+        try:
+            async with self._request():
+                self.stats['summaries'] += 1
+                completion = await self._create(messages, max_tokens=Settings.SUMMARY_MAX_TOKENS, temperature=0.2)
+            return (completion.choices[0].message.content or '').strip() or None
+        except Exception as e:
+            self._record_error(e)
+            return None
+
+    async def _create(self, messages: list, stream: bool = False, max_tokens: int = Settings.MAX_TOKENS,
+                      temperature: float = Settings.TEMPERATURE, timeout: Optional[float] = None):
+        """Запрос к модели через транспорт с повторами и автоматом отключения"""
+        params = dict(model=Settings.AI_MODEL, messages=messages, max_tokens=max_tokens, temperature=temperature)
+        timeout = self.timeout if timeout is None else timeout
+        if stream:
+            return await self.transport.open_stream(timeout, **params)
+        return await self.transport.complete(timeout, **params)
+
+    def _record_error(self, error: Exception):
+        if isinstance(error, CircuitOpenError):
+            # Автомат разомкнут - запрос даже не отправлялся, логировать каждый раз незачем
+            return
+        if isinstance(error, asyncio.TimeoutError):
+            self.stats['timeouts'] += 1
+            print(f"Ошибка AI: нет ответа за {self.timeout} с")
+        else:
+            self.stats['errors'] += 1
+            print(f"Ошибка AI: {error}")
+
+    async def close(self):
+        """Закрытие соединений бэкенда"""
+        await self.backend.close()
+
+    def fallback_response(self, message: str) -> str:
+        """Мгновенный ответ без модели по теме вопроса"""
+        self.stats['fallbacks'] += 1
+        topic = self.FALLBACK_MATCHER.first(message)
+        return self.FALLBACK_DEFAULT if topic is None else self.FALLBACK_TOPICS[topic][1]
+
+    @asynccontextmanager
+    async def _request(self):
+        """Слот семафора (если он есть) и счетчики на время одного запроса к модели"""
+        async with self._semaphore:
+            self.stats['requests'] += 1
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+            start = time.monotonic()
+            try:
+                yield
+            finally:
+                self.stats['in_flight'] -= 1
+                self.stats['total_latency'] += time.monotonic() - start
+
+    def get_stats(self) -> dict:
+        """Счетчики запросов к модели и кэша ответов"""
+        requests = self.stats['requests']
+        return {
+            **self.stats,
+            'cache': self.cache.get_stats() if self.cache is not None else None,
+            'transport': self.transport.get_stats(),
+            'avg_latency': self.stats['total_latency'] / requests if requests else 0.0,
+            'avg_prompt_tokens': (
+                self.stats['total_prompt_tokens'] / self.stats['prompts'] if self.stats['prompts'] else 0.0
+            ),
+            'avg_first_token_latency': (
+                self.stats['total_first_token_latency'] / self.stats['streams'] if self.stats['streams'] else 0.0
+            ),
         }
 
-        interest_score = 0
-        message_lower = message.lower()
+    # Ключевые слова уровней интереса и их вес: за каждое найденное слово
+    INTEREST_KEYWORDS = KeywordMatcher({
+        'high': ['хочу поступать', 'когда подавать', 'какие документы', 'помогите подать'],
+        'medium': ['интересно', 'подходит', 'рассматриваю', 'думаю', 'планирую'],
+        'low': ['просто узнать', 'в будущем', 'может быть'],
+        'details': ['стоимость', 'цена', 'дедлайн', 'требования'],
+    })
+    INTEREST_WEIGHTS = {'high': 3, 'medium': 2, 'low': 1}
 
-        for level, keywords in interest_keywords.items():
-            matches = sum(1 for keyword in keywords if keyword in message_lower)
-            if level == 'high':
-                interest_score += matches * 3
-            elif level == 'medium':
-                interest_score += matches * 2
-            else:
-                interest_score += matches * 1
+    def calculate_interest_score(self, message: str) -> int:
+        """Расчет уровня заинтересованности"""
+        hits = self.INTEREST_KEYWORDS.scan(message)
+        interest_score = sum(hits.get(level, 0) * weight for level, weight in self.INTEREST_WEIGHTS.items())
 
         if '?' in message:
             interest_score += 1
-        if any(word in message_lower for word in ['стоимость', 'цена', 'дедлайн', 'требования']):
+        if 'details' in hits:
+            # Вопрос о деталях - бонус один, сколько бы слов ни нашлось
             interest_score += 2
 
         return min(interest_score, 10)
\ No newline at end of file
@@ -0,0 +1,179 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+from services.ai_backends import AIBackend
+
+# Ответы провайдера, после которых повтор имеет смысл
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+# Сетевые ошибки HTTP-клиентов, которые не наследуют OSError
+RETRYABLE_ERROR_NAMES = {'TransportError', 'ClientConnectionError', 'ServerDisconnectedError'}
+
+
+class CircuitOpenError(Exception):
+    """Провайдер недоступен: автомат разомкнут, запрос не отправлялся"""
+
+
+def error_status(error: Exception) -> Optional[int]:
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Временная ли это ошибка: таймаут, обрыв соединения, 429 или 5xx"""
+    if isinstance(error, (asyncio.TimeoutError, OSError)):
+        return True
+    if error_status(error) in RETRYABLE_STATUS_CODES:
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Пауза из заголовка Retry-After, если провайдер ее указал"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Автомат отключения провайдера.
+
+    После failure_threshold ошибок подряд размыкается на reset_timeout
+    секунд; затем пропускает один пробный запрос и по его результату
+    замыкается снова или продлевает паузу.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        self.stats = {
+            'opened': 0,
+            'rejected': 0,
+        }
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас"""
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        self.stats['rejected'] += 1
+        return False
+
+    def release_probe(self):
+        """Попытка завершилась (с любым исходом) - можно пропустить следующий пробный запрос"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.stats['opened'] += 1
+                print(f"⚡ Провайдер AI отключен на {self.reset_timeout} с после {self.failures} ошибок подряд")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def get_stats(self) -> dict:
+        return {**self.stats, 'state': self.state, 'failures': self.failures}
+
+
+class AITransport:
+    """Вызовы chat completions с жестким сроком, повторами и автоматом отключения.
+
+    Весь запрос, включая повторы и паузы между ними, укладывается в timeout.
+    Каждая попытка ограничена attempt_timeout; паузы растут экспоненциально
+    со случайным разбросом (full jitter), чтобы клиенты не повторяли
+    запросы синхронно.
+    """
+
+    def __init__(self, backend: AIBackend, breaker: CircuitBreaker, attempt_timeout: float, max_retries: int,
+                 backoff_base: float, backoff_max: float):
+        self.backend = backend
+        self.breaker = breaker
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.stats = {
+            'attempts': 0,
+            'retries': 0,
+            'failures': 0,
+        }
+
+    async def complete(self, timeout: float, **params):
+        """Полный ответ модели"""
+        return await self._call(timeout, params)
+
+    async def open_stream(self, timeout: float, **params):
+        """Открытие потокового ответа; повторяется только до получения потока"""
+        return await self._call(timeout, {**params, 'stream': True})
+
+    async def _call(self, timeout: float, params: dict):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        attempt = 0
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+
+            if not self.breaker.allow():
+                raise CircuitOpenError("провайдер AI временно отключен")
+
+            self.stats['attempts'] += 1
+            error = None
+            try:
+                result = await asyncio.wait_for(
+                    self.backend.create(**params),
+                    timeout=min(self.attempt_timeout, remaining)
+                )
+            except Exception as e:
+                error = e
+            finally:
+                # И при отмене запроса (CancelledError - не Exception): иначе пробный
+                # запрос считался бы выполняющимся вечно и автомат не замкнулся бы
+                self.breaker.release_probe()
+
+            if error is None:
+                self.breaker.record_success()
+                return result
+
+            self.breaker.record_failure()
+            self.stats['failures'] += 1
+            if not is_retryable(error) or attempt >= self.max_retries:
+                raise error
+
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            delay = max(delay, retry_after(error) or 0.0)
+            if loop.time() + delay >= deadline:
+                raise error
+            attempt += 1
+            self.stats['retries'] += 1
+            await asyncio.sleep(delay)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, 'circuit': self.breaker.get_stats()}
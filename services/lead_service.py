@@ -1,10 +1,10 @@
 from datetime import datetime
-from database.education_db import EducationDatabase
+from database.async_db import AsyncEducationDatabase
 from database.models import UserSession
 from config.settings import Settings
 
 class LeadService:
-    def __init__(self, db: EducationDatabase):
+    def __init__(self, db: AsyncEducationDatabase):
         self.db = db
 
     def should_notify_manager(self, session: UserSession) -> bool:
@@ -12,8 +12,10 @@ class LeadService:
         return (session.interest_score >= Settings.MANAGER_NOTIFICATION_THRESHOLD and
                 session.stage == "showing_results")
 
-    def create_lead_report(self, session: UserSession) -> str:
+    async def create_lead_report(self, session: UserSession) -> str:
         """Создание отчета о лиде для менеджера"""
+        messages = await self.db.get_messages(session.user_id, Settings.LEAD_REPORT_MESSAGES)
+
         return f"""
 🔥 **Новый лид!**
 
@@ -23,7 +25,7 @@ class LeadService:
 {session.profile}
 
 💬 **Последние сообщения:**
-{chr(10).join(session.conversation_history[-3:]) if session.conversation_history else 'Нет сообщений'}
+{chr(10).join(message.as_line() for message in messages) if messages else 'Нет сообщений'}
 
 🕐 **Время:** {session.last_activity.strftime('%H:%M %d.%m.%Y')}
         """
@@ -37,12 +39,13 @@ class LeadService:
         filled_fields = sum(1 for field in profile_fields if session.profile.get(field))
         score += (filled_fields / len(profile_fields)) * 30
 
-        # Активность в диалоге (0-25 баллов)
-        if len(session.conversation_history) > 10:
+        # Активность в диалоге (0-25 баллов): реплики, ушедшие из буфера, тоже считаются
+        turns = session.history_start + len(session.conversation_history)
+        if turns > 10:
             score += 25
-        elif len(session.conversation_history) > 5:
+        elif turns > 5:
             score += 15
-        elif len(session.conversation_history) > 2:
+        elif turns > 2:
             score += 10
 
         # Интерес (0-45 баллов)
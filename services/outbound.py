@@ -0,0 +1,331 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import timedelta
+from enum import IntEnum
+from typing import Any, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from telegram.error import RetryAfter
+
+
+class Priority(IntEnum):
+    """Очереди исходящих сообщений: меньшее значение уходит раньше"""
+    OPERATOR = 0  # переписка с операторами и отчеты о лидах
+    REPLY = 1  # ответы пользователю на его сообщение
+    BULK = 2  # рассылки
+
+
+class OutboundQueueFull(Exception):
+    """Очередь исходящих переполнена - сообщение рассылки не принято"""
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд появится токен; 0 - можно отправлять сейчас"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass
+class _Job:
+    priority: Priority
+    chat_id: int
+    method: str
+    kwargs: Dict[str, Any]
+    future: asyncio.Future
+    droppable: bool = False
+    coalesce_key: Optional[Hashable] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class OutboundQueue:
+    """Все исходящие сообщения бота через одну очередь с лимитами Telegram.
+
+    - общий лимит бота (около 30 сообщений в секунду) и лимит на чат
+      (около 1 в секунду в личный чат, 20 в минуту в группу) - ведра токенов;
+    - очереди по приоритетам: операторы раньше ответов, ответы раньше рассылок;
+      внутри одного чата порядок сообщений сохраняется;
+    - RetryAfter приостанавливает все отправки на указанное время, после чего
+      сообщение повторяется (до max_retries раз);
+    - промежуточные правки (droppable) с одинаковым coalesce_key схлопываются
+      в последнюю, а при RetryAfter просто пропускаются.
+
+    Ответы на нажатия кнопок (query.answer) и "печатает..." идут напрямую:
+    это не сообщения в чат, и ждать очереди им нельзя.
+    """
+
+    def __init__(self, global_rate: float, global_burst: float, chat_rate: float, chat_burst: float,
+                 group_rate: float, group_burst: float, max_queue: int, max_retries: int):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate, self.chat_burst = chat_rate, chat_burst
+        self.group_rate, self.group_burst = group_rate, group_burst
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+
+        self.bot = None
+        self._lanes: Dict[Priority, Deque[_Job]] = {priority: deque() for priority in Priority}
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._busy_chats: Set[int] = set()  # чаты, сообщение в которые сейчас отправляется
+        self._pending: Dict[Hashable, _Job] = {}  # coalesce_key -> ожидающая правка
+        self._deliveries: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self._buckets_pruned_at = time.monotonic()
+
+        self.stats = {
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'dropped': 0,
+            'coalesced': 0,
+            'rejected': 0,
+            'retry_after': 0,
+            'paused_seconds': 0.0,
+            'max_queued': 0,
+            'total_wait': {priority.name.lower(): 0.0 for priority in Priority},
+            'max_wait': {priority.name.lower(): 0.0 for priority in Priority},
+            'sent_by_priority': {priority.name.lower(): 0 for priority in Priority},
+        }
+
+    def start(self, bot):
+        """Запуск диспетчера; bot - application.bot"""
+        self.bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Дождаться отправки очереди (не дольше timeout) и остановить диспетчер"""
+        deadline = time.monotonic() + timeout
+        while (self.queued() or self._deliveries) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for lane in self._lanes.values():
+            while lane:
+                job = lane.popleft()
+                if not job.future.done():
+                    job.future.set_exception(OutboundQueueFull("Бот остановлен, сообщение не отправлено"))
+
+    def queued(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    # Методы по образцу telegram.Bot
+
+    async def send_message(self, chat_id: int, text: str, priority: Priority = Priority.REPLY, **kwargs):
+        """Отправка сообщения; возвращает telegram.Message после доставки"""
+        return await self.call('send_message', chat_id, priority, text=text, **kwargs)
+
+    async def edit_message_text(self, message, text: str, priority: Priority = Priority.REPLY,
+                                droppable: bool = False, **kwargs):
+        """Правка отправленного сообщения; droppable - промежуточная правка, которую можно пропустить"""
+        return await self.call('edit_message_text', message.chat_id, priority, droppable=droppable,
+                               coalesce_key=('edit', message.chat_id, message.message_id) if droppable else None,
+                               text=text, message_id=message.message_id, **kwargs)
+
+    async def edit_message_reply_markup(self, message, reply_markup=None, priority: Priority = Priority.REPLY):
+        """Замена или удаление клавиатуры под сообщением"""
+        return await self.call('edit_message_reply_markup', message.chat_id, priority,
+                               message_id=message.message_id, reply_markup=reply_markup)
+
+    async def call(self, method: str, chat_id: int, priority: Priority = Priority.REPLY, droppable: bool = False,
+                   coalesce_key: Optional[Hashable] = None, **kwargs):
+        """Вызов метода бота через очередь; результат - то, что вернул бы сам метод.
+
+        Пропущенная промежуточная правка возвращает None.
+        """
+        loop = asyncio.get_running_loop()
+        kwargs['chat_id'] = chat_id
+
+        pending = self._pending.get(coalesce_key) if coalesce_key is not None else None
+        if pending is not None:
+            # Еще не отправленная правка того же сообщения заменяется новой
+            pending.future.set_result(None)
+            pending.future = loop.create_future()
+            pending.kwargs = kwargs
+            self.stats['coalesced'] += 1
+            return await pending.future
+
+        if self.queued() >= self.max_queue:
+            self._make_room(priority)
+
+        job = _Job(priority, chat_id, method, kwargs, loop.create_future(), droppable, coalesce_key)
+        self._lanes[priority].append(job)
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = job
+        self.stats['max_queued'] = max(self.stats['max_queued'], self.queued())
+        self._wakeup.set()
+        return await job.future
+
+    def _make_room(self, priority: Priority):
+        """Переполнение: отказ рассылке; ради более важного сообщения вытесняется последняя рассылка"""
+        bulk = self._lanes[Priority.BULK]
+        if priority == Priority.BULK or not bulk:
+            if priority == Priority.BULK:
+                self.stats['rejected'] += 1
+                raise OutboundQueueFull(f"В очереди уже {self.queued()} сообщений")
+            # Операторам и ответам не отказываем: очередь временно длиннее лимита
+            return
+        evicted = bulk.pop()
+        self._forget(evicted)
+        self.stats['rejected'] += 1
+        evicted.future.set_exception(OutboundQueueFull("Сообщение рассылки вытеснено из очереди"))
+
+    def _forget(self, job: _Job):
+        if job.coalesce_key is not None and self._pending.get(job.coalesce_key) is job:
+            del self._pending[job.coalesce_key]
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательный chat_id - группа или канал, у них свой лимит
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _next_job(self, now: float) -> Tuple[Optional[_Job], Optional[float]]:
+        """Следующее сообщение к отправке или (None, сколько подождать; None - до нового сообщения)"""
+        if now < self._paused_until:
+            return None, self._paused_until - now
+        global_delay = self.global_bucket.delay(now)
+        if global_delay > 0:
+            return None, global_delay
+
+        wait = None
+        for priority in Priority:
+            lane = self._lanes[priority]
+            seen: Set[int] = set()
+            for index, job in enumerate(lane):
+                if job.chat_id in seen or job.chat_id in self._busy_chats:
+                    # Порядок внутри чата: только первое сообщение чата в очереди
+                    seen.add(job.chat_id)
+                    continue
+                seen.add(job.chat_id)
+                delay = self._chat_bucket(job.chat_id).delay(now)
+                if delay == 0:
+                    del lane[index]
+                    return job, None
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            job, wait = self._next_job(now)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._forget(job)
+            self.global_bucket.take(now)
+            self._chat_bucket(job.chat_id).take(now)
+            self._busy_chats.add(job.chat_id)
+            task = asyncio.create_task(self._deliver(job))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+            self._prune_buckets(now)
+
+    async def _deliver(self, job: _Job):
+        job.attempts += 1
+        try:
+            result = await getattr(self.bot, job.method)(**job.kwargs)
+        except RetryAfter as e:
+            delay = retry_after_seconds(e)
+            self.stats['retry_after'] += 1
+            self.stats['paused_seconds'] += delay
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            print(f"⏳ Лимит Telegram: отправка сообщений приостановлена на {delay:g} с")
+            if job.droppable:
+                self.stats['dropped'] += 1
+                if not job.future.done():
+                    job.future.set_result(None)
+            elif job.attempts > self.max_retries:
+                self.stats['failed'] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                # Обратно в начало очереди: следующие сообщения этого чата подождут его
+                self.stats['retried'] += 1
+                self._lanes[job.priority].appendleft(job)
+        except Exception as e:
+            self.stats['failed'] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            name = job.priority.name.lower()
+            waited = time.monotonic() - job.enqueued_at
+            self.stats['sent'] += 1
+            self.stats['sent_by_priority'][name] += 1
+            self.stats['total_wait'][name] += waited
+            self.stats['max_wait'][name] = max(self.stats['max_wait'][name], waited)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._busy_chats.discard(job.chat_id)
+            self._wakeup.set()
+
+    def _prune_buckets(self, now: float, interval: float = 60.0):
+        """Забыть полные ведра чатов, в которые давно ничего не отправлялось"""
+        if now - self._buckets_pruned_at < interval:
+            return
+        self._buckets_pruned_at = now
+        queued_chats = {job.chat_id for lane in self._lanes.values() for job in lane}
+        idle: List[int] = [chat_id for chat_id, bucket in self._chat_buckets.items()
+                           if chat_id not in queued_chats and chat_id not in self._busy_chats and bucket.full(now)]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    def get_stats(self) -> dict:
+        """Метрики доставки: отправлено, ошибки, паузы Telegram, ожидание в очереди по приоритетам"""
+        avg_wait = {
+            name: self.stats['total_wait'][name] / sent if sent else 0.0
+            for name, sent in self.stats['sent_by_priority'].items()
+        }
+        return {
+            **self.stats,
+            'queued': {priority.name.lower(): len(self._lanes[priority]) for priority in Priority},
+            'in_flight': len(self._deliveries),
+            'chats': len(self._chat_buckets),
+            'avg_wait': avg_wait,
+        }
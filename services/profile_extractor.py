@@ -0,0 +1,179 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.keyword_matcher import KeywordMatcher
+
+
+@dataclass(frozen=True)
+class ProfileRule:
+    """Правило анкеты: если в сообщении есть одно из keywords, слот slot получает value.
+
+    Ключевые слова ищутся целиком; 'магистр*' - любое слово с этим началом.
+    Слоты 'currency', 'budget_hint' и 'not_budget' не пишутся в профиль, а
+    помогают разобрать суммы бюджета рядом с ними.
+    """
+    slot: str
+    value: Any
+    keywords: Tuple[str, ...]
+    confidence: float = 0.9
+
+
+@dataclass(frozen=True)
+class ProfileMatch:
+    """Найденное значение слота: уверенность 0..1 и фрагмент сообщения, на котором оно основано"""
+    slot: str
+    value: Any
+    confidence: float
+    source: str
+
+
+# Порядок правил важен: при равной уверенности выигрывает правило выше
+PROFILE_RULES = [
+    # Уровень образования
+    ProfileRule('degree', 'магистратура', ('магистр*', 'магистерск*', 'второе высшее')),
+    ProfileRule('degree', 'бакалавриат', ('бакалавр*', 'первое высшее', 'первое образование')),
+    ProfileRule('degree', 'бакалавриат', ('школу', 'школы', 'окончил школу', 'окончила школу', 'выпускник*',
+                                         '11 класс', '11 класса'), 0.7),
+    ProfileRule('degree', 'магистратура', ('диплом*', 'высшее', 'университет окончил', 'окончил университет'), 0.6),
+
+    # Области интересов
+    ProfileRule('field', 'ИТ', ('ит', 'it', 'программирован*', 'программист*', 'компьютер*', 'софт',
+                                'разработк*', 'кодинг*', 'computer science')),
+    ProfileRule('field', 'ИИ', ('ии', 'ai', 'искусственн*', 'машинное обучение', 'машинному обучению',
+                                'машинного обучения', 'machine learning', 'ml')),
+    ProfileRule('field', 'Data Science', ('data science', 'анализ данных', 'большие данные', 'аналитик*'), 0.9),
+    ProfileRule('field', 'Data Science', ('данные', 'данных'), 0.6),
+    ProfileRule('field', 'бизнес', ('бизнес*', 'менеджмент*', 'управлени*', 'mba', 'экономик*', 'экономист*')),
+
+    # Язык обучения
+    ProfileRule('language', 'английский', ('английск*', 'english', 'англ', 'ielts', 'toefl')),
+    ProfileRule('language', 'немецкий', ('немецк*', 'german', 'deutsch', 'testdaf', 'goethe')),
+
+    # Бюджет
+    ProfileRule('max_budget', 0, ('бесплатн*', 'без платы', 'даром', 'free', 'не платить'), 0.95),
+    ProfileRule('currency', 'EUR', ('евро', '€', 'euro', 'eur')),
+    ProfileRule('currency', 'USD', ('доллар*', '$', 'usd', 'бакс*')),
+    ProfileRule('budget_hint', None, ('до', 'бюджет*', 'в год', 'в семестр', 'готов*', 'максимум')),
+    ProfileRule('not_budget', None, ('ielts', 'toefl', 'класс*', 'курс*', 'года', 'лет', 'месяц*',
+                                     'баллов', 'балла')),
+]
+
+# Курс к евро: бюджет в профиле хранится в евро
+CURRENCY_RATES = {'EUR': 1.0, 'USD': 0.85}
+
+# Сумма: "5000", "5 000", "1.5", с множителем "10k", "10к", "10 тыс", "10 тысяч".
+# Русская "к" - множитель только слитно с числом: "3000 к сентябрю" - это предлог
+AMOUNT_RE = re.compile(r'(?<![\w.,])(\d{1,3}(?:[ \u00a0]\d{3})+|\d+)(?:[.,](\d+))?'
+                       r'(?:\s*(тысяч\w*|тыс\.?|k)(?![а-яa-z])|(к)(?![а-яa-z]))?')
+
+# Насколько далеко от суммы искать валюту и подсказки, символов
+CONTEXT_WINDOW = 12
+
+
+class ProfileExtractor:
+    """Извлечение данных анкеты из сообщения по таблице правил.
+
+    Все ключевые слова всех правил компилируются в один KeywordMatcher, а
+    суммы ищутся одним регулярным выражением, поэтому новые области или
+    языки добавляют строки в PROFILE_RULES, но не добавляют проходов по
+    сообщению. extract() возвращает все совпадения с уверенностью,
+    update_profile() записывает в профиль лучшее значение каждого слота.
+    """
+
+    # Однозначные слоты: остается совпадение с наибольшей уверенностью
+    SINGLE_SLOTS = ('degree', 'language', 'max_budget')
+    MULTI_SLOTS = ('field',)
+
+    def __init__(self, rules: Iterable[ProfileRule] = PROFILE_RULES,
+                 currency_rates: Optional[Dict[str, float]] = None, min_confidence: float = 0.5):
+        self.rules = list(rules)
+        self.currency_rates = currency_rates or CURRENCY_RATES
+        self.min_confidence = min_confidence
+        self.matcher = KeywordMatcher({i: rule.keywords for i, rule in enumerate(self.rules)}, whole_words=True)
+
+    def extract(self, message: str) -> List[ProfileMatch]:
+        """Все найденные значения слотов в порядке правил, суммы бюджета - в конце"""
+        found = self.matcher.matches(message)
+        matches = []
+        context = []  # (позиция, длина, слот, значение) для разбора сумм
+        seen = set()
+        for position, keyword in found:
+            for index in self.matcher.categories_of(keyword):
+                rule = self.rules[index]
+                if rule.slot in ('currency', 'budget_hint', 'not_budget'):
+                    context.append((position, len(keyword.rstrip('*')), rule.slot, rule.value))
+                elif index not in seen:
+                    seen.add(index)
+                    matches.append((index, ProfileMatch(rule.slot, rule.value, rule.confidence, keyword.rstrip('*'))))
+
+        matches.sort(key=lambda item: item[0])
+        return [match for _, match in matches] + self._extract_budget(message, context)
+
+    def _extract_budget(self, message: str, context: list) -> List[ProfileMatch]:
+        """Суммы бюджета в евро; уверенность зависит от валюты, множителя и подсказок рядом"""
+        currencies = {value for _, _, slot, value in context if slot == 'currency'}
+        budgets = []
+        for amount in AMOUNT_RE.finditer(message.lower()):
+            whole, fraction, multiplier, glued_multiplier = amount.groups()
+            multiplier = multiplier or glued_multiplier
+            value = float(re.sub(r'\s', '', whole) + ('.' + fraction if fraction else ''))
+            start, end = amount.span()
+
+            # Ближайшие к сумме валюта и подсказка ("до", "в год" или "IELTS", "года")
+            currency = hint = None
+            currency_distance = hint_distance = CONTEXT_WINDOW + 1
+            for position, length, slot, slot_value in context:
+                distance = max(start - (position + length), position - end, 0)
+                if slot == 'currency' and distance < currency_distance:
+                    currency, currency_distance = slot_value, distance
+                elif slot != 'currency' and distance < hint_distance:
+                    hint, hint_distance = slot, distance
+
+            if currency or multiplier:
+                confidence = 0.9
+            elif hint == 'not_budget':
+                # "IELTS 6.5", "11 класс", "2 года" - это не сумма
+                continue
+            elif hint == 'budget_hint':
+                confidence = 0.7
+            else:
+                confidence = 0.4
+
+            if currency is None:
+                # Валюта названа в другом месте сообщения, и только одна
+                currency = next(iter(currencies)) if len(currencies) == 1 else 'EUR'
+            if multiplier:
+                value *= 1000
+            budgets.append(ProfileMatch('max_budget', int(value * self.currency_rates[currency]), confidence,
+                                        amount.group(0).strip()))
+        return budgets
+
+    def update_profile(self, message: str, profile: dict, expected: Optional[str] = None) -> List[ProfileMatch]:
+        """Записать в профиль найденные значения; возвращает примененные совпадения.
+
+        expected - слот, о котором бот только что спросил: ответ на вопрос
+        принимается и с меньшей уверенностью (например, просто "5000" на вопрос о бюджете).
+        """
+        applied = []
+        best: Dict[str, ProfileMatch] = {}
+        fields = []
+        for match in self.extract(message):
+            threshold = self.min_confidence if match.slot != expected else min(self.min_confidence, 0.4)
+            if match.confidence < threshold:
+                continue
+            if match.slot in self.MULTI_SLOTS:
+                if match.value not in fields:
+                    fields.append(match.value)
+                    applied.append(match)
+            elif match.slot in self.SINGLE_SLOTS:
+                current = best.get(match.slot)
+                if current is None or match.confidence > current.confidence:
+                    best[match.slot] = match
+
+        if fields:
+            profile['field'] = fields
+        for slot, match in best.items():
+            profile[slot] = match.value
+            applied.append(match)
+        return applied
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from database.async_db import AsyncEducationDatabase
+from database.education_db import split_terms
+from database.models import Program
+
+try:
+    import numpy as np
+except ImportError:  # каталог в памяти работает только с NumPy
+    np = None
+
+
+class CatalogSnapshot:
+    """Неизменяемый колоночный снимок каталога, отсортированный по (cost_per_year, id)"""
+
+    def __init__(self, version: int, programs: List[Program]):
+        self.version = version
+
+        # Порядок выдачи как у SQL-поиска: дешевые первыми, при равной цене - по id
+        costs = np.array([program.cost_per_year for program in programs], dtype=np.float64)
+        ids = np.array([program.id for program in programs], dtype=np.int64)
+        order = np.lexsort((ids, costs)) if programs else np.array([], dtype=np.int64)
+
+        self.programs = [programs[i] for i in order]
+        self.ids = ids[order]
+        self.cost = costs[order]
+
+        self.degree_codes: Dict[str, int] = {}
+        self.degree = np.array(
+            [self.degree_codes.setdefault(program.degree, len(self.degree_codes)) for program in self.programs],
+            dtype=np.int32
+        )
+
+        self.field_bits, self.field_index = self._build_bitmask([program.field for program in self.programs])
+        self.language_bits, self.language_index = self._build_bitmask(
+            [program.language for program in self.programs]
+        )
+
+    @staticmethod
+    def _build_bitmask(values: List[str]):
+        """Битовые маски терминов: строка - программа, столбец - 64-битное слово"""
+        index: Dict[str, int] = {}
+        rows, term_ids = [], []
+        for row, value in enumerate(values):
+            for term in split_terms(value):
+                rows.append(row)
+                term_ids.append(index.setdefault(term, len(index)))
+
+        words = max(1, (len(index) + 63) // 64)
+        bits = np.zeros((len(values), words), dtype=np.uint64)
+        term_ids = np.array(term_ids, dtype=np.uint64)
+        np.bitwise_or.at(bits, (np.array(rows, dtype=np.int64), (term_ids // 64).astype(np.int64)),
+                         np.left_shift(np.uint64(1), term_ids % np.uint64(64)))
+        return bits, index
+
+    @staticmethod
+    def _terms_mask(bits, index: Dict[str, int], terms: List[str]):
+        """Маска программ, у которых есть хотя бы один из терминов"""
+        query = np.zeros(bits.shape[1], dtype=np.uint64)
+        for term in terms:
+            term_id = index.get(term)
+            if term_id is not None:
+                query[term_id // 64] |= np.uint64(1 << (term_id % 64))
+        return (bits & query).any(axis=1)
+
+    def _start_after(self, after: Optional[Tuple[float, int]]) -> int:
+        """Позиция первой программы после курсора (cost_per_year, id)"""
+        if after is None:
+            return 0
+        cost, program_id = after
+        start = int(np.searchsorted(self.cost, cost, side='left'))
+        end = int(np.searchsorted(self.cost, cost, side='right'))
+        # Внутри блока с одинаковой ценой id уже отсортированы по возрастанию
+        return start + int(np.searchsorted(self.ids[start:end], program_id, side='right'))
+
+    def search(self, filters: Dict, limit: int = 5,
+               after: Optional[Tuple[float, int]] = None) -> List[Program]:
+        """Поиск с той же семантикой фильтров, что и EducationDatabase.search_programs"""
+        offset = self._start_after(after)
+        mask = np.ones(len(self.programs) - offset, dtype=bool)
+
+        if filters.get('degree'):
+            code = self.degree_codes.get(filters['degree'])
+            if code is None:
+                return []
+            mask &= self.degree[offset:] == code
+
+        fields = [field.strip().lower() for field in filters.get('field') or [] if field.strip()]
+        if fields:
+            mask &= self._terms_mask(self.field_bits[offset:], self.field_index, fields)
+
+        if filters.get('max_budget') is not None:
+            mask &= self.cost[offset:] <= filters['max_budget']
+
+        if filters.get('language'):
+            mask &= self._terms_mask(self.language_bits[offset:], self.language_index,
+                                     [filters['language'].strip().lower()])
+
+        return [self.programs[offset + i] for i in np.flatnonzero(mask)[:limit]]
+
+
+class ProgramCatalog:
+    """Каталог программ в памяти процесса с векторной фильтрацией.
+
+    Версия каталога проверяется не чаще refresh_interval секунд; при
+    изменении таблицы programs снимок перестраивается в фоне и заменяется
+    одной операцией присваивания, а поиск до этого момента обслуживает
+    предыдущий снимок.
+    """
+
+    def __init__(self, db: AsyncEducationDatabase, refresh_interval: float):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def available() -> bool:
+        """Установлен ли NumPy"""
+        return np is not None
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._snapshot.version if self._snapshot else None
+
+    def invalidate(self):
+        """Проверить версию каталога при следующем поиске"""
+        self._checked_at = 0.0
+
+    def _refresh_due(self) -> bool:
+        return time.monotonic() - self._checked_at >= self.refresh_interval
+
+    async def refresh(self):
+        """Перестроить снимок, если каталог в БД изменился"""
+        async with self._refresh_lock:
+            if self._snapshot is not None and not self._refresh_due():
+                return
+
+            version = await self.db.get_catalog_version()
+            if self._snapshot is None or version != self._snapshot.version:
+                version, programs = await self.db.get_all_programs()
+                loop = asyncio.get_running_loop()
+                self._snapshot = await loop.run_in_executor(None, CatalogSnapshot, version, programs)
+                print(f"📚 Каталог программ загружен в память: {len(programs)} программ, версия {version}")
+
+            self._checked_at = time.monotonic()
+
+    async def search_programs(self, filters: Dict, limit: int = 5,
+                              after: Optional[Tuple[float, int]] = None) -> List[Program]:
+        """Поиск программ по фильтрам в памяти"""
+        if self._snapshot is None:
+            await self.refresh()
+        elif self._refresh_due() and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+        return self._snapshot.search(filters, limit, after)
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"❌ Ошибка обновления каталога программ: {e}")
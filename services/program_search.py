@@ -1,17 +1,139 @@
-from typing import Dict, List
-from database.education_db import EducationDatabase
+import time
+from typing import Dict, List, Optional, Tuple
+from config.settings import Settings
+from database.async_db import AsyncEducationDatabase
 from database.models import Program
+from services.program_catalog import ProgramCatalog
+from utils.ttl_cache import TTLCache
+
+# Курсор страницы: (cost_per_year, id) последней показанной программы
+Cursor = Tuple[float, int]
+
 
 class ProgramSearchService:
-    def __init__(self, db: EducationDatabase):
+    MORE_PREFIX = 'more'
+
+    def __init__(self, db: AsyncEducationDatabase, catalog: Optional[ProgramCatalog] = None):
         self.db = db
+        self.catalog = catalog
+
+        # Кэш результатов по нормализованному профилю: {'programs': [...], 'response': str}
+        self.cache = TTLCache(Settings.SEARCH_CACHE_MAX_ENTRIES, Settings.SEARCH_CACHE_TTL)
+        self._catalog_version: Optional[int] = None
+        self._version_checked_at = 0.0
+
+    @staticmethod
+    def cache_key(filters: Dict) -> tuple:
+        """Канонический ключ фильтров: порядок и регистр областей не важны"""
+        fields = tuple(sorted({field.strip().lower() for field in filters.get('field') or [] if field.strip()}))
+        max_budget = filters.get('max_budget')
+        return (
+            filters.get('degree') or None,
+            fields,
+            float(max_budget) if max_budget is not None else None,
+            (filters.get('language') or '').strip().lower() or None,
+        )
+
+    def invalidate(self):
+        """Сбросить кэш после записи в каталог"""
+        self.cache.clear()
+        self._version_checked_at = 0.0
+        if self.catalog is not None:
+            self.catalog.invalidate()
+
+    async def _check_catalog_version(self):
+        """Сброс кэша, если каталог изменился (в том числе другим процессом)"""
+        if time.monotonic() - self._version_checked_at < Settings.PROGRAM_CATALOG_REFRESH_INTERVAL:
+            return
+        version = await self.db.get_catalog_version()
+        if version != self._catalog_version:
+            self.cache.clear()
+            self._catalog_version = version
+            if self.catalog is not None:
+                # Новые записи кэша должны строиться уже по свежему снимку
+                self.catalog.invalidate()
+                await self.catalog.refresh()
+        self._version_checked_at = time.monotonic()
+
+    async def _cached_search(self, filters: Dict, after: Optional[Cursor] = None) -> dict:
+        """Страница результатов: {'programs', 'next_cursor', 'response'}"""
+        await self._check_catalog_version()
+
+        page_size = Settings.PROGRAMS_PAGE_SIZE
+        key = (self.cache_key(filters), after)
+        entry = self.cache.get(key)
+        if entry is None:
+            # Лишняя строка только показывает, есть ли следующая страница
+            if self.catalog is not None:
+                programs = await self.catalog.search_programs(filters, page_size + 1, after)
+            else:
+                programs = await self.db.search_programs(filters, page_size + 1, after)
+            next_cursor = None
+            if len(programs) > page_size:
+                programs = programs[:page_size]
+                next_cursor = (float(programs[-1].cost_per_year), programs[-1].id)
+            entry = {'programs': programs, 'next_cursor': next_cursor, 'response': {}}
+            self.cache.set(key, entry)
+        return entry
 
-    def search_programs(self, filters: Dict) -> List[Program]:
-        """Поиск программ по фильтрам"""
-        return self.db.search_programs(filters)
+    async def search_programs(self, filters: Dict, after: Optional[Cursor] = None) -> List[Program]:
+        """Страница программ по фильтрам"""
+        entry = await self._cached_search(filters, after)
+        return list(entry['programs'])
 
-    def format_programs_response(self, programs: List[Program]) -> str:
+    async def search_page(self, filters: Dict,
+                          after: Optional[Cursor] = None) -> Tuple[List[Program], Optional[Cursor]]:
+        """Страница программ и курсор следующей страницы (None, если это последняя)"""
+        entry = await self._cached_search(filters, after)
+        return list(entry['programs']), entry['next_cursor']
+
+    async def search_and_format(self, filters: Dict, after: Optional[Cursor] = None,
+                                shown: int = 0) -> Tuple[str, Optional[str]]:
+        """Текст страницы и callback_data кнопки "Ещё программы"; оба кэшируются.
+
+        shown - сколько программ уже показано, нужно только для нумерации.
+        """
+        entry = await self._cached_search(filters, after)
+        if shown not in entry['response']:
+            entry['response'][shown] = self.format_programs_response(entry['programs'], shown)
+
+        more_data = None
+        if entry['next_cursor'] is not None:
+            more_data = self.encode_cursor(entry['next_cursor'], shown + len(entry['programs']))
+        return entry['response'][shown], more_data
+
+    @classmethod
+    def encode_cursor(cls, cursor: Cursor, shown: int) -> str:
+        """Компактный callback_data: more:<показано>:<цена>:<id>"""
+        cost, program_id = cursor
+        cost_text = str(int(cost)) if float(cost).is_integer() else repr(float(cost))
+        return f"{cls.MORE_PREFIX}:{shown}:{cost_text}:{program_id}"
+
+    @classmethod
+    def decode_cursor(cls, data: str) -> Optional[Tuple[Cursor, int]]:
+        """Разбор callback_data кнопки; None для чужих или испорченных данных"""
+        parts = data.split(':')
+        if len(parts) != 4 or parts[0] != cls.MORE_PREFIX:
+            return None
+        try:
+            return (float(parts[2]), int(parts[3])), int(parts[1])
+        except ValueError:
+            return None
+
+    def get_stats(self) -> dict:
+        """Статистика кэша поиска"""
+        return self.cache.get_stats()
+
+    async def search_programs_text(self, query: str, filters: Optional[Dict] = None,
+                                   limit: int = 10) -> List[Program]:
+        """Поиск программ по свободному описанию, лучшие совпадения - первыми"""
+        return await self.db.search_programs_text(query, filters, limit)
+
+    def format_programs_response(self, programs: List[Program], shown: int = 0) -> str:
         """Форматирование ответа с программами"""
+        if not programs and shown:
+            return "Это все программы по твоим критериям 🙌 Хочешь изменить параметры поиска?"
+
         if not programs:
             return """
 Хм, по таким критериям не нашел подходящих программ 🤔
@@ -20,9 +142,12 @@ class ProgramSearchService:
 Напиши, что хочешь изменить, и найдем варианты!
             """
 
-        response = "Отлично! Вот что нашел по твоим критериям 🎯\n\n"
+        if shown:
+            response = "Еще варианты по твоим критериям 👇\n\n"
+        else:
+            response = "Отлично! Вот что нашел по твоим критериям 🎯\n\n"
 
-        for i, program in enumerate(programs[:3], 1):
+        for i, program in enumerate(programs, shown + 1):
             cost_text = "Бесплатно" if program.cost_per_year == 0 else f"€{program.cost_per_year:,}/год"
             response += f"""
 **{i}. {program.program_name}**
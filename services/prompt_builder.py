@@ -0,0 +1,77 @@
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from database.models import Profile
+
+# Роли истории диалога в терминах chat completions
+HISTORY_ROLES = {
+    'user': 'user',
+    'bot': 'assistant',
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов без токенизатора модели.
+
+    Для смешанного русско-английского текста BPE-токенизаторы дают около
+    трех символов на токен; плюс несколько служебных токенов на сообщение.
+    """
+    return len(text) // PromptBuilder.CHARS_PER_TOKEN + PromptBuilder.MESSAGE_OVERHEAD_TOKENS
+
+
+@dataclass(slots=True)
+class Prompt:
+    messages: List[dict]
+    prompt_tokens: int
+    history_turns: int
+
+
+class PromptBuilder:
+    """Сборка промпта в пределах бюджета токенов.
+
+    Порядок сообщений: неизменный системный промпт (одинаковые байты в
+    каждом запросе, поэтому провайдер может кэшировать префикс), профиль
+    клиента, краткое содержание ранней части диалога, последние реплики -
+    столько, сколько помещается в бюджет, - и сам вопрос.
+    """
+
+    CHARS_PER_TOKEN = 3
+    MESSAGE_OVERHEAD_TOKENS = 4
+
+    def __init__(self, system_prompt: str, max_prompt_tokens: int):
+        self.max_prompt_tokens = max_prompt_tokens
+        self._system_message = {"role": "system", "content": system_prompt}
+        self._system_tokens = estimate_tokens(system_prompt)
+
+    def build(self, question: str, profile: Dict,
+              history: Iterable[Tuple[str, str]] = (), summary: str = '') -> Prompt:
+        """Промпт для вопроса; history - реплики (role, text) от старых к новым"""
+        profile_json = profile.as_json() if isinstance(profile, Profile) else json.dumps(profile, ensure_ascii=False)
+        context = f"📊 ПРОФИЛЬ КЛИЕНТА: {profile_json}"
+        if summary:
+            context += f"\n\n📝 РАНЕЕ В ДИАЛОГЕ: {summary}"
+        question_tokens = estimate_tokens(question)
+        used = self._system_tokens + estimate_tokens(context) + question_tokens
+
+        # Хвост из реплик пользователя - это и есть текущий вопрос
+        turns = list(history)
+        while turns and turns[-1][0] == 'user':
+            turns.pop()
+
+        selected = []
+        for role, text in reversed(turns):
+            tokens = estimate_tokens(text)
+            if used + tokens > self.max_prompt_tokens:
+                break
+            selected.append({"role": HISTORY_ROLES.get(role, 'user'), "content": text})
+            used += tokens
+        selected.reverse()
+
+        messages = [
+            self._system_message,
+            {"role": "system", "content": context},
+            *selected,
+            {"role": "user", "content": question},
+        ]
+        return Prompt(messages=messages, prompt_tokens=used, history_turns=len(selected))
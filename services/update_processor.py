@@ -0,0 +1,120 @@
+import asyncio
+import sys
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+from services.ai_admission import AIAdmissionController
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с порядком внутри пользователя.
+
+    Обновления одного пользователя (effective_user.id, для обновлений без
+    пользователя - effective_chat.id) обрабатываются строго по одному и в
+    порядке поступления: SessionManager и OperatorHandler рассчитаны на
+    последовательную работу с данными пользователя. Разные пользователи
+    обрабатываются параллельно, не больше max_concurrency обработчиков
+    одновременно. Обновление, ждущее своей очереди у пользователя, слот не
+    занимает.
+
+    Прием обновлений процессор не ограничивает: Application создает задачу
+    на каждое полученное обновление, и все они сразу попадают сюда, а
+    ждут уже очереди пользователя и слота обработчика. Размер этой очереди
+    виден в get_stats (queued).
+
+    Если задан admission, он узнает о текстовом сообщении сразу при
+    поступлении, а не когда до него дойдет очередь пользователя: более
+    старый вопрос, ждущий слот модели, снимается, и модель отвечает на оба
+    сообщения одним ответом.
+    """
+
+    def __init__(self, max_concurrency: int, admission: Optional[AIAdmissionController] = None):
+        # Семафор базового класса не ограничивает ничего: do_process_update должен
+        # вызываться сразу при поступлении обновления, иначе admission узнает о
+        # сообщении, только когда освободится место
+        super().__init__(sys.maxsize)
+        self.max_concurrency = max_concurrency
+        self.admission = admission
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._queued: Dict[int, int] = {}  # пользователь -> его обновлений в обработке и в ожидании
+        self._running = 0
+
+        self.stats = {
+            'processed': 0,
+            'failed': 0,
+            'max_running': 0,
+            'max_queued_per_user': 0,
+        }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        key = self._key(update)
+        if key is None:
+            async with self._slots:
+                await self._run(coroutine)
+            return
+
+        announced = self._announce(update, key)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        queued = self._queued[key] = self._queued.get(key, 0) + 1
+        self.stats['max_queued_per_user'] = max(self.stats['max_queued_per_user'], queued)
+        try:
+            # asyncio.Lock пропускает ожидающих в порядке очереди - в порядке поступления обновлений
+            async with lock:
+                async with self._slots:
+                    await self._run(coroutine)
+        finally:
+            if announced:
+                self.admission.settle(key, update.update_id)
+            self._queued[key] -= 1
+            if not self._queued[key]:
+                del self._queued[key]
+                del self._locks[key]
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        self._running += 1
+        self.stats['max_running'] = max(self.stats['max_running'], self._running)
+        try:
+            await coroutine
+            self.stats['processed'] += 1
+        except Exception:
+            # Application.process_update сам передает ошибки обработчиков в error_handler
+            self.stats['failed'] += 1
+            raise
+        finally:
+            self._running -= 1
+
+    @staticmethod
+    def _key(update: object) -> Optional[int]:
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            return user.id
+        chat = getattr(update, 'effective_chat', None)
+        return chat.id if chat is not None else None
+
+    def _announce(self, update: object, user_id: int) -> bool:
+        """Регистрация текстового сообщения в AIAdmissionController; True - если зарегистрировано"""
+        message = getattr(update, 'message', None)
+        text = getattr(message, 'text', None)
+        if self.admission is None or not text or text.startswith('/'):
+            return False
+        self.admission.announce(user_id, update.update_id, text)
+        return True
+
+    def get_stats(self) -> dict:
+        """Счетчики обработки, обновлений в работе и в очереди, пользователей с необработанными обновлениями"""
+        return {
+            **self.stats,
+            'running': self._running,
+            'queued': sum(self._queued.values()),
+            'active_users': len(self._queued),
+        }
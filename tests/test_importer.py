@@ -0,0 +1,37 @@
+import pytest
+
+from database.importer import ImportRowError, validate_row
+
+ROW = {
+    'country': 'Германия',
+    'university': 'TU München',
+    'program_name': 'Informatics',
+    'degree': 'магистратура',
+    'field': 'IT',
+    'language': 'английский',
+    'duration': '2 года',
+    'requirements': 'IELTS 6.5',
+    'application_deadline': '31 мая',
+    'website': 'https://www.tum.de',
+}
+
+
+def test_cost_is_normalized():
+    row = validate_row({**ROW, 'cost_per_year': '1 500,0'})
+    assert row[7] == 1500
+    assert isinstance(row[7], int)
+
+
+def test_missing_cost_is_free():
+    assert validate_row(ROW)[7] == 0
+
+
+@pytest.mark.parametrize('cost', ['nan', 'NaN', 'inf', '-inf', 'infinity'])
+def test_non_finite_cost_is_rejected(cost):
+    with pytest.raises(ImportRowError, match='стоимость не число'):
+        validate_row({**ROW, 'cost_per_year': cost})
+
+
+def test_negative_cost_is_rejected():
+    with pytest.raises(ImportRowError, match='отрицательная'):
+        validate_row({**ROW, 'cost_per_year': '-100'})
@@ -7,8 +7,8 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     print(f"Произошла ошибка: {context.error}")
 
     if update and update.message:
-        await update.message.reply_text(
-            "⚠️ Произошла техническая ошибка. Попробуйте позже."
+        await context.bot_data['outbound'].send_message(
+            update.effective_chat.id, "⚠️ Произошла техническая ошибка. Попробуйте позже."
         )
 
 
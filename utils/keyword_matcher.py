@@ -0,0 +1,140 @@
+import re
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Mapping, Optional, Set, Tuple
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """Регулярное выражение для набора слов в виде префиксного дерева.
+
+    Общие префиксы вынесены за скобки, поэтому на каждой позиции движок
+    проверяет один путь по дереву, а не все слова по очереди; из слов,
+    совпадающих с одной позиции, выбирается самое длинное.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # Здесь заканчивается более короткое слово: продолжение необязательно
+            return '(?:' + pattern + ')?'
+        return pattern
+
+    return build(trie)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+class KeywordMatcher:
+    """Поиск ключевых слов нескольких категорий за один проход по тексту.
+
+    Все ключевые слова компилируются в одно регулярное выражение-префиксное
+    дерево внутри просмотра вперед (?=(...)): на каждой позиции текста оно
+    за один спуск находит самое длинное совпадающее слово, а более короткие
+    слова с той же позиции добавляются по заранее построенной таблице
+    префиксов. Поэтому результат совпадает с проверками
+    `keyword in text.lower()` для каждого слова, включая вложенные и
+    перекрывающиеся совпадения, а время проверки почти не растет с числом слов.
+
+    На небольших таблицах (до PLAIN_SCAN_MAX_KEYWORDS слов) отдельные
+    проверки `in` быстрее: поиск подстроки в C обходит вход в движок
+    регулярных выражений и разбор совпадений. Поэтому keywords() без
+    whole_words использует их, а дерево - только на больших таблицах.
+
+    С whole_words=True ключевое слово ищется только с начала слова и
+    должно заканчиваться вместе со словом: 'ит' не найдется в "учиться".
+    Звездочка в конце ('магистр*') разрешает любое окончание.
+    """
+
+    # Граница по benchmarks.keyword_matching: на 64 словах `in` еще быстрее, на 96 - уже нет
+    PLAIN_SCAN_MAX_KEYWORDS = 80
+
+    def __init__(self, categories: Mapping[Hashable, Iterable[str]], whole_words: bool = False):
+        self.whole_words = whole_words
+        self.categories: Dict[Hashable, FrozenSet[str]] = {}
+        self._keyword_categories: Dict[str, List[Hashable]] = {}
+        for category, keywords in categories.items():
+            keywords = frozenset(keyword.lower() for keyword in keywords if keyword.rstrip('*'))
+            self.categories[category] = keywords
+            for keyword in keywords:
+                self._keyword_categories.setdefault(keyword, []).append(category)
+
+        literals = sorted({self._literal(keyword) for keyword in self._keyword_categories},
+                          key=lambda literal: (-len(literal), literal))
+        # Найденный литерал -> все ключевые слова, чей литерал - его префикс
+        self._prefixes: Dict[str, FrozenSet[str]] = {
+            literal: frozenset(keyword for keyword in self._keyword_categories
+                               if literal.startswith(self._literal(keyword)))
+            for literal in literals
+        }
+        # Слово без звездочки, оканчивающееся буквой или цифрой, требует конца слова после себя
+        self._word_ends: Dict[str, int] = {
+            keyword: len(keyword) for keyword in self._keyword_categories
+            if whole_words and not keyword.endswith('*') and keyword[-1].isalnum()
+        }
+        self._plain: Optional[Tuple[str, ...]] = None
+        if not whole_words and len(self._keyword_categories) <= self.PLAIN_SCAN_MAX_KEYWORDS:
+            self._plain = tuple(self._keyword_categories)
+        if not literals:
+            self._pattern = None
+        else:
+            # Начало слова: перед позицией нет буквы, либо слово начинается не с буквы ('$', '€')
+            start = r'(?:(?<!\w)|(?!\w))' if whole_words else ''
+            self._pattern = re.compile(start + '(?=(' + trie_pattern(literals) + '))')
+
+    def _literal(self, keyword: str) -> str:
+        return keyword[:-1] if self.whole_words and keyword.endswith('*') else keyword
+
+    def matches(self, text: str) -> List[Tuple[int, str]]:
+        """Найденные ключевые слова с позициями начала: [(позиция, слово), ...] по порядку в тексте"""
+        if self._pattern is None:
+            return []
+        text = text.lower()
+        found = []
+        for match in self._pattern.finditer(text):
+            start = match.start()
+            for keyword in self._prefixes[match.group(1)]:
+                end = start + self._word_ends.get(keyword, 0)
+                if end == start or end == len(text) or not _is_word_char(text[end]):
+                    found.append((start, keyword))
+        return found
+
+    def keywords(self, text: str) -> Set[str]:
+        """Ключевые слова, которые встречаются в тексте (без учета регистра)"""
+        if self._pattern is None:
+            return set()
+        if self._plain is not None:
+            text = text.lower()
+            return {keyword for keyword in self._plain if keyword in text}
+        if self.whole_words:
+            return {keyword for _, keyword in self.matches(text)}
+        matches = self._pattern.findall(text.lower())
+        return set().union(*map(self._prefixes.__getitem__, matches)) if matches else set()
+
+    def categories_of(self, keyword: str) -> List[Hashable]:
+        """Категории, в которые входит ключевое слово"""
+        return self._keyword_categories[keyword]
+
+    def scan(self, text: str) -> Dict[Hashable, int]:
+        """Число разных найденных ключевых слов по категориям; категории без совпадений не включаются"""
+        hits: Dict[Hashable, int] = {}
+        for keyword in self.keywords(text):
+            for category in self._keyword_categories[keyword]:
+                hits[category] = hits.get(category, 0) + 1
+        return hits
+
+    def first(self, text: str, order: Optional[Iterable[Hashable]] = None) -> Optional[Hashable]:
+        """Первая по порядку order (по умолчанию - порядку объявления) категория с совпадением или None"""
+        hits = self.scan(text)
+        for category in order if order is not None else self.categories:
+            if category in hits:
+                return category
+        return None
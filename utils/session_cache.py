@@ -0,0 +1,104 @@
+import sys
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from database.models import UserSession
+
+
+class SessionCache:
+    """LRU-кэш активных сессий с ограничением по количеству, памяти и времени простоя.
+
+    Вытесненные сессии возвращаются вызывающему коду, чтобы несохраненные
+    изменения можно было записать в БД до того, как сессия будет потеряна.
+    """
+
+    def __init__(self, max_entries: int, max_memory_bytes: int, idle_ttl: float):
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.idle_ttl = timedelta(seconds=idle_ttl)
+
+        self._sessions: "OrderedDict[int, UserSession]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self.memory_bytes = 0
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+        }
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, user_id: int) -> Optional[UserSession]:
+        """Сессия из кэша с отметкой об использовании"""
+        session = self._sessions.get(user_id)
+        if session is None:
+            self.stats['misses'] += 1
+            return None
+
+        self._sessions.move_to_end(user_id)
+        self.stats['hits'] += 1
+        return session
+
+    def peek(self, user_id: int) -> Optional[UserSession]:
+        """Сессия из кэша без влияния на порядок вытеснения и счетчики"""
+        return self._sessions.get(user_id)
+
+    def put(self, session: UserSession) -> List[UserSession]:
+        """Добавить или обновить сессию; возвращает вытесненные сессии"""
+        user_id = session.user_id
+        size = self.estimate_size(session)
+
+        self.memory_bytes += size - self._sizes.get(user_id, 0)
+        self._sizes[user_id] = size
+        self._sessions[user_id] = session
+        self._sessions.move_to_end(user_id)
+
+        evicted = self.expire()
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_entries or
+                                           self.memory_bytes > self.max_memory_bytes):
+            evicted.append(self._pop_oldest())
+            self.stats['evictions'] += 1
+        return evicted
+
+    def expire(self, now: Optional[datetime] = None) -> List[UserSession]:
+        """Удалить сессии, простаивающие дольше idle_ttl"""
+        deadline = (now or datetime.now()) - self.idle_ttl
+        expired = []
+        # Порядок LRU совпадает с порядком последней активности
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_activity > deadline:
+                break
+            expired.append(self._pop_oldest())
+            self.stats['expirations'] += 1
+        return expired
+
+    def _pop_oldest(self) -> UserSession:
+        user_id, session = self._sessions.popitem(last=False)
+        self.memory_bytes -= self._sizes.pop(user_id, 0)
+        return session
+
+    @staticmethod
+    def estimate_size(session: UserSession) -> int:
+        """Приблизительный объем сессии в памяти, байт"""
+        size = sys.getsizeof(session) + sys.getsizeof(session.profile) + sys.getsizeof(session.conversation_history)
+        size += sys.getsizeof(session.summary)
+        for key, value in session.profile.items():
+            size += sys.getsizeof(key) + sys.getsizeof(value)
+        for role, text in session.conversation_history:
+            size += sys.getsizeof(text)
+        return size
+
+    def get_stats(self) -> dict:
+        """Счетчики попаданий, промахов и вытеснений"""
+        return {
+            **self.stats,
+            'entries': len(self._sessions),
+            'memory_bytes': self.memory_bytes,
+        }
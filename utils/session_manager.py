@@ -1,41 +1,230 @@
+import asyncio
+import time
 from datetime import datetime
-from typing import Dict
-from database.models import UserSession
-from database.education_db import EducationDatabase
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from database.models import UserSession, ConversationMessage
+from database.async_db import AsyncEducationDatabase
+from config.settings import Settings
+from utils.session_cache import SessionCache
+
+# (прежнее содержание, реплики) -> новое содержание или None
+Summarizer = Callable[[str, List[Tuple[str, str]]], Awaitable[Optional[str]]]
+
 
 class SessionManager:
-    def __init__(self, db: EducationDatabase):
+    def __init__(self, db: AsyncEducationDatabase, summarize: Optional[Summarizer] = None):
         self.db = db
-        self.active_sessions: Dict[int, UserSession] = {}
+        self.active_sessions = SessionCache(
+            max_entries=Settings.SESSION_CACHE_MAX_ENTRIES,
+            max_memory_bytes=Settings.SESSION_CACHE_MAX_MEMORY_MB * 1024 * 1024,
+            idle_ttl=Settings.SESSION_IDLE_TTL
+        )
+
+        # Отложенная запись: user_id -> (время (monotonic) первой несохраненной правки, сессия).
+        # Ссылка на сессию держит ее до записи, даже если кэш ее уже вытеснил
+        self._dirty: Dict[int, Tuple[float, UserSession]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_event: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Фоновое сжатие длинных диалогов, вне пути ответа пользователю
+        self.summarize = summarize
+        self._summary_queue: Optional[asyncio.Queue] = None
+        self._summary_scheduled: Set[int] = set()
+        self._summary_task: Optional[asyncio.Task] = None
 
-    def get_or_create_session(self, user_id: int) -> UserSession:
+        self.stats = {
+            'save_calls': 0,
+            'flushes': 0,
+            'sessions_written': 0,
+            'flush_errors': 0,
+            'last_flush_lag': 0.0,
+            'max_flush_lag': 0.0,
+            'summaries': 0,
+            'summarized_turns': 0,
+            'summary_errors': 0,
+            'dropped_turns': 0,  # реплики, вытесненные из буфера до сжатия
+        }
+
+    async def get_or_create_session(self, user_id: int) -> UserSession:
         """Получить или создать сессию пользователя"""
-        if user_id in self.active_sessions:
-            session = self.active_sessions[user_id]
+        session = self.active_sessions.get(user_id)
+        if session is not None:
             session.last_activity = datetime.now()
             return session
 
         # Попробовать загрузить из БД
-        session = self.db.get_user_session(user_id)
+        session = await self.db.get_user_session(user_id)
         if not session:
             session = UserSession(user_id=user_id)
 
         session.last_activity = datetime.now()
-        self.active_sessions[user_id] = session
+        await self._write_back(self.active_sessions.put(session))
         return session
 
-    def save_session(self, session: UserSession):
-        """Сохранить сессию"""
-        self.db.save_user_session(session)
-        self.active_sessions[session.user_id] = session
-
-    async def extract_user_info(self, message: str, session: UserSession):
-        """Извлечение информации о пользователе из сообщения (ваша логика)"""
-        message_lower = message.lower()
-
-        # Уровень образования
-        if any(word in message_lower for word in ['магистр', 'магистратура', 'магистерская', 'второе высшее']):
-            session.profile['degree'] = 'магистратура'
-        elif any(word in message_lower for word in ['бакалавр', 'бакалавриат', 'первое высшее', 'первое образование']):
-            session.profile['degree'] = 'бакалавриат'
-        # ... остальная логика извлечения
\ No newline at end of file
+    async def save_session(self, session: UserSession):
+        """Сохранить сессию (в режиме отложенной записи - пометить для сброса)"""
+        await self._write_back(self.active_sessions.put(session))
+        marked = self._dirty.get(session.user_id)
+        self._dirty[session.user_id] = (marked[0] if marked else time.monotonic(), session)
+        self.stats['save_calls'] += 1
+
+        if self._flush_task is None:
+            await self.flush()
+        elif len(self._dirty) >= Settings.SESSION_FLUSH_BATCH_SIZE:
+            self._flush_event.set()
+
+    async def add_message(self, session: UserSession, role: str, text: str):
+        """Добавить реплику в буфер сессии и в постоянную историю"""
+        history = session.conversation_history
+        history.append((role, text))
+        await self.db.append_message(session.user_id, role, text)
+
+        # Со сжатием старые реплики уходят из буфера только в summary; без него
+        # или если модель долго не может сжать диалог - просто отбрасываются
+        limit = UserSession.HISTORY_LIMIT if self._summary_queue is None else UserSession.HISTORY_MAX
+        while len(history) > limit:
+            history.popleft()
+            session.history_start += 1
+            if self._summary_queue is not None:
+                self.stats['dropped_turns'] += 1
+        self._schedule_summary(session)
+
+    async def get_history_page(self, user_id: int,
+                               before: Optional[Tuple[datetime, int]] = None) -> List[ConversationMessage]:
+        """Более старая страница истории, которой нет в буфере сессии"""
+        return await self.db.get_messages(user_id, Settings.HISTORY_PAGE_SIZE, before)
+
+    def start(self):
+        """Запуск фонового сброса измененных сессий и сжатия диалогов"""
+        if self.summarize is not None and self._summary_task is None:
+            self._summary_queue = asyncio.Queue()
+            self._summary_task = asyncio.create_task(self._summary_loop())
+
+        if not Settings.SESSION_WRITE_BEHIND or self._flush_task is not None:
+            return
+        self._flush_event = asyncio.Event()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Остановка фонового сброса с гарантированной записью всех сессий"""
+        if self._summary_task is not None:
+            self._summary_task.cancel()
+            try:
+                await self._summary_task
+            except asyncio.CancelledError:
+                pass
+            self._summary_task = None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        """Сброс по таймеру или по достижению размера пакета"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=Settings.SESSION_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+            await self.db.flush_messages()
+            await self._write_back(self.active_sessions.expire())
+
+    async def flush(self):
+        """Запись всех измененных сессий одним пакетом"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+
+            dirty, self._dirty = self._dirty, {}
+            sessions = [session for _, session in dirty.values()]
+
+            try:
+                await self.db.save_user_sessions(sessions)
+            except Exception as e:
+                print(f"❌ Ошибка сохранения сессий: {e}")
+                self.stats['flush_errors'] += 1
+                # Вернуть пометки, сохранив время первой правки и более свежую сессию
+                for user_id, (marked_at, session) in dirty.items():
+                    newer = self._dirty.get(user_id)
+                    self._dirty[user_id] = (min(marked_at, newer[0]), newer[1]) if newer else (marked_at, session)
+                return
+
+            lag = time.monotonic() - min(marked_at for marked_at, _ in dirty.values())
+            self.stats['flushes'] += 1
+            self.stats['sessions_written'] += len(sessions)
+            self.stats['last_flush_lag'] = lag
+            self.stats['max_flush_lag'] = max(self.stats['max_flush_lag'], lag)
+
+    def _schedule_summary(self, session: UserSession):
+        """Поставить сессию в очередь на сжатие, если история стала длинной"""
+        if (self._summary_queue is None or session.user_id in self._summary_scheduled
+                or len(session.conversation_history) < Settings.SUMMARY_TRIGGER_TURNS):
+            return
+        self._summary_scheduled.add(session.user_id)
+        self._summary_queue.put_nowait(session.user_id)
+
+    async def _summary_loop(self):
+        """Сжатие сессий по одной; ответы пользователям его не ждут"""
+        while True:
+            user_id = await self._summary_queue.get()
+            try:
+                await self._summarize_session(user_id)
+            except Exception as e:
+                self.stats['summary_errors'] += 1
+                print(f"❌ Ошибка сжатия диалога {user_id}: {e}")
+            finally:
+                self._summary_scheduled.discard(user_id)
+
+    async def _summarize_session(self, user_id: int):
+        """Перенос старых реплик из conversation_history в summary"""
+        session = self.active_sessions.peek(user_id)
+        if session is None or len(session.conversation_history) < Settings.SUMMARY_TRIGGER_TURNS:
+            return
+
+        turns = list(session.conversation_history)[:-Settings.SUMMARY_KEEP_TURNS]
+        covered = session.history_start + len(turns)
+        summary = await self.summarize(session.summary, turns)
+        if not summary:
+            self.stats['summary_errors'] += 1
+            return
+        if self.active_sessions.peek(user_id) is not session:
+            # Сессию вытеснили и загрузили заново, пока шел запрос к модели
+            return
+
+        # Пока шел запрос, в конец добавлялись новые реплики, а при переполнении
+        # буфера из начала могли уйти уже сжатые - убираем только их
+        compacted = {id(turn) for turn in turns}
+        history = session.conversation_history
+        while history and id(history[0]) in compacted:
+            history.popleft()
+            session.history_start += 1
+
+        session.summary = summary
+        # Номер реплики во всей истории, а не позиция в буфере: по нему сессия
+        # загружается из базы без повторов уже сжатых реплик
+        session.summary_turns = covered
+        self.stats['summaries'] += 1
+        self.stats['summarized_turns'] += len(turns)
+        await self.save_session(session)
+
+    async def _write_back(self, evicted: List[UserSession]):
+        """Запись несохраненных изменений вытесненных из кэша сессий"""
+        dirty = [session for session in evicted if self._dirty.pop(session.user_id, None) is not None]
+        if dirty:
+            await self.db.save_user_sessions(dirty)
+            self.stats['sessions_written'] += len(dirty)
+
+    def get_stats(self) -> dict:
+        """Метрики отложенной записи и кэша сессий"""
+        return {
+            **self.stats,
+            'pending': len(self._dirty),
+            'cache': self.active_sessions.get_stats()
+        }